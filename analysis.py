@@ -3,31 +3,66 @@
 Este módulo separa cálculos y reglas de negocio de la interfaz Streamlit.
 """
 
+import json
+import math
+from collections import namedtuple
+from functools import lru_cache
+
+import instrumentation
+from rules import REGLAS, REGLAS_COMPILADAS, REGLAS_RATIOS, etiqueta, indice_perfil, tramo, valor
+
+WACC_BASE_TIPO = {
+    "growth": 0.10,
+    "madura": 0.08,
+    "defensiva": 0.07,
+    "cíclica": 0.09,
+}
+TIPO_EMPRESA_POR_DEFECTO = "madura"
+
+ANIOS_PROYECCION = 5
+PERFILES_CRECIMIENTO = ("lineal", "exponencial")
+# En el perfil exponencial, la distancia a g_terminal cae como exp(-VELOCIDAD * t / anios).
+VELOCIDAD_DESVANECIMIENTO = 3.0
+# Escenario del DCF perpetuo: ``g`` es un campo de ``datos`` (en %) o un
+# crecimiento fijo en %, al que se suma ``desplazamiento_g_pct``; el WACC es el
+# automático más ``desplazamiento_wacc``. ``peso`` pondera el precio esperado.
+Escenario = namedtuple(
+    "Escenario", ["nombre", "g", "desplazamiento_g_pct", "desplazamiento_wacc", "peso"], defaults=(0.0, 0.0, 1.0)
+)
+ESCENARIOS_PERPETUO = (
+    Escenario("Conservador", "g_conservador_pct", desplazamiento_wacc=0.01),
+    Escenario("Base", "g_base_pct"),
+    Escenario("Optimista", "g_optimista_pct", desplazamiento_wacc=-0.01),
+)
+# Nombres que no puede tener un escenario (sin distinguir mayúsculas): su columna
+# ``precio_<nombre>`` coincidiría con la del precio esperado o la del DCF por proyección.
+NOMBRES_RESERVADOS = ("esperado", "proyeccion")
+# Campos de ``datos`` que un ``Escenario`` puede usar como crecimiento.
+CAMPOS_CRECIMIENTO = ("g_conservador_pct", "g_base_pct", "g_optimista_pct", "g_inicial_pct", "g_terminal_pct")
+# Suelo del WACC de los escenarios que lo rebajan (p. ej. el optimista, WACC - 1%).
+WACC_MINIMO_ESCENARIO = 0.0001
+
+# (nombre, regla compilada, variable, bloque) de las reglas que interpreta ``calcular_ratios``.
+_REGLAS_RATIOS = tuple(
+    (nombre, REGLAS_COMPILADAS[nombre], REGLAS[nombre]["sobre"], REGLAS[nombre].get("bloque")) for nombre in REGLAS_RATIOS
+)
+
 
 def calcular_wacc_automatico(tipo_empresa, deuda_neta, ebitda):
     """Estima WACC por tipo de empresa y ajuste de apalancamiento."""
-    wacc_base_tipo = {
-        "growth": 0.10,
-        "madura": 0.08,
-        "defensiva": 0.07,
-        "cíclica": 0.09,
-    }
-
-    if tipo_empresa not in wacc_base_tipo:
-        tipo_empresa = "madura"
+    if tipo_empresa not in WACC_BASE_TIPO:
+        tipo_empresa = TIPO_EMPRESA_POR_DEFECTO
 
-    wacc = wacc_base_tipo[tipo_empresa]
+    wacc = WACC_BASE_TIPO[tipo_empresa]
     justificacion = [f"WACC base para {tipo_empresa}: {wacc * 100:.2f}%"]
 
     deuda_neta_ebitda = None
     if ebitda != 0:
         deuda_neta_ebitda = deuda_neta / ebitda
-        if deuda_neta_ebitda > 4:
-            wacc += 0.02
-            justificacion.append("WACC ajustado al alza por apalancamiento muy elevado (>4x).")
-        elif deuda_neta_ebitda > 3:
-            wacc += 0.01
-            justificacion.append("WACC ajustado al alza por apalancamiento elevado (>3x).")
+        t = tramo("ajuste_wacc", deuda_neta_ebitda)
+        if t > 0:
+            wacc += valor("ajuste_wacc", t)
+            justificacion.append(etiqueta("ajuste_wacc", t))
     else:
         justificacion.append("Sin ajuste de apalancamiento: EBITDA es 0.")
 
@@ -39,14 +74,65 @@ def calcular_wacc_automatico(tipo_empresa, deuda_neta, ebitda):
     }
 
 
-def construir_crecimientos_decrecientes(g_inicial_pct, g_terminal_pct):
-    """Genera g1..g5 lineal decreciente usando la fórmula solicitada."""
-    paso = (g_inicial_pct - g_terminal_pct) / 5
-    return [g_inicial_pct - t * paso for t in range(1, 6)]
+@lru_cache(maxsize=4096)
+def tabla_capitalizacion(wacc, anios=ANIOS_PROYECCION):
+    """Factores ``(1 + wacc) ** t`` para t = 1..anios, calculados una vez por WACC."""
+    wacc = float(wacc)
+    return tuple((1 + wacc) ** t for t in range(1, anios + 1))
+
+
+@lru_cache(maxsize=256)
+def pesos_desvanecimiento(anios):
+    """Fracción pendiente de la diferencia g_inicial - g_terminal en t = 1..anios (perfil exponencial)."""
+    caida = VELOCIDAD_DESVANECIMIENTO / anios
+    final = math.exp(-caida * anios)
+    return tuple((math.exp(-caida * t) - final) / (1 - final) for t in range(1, anios + 1))
+
+
+def crecimiento_proyectado(g_inicial_pct, g_terminal_pct, t, anios=ANIOS_PROYECCION, perfil="lineal"):
+    """Crecimiento g_t (en %) del año ``t``; acepta escalares o arrays.
+
+    ``lineal`` baja en pasos iguales; ``exponencial`` se acerca rápido al
+    principio y más despacio al final. Ambos llegan a g_terminal en ``anios``.
+    """
+    if perfil == "lineal":
+        paso = (g_inicial_pct - g_terminal_pct) / anios
+        return g_inicial_pct - t * paso
+    if perfil == "exponencial":
+        return g_terminal_pct + (g_inicial_pct - g_terminal_pct) * pesos_desvanecimiento(anios)[t - 1]
+    raise ValueError(f"Perfil de crecimiento desconocido: {perfil}.")
+
+
+def sensibilidad_crecimiento(t, anios=ANIOS_PROYECCION, perfil="lineal"):
+    """Derivada de g_t respecto a g_inicial; respecto a g_terminal es ``1 -`` este valor."""
+    if perfil == "lineal":
+        return 1 - t / anios
+    if perfil == "exponencial":
+        return pesos_desvanecimiento(anios)[t - 1]
+    raise ValueError(f"Perfil de crecimiento desconocido: {perfil}.")
 
 
-def calcular_ratios(datos):
-    """Calcula ratios clave e interpretación cualitativa."""
+def construir_crecimientos_decrecientes(g_inicial_pct, g_terminal_pct, anios=ANIOS_PROYECCION, perfil="lineal"):
+    """Genera g1..gN decrecientes hacia g_terminal (lineal de 5 años por defecto)."""
+    if anios < 1:
+        raise ValueError("El horizonte de proyección debe ser de al menos 1 año.")
+    return [crecimiento_proyectado(g_inicial_pct, g_terminal_pct, t, anios, perfil) for t in range(1, anios + 1)]
+
+
+def clasificar_precio(precio_mercado, precio_teorico):
+    """Clasifica el precio de mercado frente al teórico con una banda de ±20%."""
+    if precio_teorico is None or precio_teorico == 0:
+        return None
+    diff = (precio_mercado - precio_teorico) / precio_teorico
+    return etiqueta("diferencia_precio", tramo("diferencia_precio", diff))
+
+
+def calcular_ratios(datos, perfil=0):
+    """Calcula ratios clave e interpretación cualitativa.
+
+    Los cortes salen de ``rules.REGLAS``; ``perfil`` es el índice de
+    ``rules.PERFILES`` cuyos cortes se aplican (0, el estándar, por defecto).
+    """
     capitalizacion = datos["precio_accion"] * datos["numero_acciones"]
     deuda_neta = datos["deuda"] - datos["caja"]
     ev = capitalizacion + deuda_neta
@@ -63,10 +149,7 @@ def calcular_ratios(datos):
         "EV": ev,
     }
     advertencias = []
-    rentabilidad = []
-    valoracion = []
-    solvencia = []
-    calidad_cash_flow = []
+    bloques = {"rentabilidad": [], "valoracion": [], "solvencia": [], "calidad_cash_flow": []}
 
     if datos["beneficio_neto"] != 0:
         ratios["PER"] = capitalizacion / datos["beneficio_neto"]
@@ -82,150 +165,189 @@ def calcular_ratios(datos):
     if datos["activos_totales"] != 0:
         ratios["ROA"] = datos["beneficio_neto"] / datos["activos_totales"]
 
-    # Interpretación por rangos estándar.
-    per = ratios["PER"]
-    ev_ebitda = ratios["EV/EBITDA"]
-    ev_fcf = ratios["EV/FCF"]
-    roe = ratios["ROE"]
-    margen = ratios["Margen EBITDA"]
-
-    if per is not None:
-        if per < 15:
-            valoracion.append("PER bajo (<15).")
-        elif per <= 25:
-            valoracion.append("PER razonable (15–25).")
-        else:
-            valoracion.append("PER exigente (>25).")
-        if per > 30:
-            advertencias.append("PER > 30: posible sobrevaloración.")
-
-    if ev_ebitda is not None:
-        if ev_ebitda < 8:
-            valoracion.append("EV/EBITDA bajo (<8).")
-        elif ev_ebitda <= 15:
-            valoracion.append("EV/EBITDA razonable (8–15).")
-        else:
-            valoracion.append("EV/EBITDA elevado (>15).")
-        if ev_ebitda > 25:
-            advertencias.append("EV/EBITDA > 25: valoración exigente.")
-
-    if ev_fcf is not None:
-        if ev_fcf < 15:
-            calidad_cash_flow.append("EV/FCF atractivo (<15).")
-        elif ev_fcf <= 30:
-            calidad_cash_flow.append("EV/FCF exigente (15–30).")
-        else:
-            calidad_cash_flow.append("EV/FCF muy exigente (>30).")
-
-    if roe is not None:
-        if roe < 0.10:
-            rentabilidad.append("ROE bajo (<10%).")
-        elif roe <= 0.15:
-            rentabilidad.append("ROE correcto (10–15%).")
-        else:
-            rentabilidad.append("ROE elevado (>15%).")
-
-    if margen is not None:
-        if margen < 0.15:
-            rentabilidad.append("Margen EBITDA bajo (<15%).")
-        elif margen <= 0.25:
-            rentabilidad.append("Margen EBITDA normal (15–25%).")
-        else:
-            rentabilidad.append("Margen EBITDA alto (>25%).")
-
-    if datos["fcf"] <= 0:
-        advertencias.append("FCF ≤ 0: generación de caja débil.")
-        calidad_cash_flow.append("FCF débil o negativo.")
-
     deuda_neta_ebitda = None
     if datos["ebitda"] != 0:
         deuda_neta_ebitda = deuda_neta / datos["ebitda"]
-        if deuda_neta_ebitda > 3:
-            advertencias.append("Deuda neta/EBITDA > 3: apalancamiento elevado.")
-            solvencia.append("Apalancamiento alto.")
 
-    valoracion_exigente = (per is not None and per > 25) or (ev_ebitda is not None and ev_ebitda > 15)
-    rentabilidad_sana = roe is not None and roe >= 0.10
-    apalancamiento_alto = deuda_neta_ebitda is not None and deuda_neta_ebitda > 3
+    # Interpretación por tramos de la tabla de reglas.
+    variables = {**ratios, "Deuda neta/EBITDA": deuda_neta_ebitda, "fcf": datos["fcf"]}
+    tramos = {}
+    for nombre, regla, variable, bloque in _REGLAS_RATIOS:
+        t = tramos[nombre] = regla.tramo(variables[variable], perfil)
+        texto = regla.etiquetas[perfil][t]
+        if texto is not None:
+            bloques[bloque].append(texto)
+        aviso = regla.advertencias[t]
+        if aviso is not None:
+            advertencias.append(aviso)
+
+    # Los tramos superiores de PER/EV/EBITDA y de apalancamiento marcan el veredicto.
+    valoracion_exigente = tramos["per"] == 2 or tramos["ev_ebitda"] == 2
+    rentabilidad_sana = tramos["roe"] >= 1
+    apalancamiento_alto = tramos["apalancamiento"] == 2
+    fcf_debil = tramos["fcf"] == 0
 
     veredicto = "neutral"
     if not valoracion_exigente and rentabilidad_sana and not apalancamiento_alto:
         veredicto = "favorable"
-    elif valoracion_exigente or apalancamiento_alto or datos["fcf"] <= 0:
+    elif valoracion_exigente or apalancamiento_alto or fcf_debil:
         veredicto = "cautela"
 
     return {
         "ratios": ratios,
         "deuda_neta_ebitda": deuda_neta_ebitda,
-        "rentabilidad": rentabilidad,
-        "valoracion": valoracion,
-        "solvencia": solvencia,
-        "calidad_cash_flow": calidad_cash_flow,
+        **bloques,
         "advertencias": advertencias,
         "veredicto_preliminar": veredicto,
     }
 
 
-def calcular_dcf_perpetuo(datos, wacc):
-    """DCF perpetuo en 3 escenarios (conservador/base/optimista)."""
-    fcf = datos["fcf"]
-    deuda_neta = datos["deuda"] - datos["caja"]
-    n_acc = datos["numero_acciones"]
+def rejilla_escenarios(desplazamientos_g_pct, desplazamientos_wacc, g="g_base_pct", pesos=None):
+    """Escenarios de una rejilla g × WACC alrededor de ``g`` (p. ej. 5 × 5 = 25).
+
+    ``pesos``, si se indica, es una matriz con una fila por desplazamiento de g.
+    """
+    return tuple(
+        Escenario(f"g{dg:+.4g}/wacc{dw * 100:+.4g}", g, dg, dw, 1.0 if pesos is None else pesos[i][j])
+        for i, dg in enumerate(desplazamientos_g_pct)
+        for j, dw in enumerate(desplazamientos_wacc)
+    )
+
 
-    escenarios = {
-        "Conservador": (datos["g_conservador_pct"] / 100, wacc + 0.01),
-        "Base": (datos["g_base_pct"] / 100, wacc),
-        "Optimista": (datos["g_optimista_pct"] / 100, max(wacc - 0.01, 0.0001)),
+@lru_cache(maxsize=64)
+def pesos_escenarios(escenarios):
+    """Valida un conjunto de escenarios y devuelve sus pesos normalizados (suman 1)."""
+    if not escenarios:
+        raise ValueError("Hace falta al menos un escenario para el DCF perpetuo.")
+    for esc in escenarios:
+        if not isinstance(esc.nombre, str) or not esc.nombre:
+            raise ValueError(f"El nombre de un escenario debe ser un texto no vacío, no {esc.nombre!r}.")
+        if esc.nombre.lower() in NOMBRES_RESERVADOS:
+            raise ValueError(f"Escenario '{esc.nombre}': nombre reservado ({', '.join(NOMBRES_RESERVADOS)}).")
+    if len({esc.nombre.lower() for esc in escenarios}) != len(escenarios):
+        raise ValueError("Los nombres de los escenarios deben ser únicos (sin distinguir mayúsculas).")
+    for esc in escenarios:
+        if isinstance(esc.g, str):
+            if esc.g not in CAMPOS_CRECIMIENTO:
+                campos = ", ".join(CAMPOS_CRECIMIENTO)
+                raise ValueError(f"Escenario '{esc.nombre}': g debe ser uno de {campos} o un número, no '{esc.g}'.")
+        elif isinstance(esc.g, bool) or not isinstance(esc.g, (int, float)) or not math.isfinite(esc.g):
+            raise ValueError(f"Escenario '{esc.nombre}': g no válido ({esc.g!r}).")
+        for campo in ("desplazamiento_g_pct", "desplazamiento_wacc", "peso"):
+            numero = getattr(esc, campo)
+            if isinstance(numero, bool) or not isinstance(numero, (int, float)) or not math.isfinite(numero):
+                raise ValueError(f"Escenario '{esc.nombre}': {campo} no válido ({numero!r}).")
+    if any(esc.peso < 0 for esc in escenarios):
+        raise ValueError("Los pesos de los escenarios no pueden ser negativos.")
+    total = sum(esc.peso for esc in escenarios)
+    if total <= 0:
+        raise ValueError("Los pesos de los escenarios deben sumar más de 0.")
+    return tuple(esc.peso / total for esc in escenarios)
+
+
+def leer_escenarios(valor):
+    """Escenarios del DCF perpetuo desde JSON en línea o desde la ruta de un fichero JSON.
+
+    El JSON es una lista de objetos con los campos de ``Escenario``.
+    """
+    if valor is None:
+        return ESCENARIOS_PERPETUO
+    if valor.lstrip().startswith("["):
+        texto, origen = valor, "la lista JSON en línea"
+    else:
+        with open(valor, encoding="utf-8") as fichero:
+            texto, origen = fichero.read(), valor
+    try:
+        escenarios = tuple(Escenario(**escenario) for escenario in json.loads(texto))
+    except (TypeError, json.JSONDecodeError) as error:
+        raise ValueError(f"Escenarios no válidos en {origen}: {error}") from None
+    pesos_escenarios(escenarios)
+    return escenarios
+
+
+def supuestos_dcf_perpetuo(datos, wacc, escenarios=ESCENARIOS_PERPETUO):
+    """Pares (g, WACC) de cada escenario del DCF perpetuo."""
+    supuestos = {}
+    for esc in escenarios:
+        g_pct = datos[esc.g] if isinstance(esc.g, str) else esc.g
+        if esc.desplazamiento_g_pct:
+            g_pct = g_pct + esc.desplazamiento_g_pct
+        wacc_esc = wacc + esc.desplazamiento_wacc
+        if esc.desplazamiento_wacc < 0:
+            wacc_esc = max(wacc_esc, WACC_MINIMO_ESCENARIO)
+        supuestos[esc.nombre] = (g_pct / 100, wacc_esc)
+    return supuestos
+
+
+def calcular_escenario_perpetuo(fcf, deuda_neta, n_acc, g, wacc_esc):
+    """Valora un único escenario del DCF perpetuo (Gordon)."""
+    if g >= wacc_esc:
+        return {"error": "Error crítico: g ≥ WACC."}
+    if wacc_esc <= 0:
+        return {"error": "Error crítico: WACC <= 0."}
+    if n_acc == 0:
+        return {"error": "No se puede calcular precio: Nº de acciones = 0."}
+
+    valor_empresa = fcf * (1 + g) / (wacc_esc - g)
+    valor_equity = valor_empresa - deuda_neta
+    precio = valor_equity / n_acc
+    return {
+        "g": g,
+        "wacc": wacc_esc,
+        "valor_empresa": valor_empresa,
+        "valor_equity": valor_equity,
+        "precio": precio,
     }
 
-    resultados = {}
-    advertencias = []
-    for nombre, (g, wacc_esc) in escenarios.items():
-        if g >= wacc_esc:
-            resultados[nombre] = {"error": "Error crítico: g ≥ WACC."}
-            continue
-        if wacc_esc <= 0:
-            resultados[nombre] = {"error": "Error crítico: WACC <= 0."}
-            continue
-        if n_acc == 0:
-            resultados[nombre] = {"error": "No se puede calcular precio: Nº de acciones = 0."}
-            continue
-
-        valor_empresa = fcf * (1 + g) / (wacc_esc - g)
-        valor_equity = valor_empresa - deuda_neta
-        precio = valor_equity / n_acc
-        resultados[nombre] = {
-            "g": g,
-            "wacc": wacc_esc,
-            "valor_empresa": valor_empresa,
-            "valor_equity": valor_equity,
-            "precio": precio,
-        }
 
-    precio_base = resultados.get("Base", {}).get("precio")
-    clasificacion = None
-    if precio_base is not None and precio_base != 0:
-        diff = (datos["precio_accion"] - precio_base) / precio_base
-        if diff < -0.20:
-            clasificacion = "Infravalorada"
-        elif diff <= 0.20:
-            clasificacion = "Precio razonable"
-        else:
-            clasificacion = "Sobrevalorada"
+def precio_esperado(resultados, pesos):
+    """Media ponderada de los precios; ``None`` si falta el de algún escenario con peso."""
+    esperado = 0.0
+    for info, peso in zip(resultados.values(), pesos):
+        if peso:
+            if "precio" not in info:
+                return None
+            esperado += peso * info["precio"]
+    return esperado
+
+
+def resumir_dcf_perpetuo(datos, resultados, pesos=None):
+    """Añade precio base, precio esperado, clasificación de mercado y advertencias.
 
+    El precio base es el del escenario ``Base`` o, si el conjunto no lo tiene,
+    el esperado. Sin ``pesos``, todos los escenarios pesan lo mismo.
+    """
+    if pesos is None:
+        pesos = (1 / len(resultados),) * len(resultados)
+    esperado = precio_esperado(resultados, pesos)
+    precio_base = resultados["Base"].get("precio") if "Base" in resultados else esperado
+    clasificacion = clasificar_precio(datos["precio_accion"], precio_base)
+
+    advertencias = []
     if datos["fcf"] <= 0:
         advertencias.append("FCF ≤ 0: el DCF perpetuo puede no ser fiable.")
 
     return {
         "escenarios": resultados,
         "precio_base": precio_base,
+        "precio_esperado": esperado,
         "clasificacion_mercado": clasificacion,
         "advertencias": advertencias,
     }
 
 
-def calcular_dcf_proyeccion(datos, wacc):
-    """DCF de 5 años + valor terminal con crecimientos automáticos."""
+def calcular_dcf_perpetuo(datos, wacc, escenarios=ESCENARIOS_PERPETUO):
+    """DCF perpetuo en cada escenario (conservador/base/optimista por defecto)."""
+    deuda_neta = datos["deuda"] - datos["caja"]
+    resultados = {
+        nombre: calcular_escenario_perpetuo(datos["fcf"], deuda_neta, datos["numero_acciones"], g, wacc_esc)
+        for nombre, (g, wacc_esc) in supuestos_dcf_perpetuo(datos, wacc, escenarios).items()
+    }
+    return resumir_dcf_perpetuo(datos, resultados, pesos_escenarios(tuple(escenarios)))
+
+
+def valorar_dcf_proyeccion(datos, wacc, anios=ANIOS_PROYECCION, perfil="lineal"):
+    """DCF de ``anios`` años + valor terminal, sin comparar con el precio de mercado."""
     fcf0 = datos["fcf"]
     g_terminal = datos["g_terminal_pct"] / 100
     deuda_neta = datos["deuda"] - datos["caja"]
@@ -235,7 +357,7 @@ def calcular_dcf_proyeccion(datos, wacc):
     if fcf0 <= 0:
         advertencias.append("FCF0 ≤ 0: la proyección puede no ser fiable.")
 
-    crecimientos = construir_crecimientos_decrecientes(datos["g_inicial_pct"], datos["g_terminal_pct"])
+    crecimientos = construir_crecimientos_decrecientes(datos["g_inicial_pct"], datos["g_terminal_pct"], anios, perfil)
     if any(g > 40 for g in crecimientos):
         advertencias.append("Algún crecimiento g_t es extremadamente alto (>40%).")
     elif any(g > 30 for g in crecimientos):
@@ -248,17 +370,18 @@ def calcular_dcf_proyeccion(datos, wacc):
     if n_acc == 0:
         return {"error": "No se puede calcular precio: Nº de acciones = 0.", "advertencias": advertencias}
 
+    factores = tabla_capitalizacion(wacc, anios)
     fcfs = []
     vps = []
     fcf_t = fcf0
-    for t, g_pct in enumerate(crecimientos, start=1):
+    for g_pct, factor in zip(crecimientos, factores):
         fcf_t = fcf_t * (1 + g_pct / 100)
-        vp = fcf_t / ((1 + wacc) ** t)
+        vp = fcf_t / factor
         fcfs.append(fcf_t)
         vps.append(vp)
 
     valor_terminal = (fcfs[-1] * (1 + g_terminal)) / (wacc - g_terminal)
-    vp_terminal = valor_terminal / ((1 + wacc) ** 5)
+    vp_terminal = valor_terminal / factores[-1]
     ev = sum(vps) + vp_terminal
     equity = ev - deuda_neta
     precio = equity / n_acc
@@ -267,16 +390,6 @@ def calcular_dcf_proyeccion(datos, wacc):
     if peso_terminal > 0.70:
         advertencias.append("El valor terminal representa >70% del EV total.")
 
-    clasificacion = None
-    if precio != 0:
-        diff = (datos["precio_accion"] - precio) / precio
-        if diff < -0.20:
-            clasificacion = "Infravalorada"
-        elif diff <= 0.20:
-            clasificacion = "Precio razonable"
-        else:
-            clasificacion = "Sobrevalorada"
-
     return {
         "crecimientos_pct": crecimientos,
         "fcf_proyectados": fcfs,
@@ -287,58 +400,136 @@ def calcular_dcf_proyeccion(datos, wacc):
         "ev": ev,
         "equity": equity,
         "precio": precio,
-        "clasificacion_mercado": clasificacion,
         "advertencias": advertencias,
     }
 
 
-def calcular_investment_score(ratios, fcf, precio_mercado, precio_dcf_base):
-    """Score cuantitativo 0-100 con desglose por bloques."""
-    score_val = 0
-    per = ratios["PER"]
-    ev_ebitda = ratios["EV/EBITDA"]
-    ev_fcf = ratios["EV/FCF"]
-
-    if per is not None:
-        score_val += 14 if per < 15 else 10 if per <= 25 else 4
-    if ev_ebitda is not None:
-        score_val += 14 if ev_ebitda < 8 else 10 if ev_ebitda <= 15 else 4
-    if ev_fcf is not None:
-        score_val += 12 if ev_fcf < 15 else 8 if ev_fcf <= 30 else 2
-
-    score_ren = 0
-    roe = ratios["ROE"]
-    margen = ratios["Margen EBITDA"]
-    if roe is not None:
-        score_ren += 13 if roe > 0.15 else 9 if roe >= 0.10 else 4
-    if margen is not None:
-        score_ren += 12 if margen > 0.25 else 8 if margen >= 0.15 else 3
-
-    score_riesgo = 0
-    dneb = ratios.get("Deuda neta/EBITDA")
-    if dneb is not None:
-        score_riesgo += 12 if dneb <= 2 else 8 if dneb <= 3 else 3
-    score_riesgo += 8 if fcf > 0 else 2
+def clasificar_dcf_proyeccion(datos, valoracion):
+    """Añade la clasificación de mercado a la salida de ``valorar_dcf_proyeccion``."""
+    if "error" in valoracion:
+        return valoracion
+    resultado = {k: v for k, v in valoracion.items() if k != "advertencias"}
+    resultado["clasificacion_mercado"] = clasificar_precio(datos["precio_accion"], resultado["precio"])
+    resultado["advertencias"] = valoracion["advertencias"]
+    return resultado
+
+
+def calcular_dcf_proyeccion(datos, wacc, anios=ANIOS_PROYECCION, perfil="lineal"):
+    """DCF de ``anios`` años (5 por defecto) + valor terminal con crecimientos automáticos."""
+    return clasificar_dcf_proyeccion(datos, valorar_dcf_proyeccion(datos, wacc, anios, perfil))
+
+
+def derivadas_escenario_perpetuo(fcf, deuda_neta, n_acc, g, wacc_esc, sensibilidad_wacc=1.0):
+    """Derivadas analíticas del precio de un escenario perpetuo; ``None`` si no hay precio.
+
+    Las tasas van en tanto por uno (una subida de 100 pb es 0,01).
+    ``sensibilidad_wacc`` es la derivada del WACC del escenario respecto al WACC
+    automático (0 si el escenario está en su suelo). Con un ``g`` o WACC ``NaN``
+    tampoco hay derivadas, como en ``derivadas_dcf_perpetuo_lote``.
+    """
+    if not (g < wacc_esc and wacc_esc > 0) or n_acc == 0:
+        return None
+    margen = wacc_esc - g
+    cuadrado = margen * margen * n_acc
+    cubo = cuadrado * margen
+    return {
+        "wacc": -fcf * (1 + g) / cuadrado * sensibilidad_wacc,
+        "g": fcf * (1 + wacc_esc) / cuadrado,
+        "fcf": (1 + g) / (margen * n_acc),
+        "deuda_neta": -1 / n_acc,
+        "segundas": {
+            "wacc": 2 * fcf * (1 + g) / cubo * sensibilidad_wacc,
+            "g": 2 * fcf * (1 + wacc_esc) / cubo,
+            "wacc_g": -fcf * (2 + wacc_esc + g) / cubo * sensibilidad_wacc,
+        },
+    }
+
+
+def derivadas_dcf_perpetuo(datos, wacc, escenarios=ESCENARIOS_PERPETUO):
+    """Derivadas del precio de cada escenario del DCF perpetuo respecto a sus entradas."""
+    deuda_neta = datos["deuda"] - datos["caja"]
+    return {
+        nombre: derivadas_escenario_perpetuo(
+            datos["fcf"],
+            deuda_neta,
+            datos["numero_acciones"],
+            g,
+            wacc_esc,
+            0.0 if wacc_esc == WACC_MINIMO_ESCENARIO else 1.0,
+        )
+        for nombre, (g, wacc_esc) in supuestos_dcf_perpetuo(datos, wacc, escenarios).items()
+    }
+
+
+def derivadas_dcf_proyeccion(datos, wacc, anios=ANIOS_PROYECCION, perfil="lineal"):
+    """Derivadas analíticas del precio del DCF por proyección; ``None`` si no hay precio.
+
+    ``g_inicial`` y ``g_terminal`` mueven toda la senda de crecimientos y
+    ``g_terminal`` también el valor terminal. Se acumulan por unidad de FCF0
+    en la misma pasada que el valor: ``duracion`` = Σ t·m_t/(1+wacc)^t,
+    ``convexidad`` = Σ t(t+1)·m_t/(1+wacc)^t, con m_t = Π (1 + g_s).
+    """
+    g_terminal = datos["g_terminal_pct"] / 100
+    n_acc = datos["numero_acciones"]
+    if not (g_terminal < wacc and wacc > 0) or n_acc == 0:
+        return None
+
+    factores = tabla_capitalizacion(wacc, anios)
+    multiplicador = 1.0
+    vp = duracion = convexidad = vp_inicial = vp_terminal = 0.0
+    senda_inicial = senda_terminal = 0.0  # d ln(m_t) / d g_inicial y / d g_terminal
+    for t, factor in enumerate(factores, 1):
+        g = crecimiento_proyectado(datos["g_inicial_pct"], datos["g_terminal_pct"], t, anios, perfil) / 100
+        s = sensibilidad_crecimiento(t, anios, perfil)
+        multiplicador *= 1 + g
+        senda_inicial += s / (1 + g)
+        senda_terminal += (1 - s) / (1 + g)
+        descontado = multiplicador / factor
+        vp += descontado
+        duracion += t * descontado
+        convexidad += t * (t + 1) * descontado
+        vp_inicial += descontado * senda_inicial
+        vp_terminal += descontado * senda_terminal
+
+    margen = wacc - g_terminal
+    terminal = multiplicador * (1 + g_terminal) / margen / factor
+    d_wacc = -(duracion + anios * terminal) / (1 + wacc) - terminal / margen
+    d2_wacc = convexidad / (1 + wacc) ** 2 + terminal * (
+        2 / margen**2 + 2 * anios / ((1 + wacc) * margen) + anios * (anios + 1) / (1 + wacc) ** 2
+    )
+    fcf0 = datos["fcf"]
+    d_g_terminal = vp_terminal + terminal * senda_terminal + multiplicador * (1 + wacc) / margen**2 / factor
+    return {
+        "wacc": fcf0 * d_wacc / n_acc,
+        "g_inicial": fcf0 * (vp_inicial + terminal * senda_inicial) / n_acc,
+        "g_terminal": fcf0 * d_g_terminal / n_acc,
+        "fcf": (vp + terminal) / n_acc,
+        "deuda_neta": -1 / n_acc,
+        "segundas": {"wacc": fcf0 * d2_wacc / n_acc},
+    }
+
+
+def calcular_investment_score(ratios, fcf, precio_mercado, precio_dcf_base, perfil=0):
+    """Score cuantitativo 0-100 con desglose por bloques (puntos de ``rules.REGLAS``)."""
+    score_val = (
+        valor("per", tramo("per", ratios["PER"], perfil))
+        + valor("ev_ebitda", tramo("ev_ebitda", ratios["EV/EBITDA"], perfil))
+        + valor("ev_fcf", tramo("ev_fcf", ratios["EV/FCF"], perfil))
+    )
+    score_ren = valor("roe", tramo("roe", ratios["ROE"], perfil)) + valor(
+        "margen_ebitda", tramo("margen_ebitda", ratios["Margen EBITDA"], perfil)
+    )
+    score_riesgo = valor("apalancamiento", tramo("apalancamiento", ratios.get("Deuda neta/EBITDA"), perfil)) + valor(
+        "fcf", tramo("fcf", fcf, perfil)
+    )
 
     score_dcf = 0
     if precio_dcf_base is not None and precio_dcf_base != 0:
         diff = (precio_mercado - precio_dcf_base) / precio_dcf_base
-        if diff < -0.20:
-            score_dcf = 15
-        elif diff <= 0.20:
-            score_dcf = 10
-        else:
-            score_dcf = 4
+        score_dcf = valor("diferencia_precio", tramo("diferencia_precio", diff))
 
     total = max(0, min(100, score_val + score_ren + score_riesgo + score_dcf))
-    if total >= 75:
-        clasificacion = "Compra"
-    elif total >= 60:
-        clasificacion = "Mantener"
-    elif total >= 45:
-        clasificacion = "Neutral"
-    else:
-        clasificacion = "Evitar"
+    clasificacion = etiqueta("clasificacion_score", tramo("clasificacion_score", total))
 
     return {
         "valoracion": score_val,
@@ -350,24 +541,58 @@ def calcular_investment_score(ratios, fcf, precio_mercado, precio_dcf_base):
     }
 
 
-def ejecutar_analisis(datos):
-    """Orquesta el análisis completo para la interfaz web."""
+def ejecutar_analisis(
+    datos,
+    anios_proyeccion=ANIOS_PROYECCION,
+    perfil_crecimiento="lineal",
+    criterios="estandar",
+    derivadas=False,
+    escenarios=ESCENARIOS_PERPETUO,
+):
+    """Orquesta el análisis completo para la interfaz web.
+
+    No modifica ``datos``: el tipo de empresa normalizado se devuelve en
+    ``wacc_info["tipo_empresa"]``. ``anios_proyeccion`` y ``perfil_crecimiento``
+    configuran el horizonte del DCF por proyección; con ``criterios="por_tipo"``
+    los cortes de PER y EV/EBITDA dependen del tipo de empresa. Con
+    ``derivadas=True`` añade ``derivadas`` con las de ``derivadas_dcf_perpetuo``
+    y ``derivadas_dcf_proyeccion`` (respecto al WACC automático).
+    ``escenarios`` (secuencia de ``Escenario``) sustituye a los tres escenarios
+    del DCF perpetuo.
+    """
+    escenarios = tuple(escenarios)
+    instr = instrumentation.ACTIVA
+    if instr:
+        t = instr.reloj()
+
     deuda_neta = datos["deuda"] - datos["caja"]
     wacc_info = calcular_wacc_automatico(datos["tipo_empresa"], deuda_neta, datos["ebitda"])
-    datos["tipo_empresa"] = wacc_info["tipo_empresa"]
+    datos = {**datos, "tipo_empresa": wacc_info["tipo_empresa"]}
+    perfil = indice_perfil(wacc_info["tipo_empresa"], criterios)
+    if instr:
+        t = instr.etapa("wacc", t)
 
-    ratios_info = calcular_ratios(datos)
+    ratios_info = calcular_ratios(datos, perfil)
     ratios_info["ratios"]["Deuda neta/EBITDA"] = wacc_info["deuda_neta_ebitda"]
+    if instr:
+        t = instr.etapa("ratios", t)
 
-    dcf_perpetuo = calcular_dcf_perpetuo(datos, wacc_info["wacc"])
-    dcf_proyeccion = calcular_dcf_proyeccion(datos, wacc_info["wacc"])
+    dcf_perpetuo = calcular_dcf_perpetuo(datos, wacc_info["wacc"], escenarios)
+    if instr:
+        t = instr.etapa("dcf_perpetuo", t)
+    dcf_proyeccion = calcular_dcf_proyeccion(datos, wacc_info["wacc"], anios_proyeccion, perfil_crecimiento)
+    if instr:
+        t = instr.etapa("dcf_proyeccion", t)
 
     score = calcular_investment_score(
         ratios_info["ratios"],
         datos["fcf"],
         datos["precio_accion"],
         dcf_perpetuo["precio_base"],
+        perfil,
     )
+    if instr:
+        t = instr.etapa("score", t)
 
     comparacion = None
     precio_perpetuo = dcf_perpetuo["precio_base"]
@@ -386,7 +611,7 @@ def ejecutar_analisis(datos):
         else:
             comparacion = "Ambos DCF son coherentes con supuestos de crecimiento similares."
 
-    return {
+    resultado = {
         "wacc_info": wacc_info,
         "ratios_info": ratios_info,
         "dcf_perpetuo": dcf_perpetuo,
@@ -394,3 +619,11 @@ def ejecutar_analisis(datos):
         "score": score,
         "comparacion_dcf": comparacion,
     }
+    if derivadas:
+        resultado["derivadas"] = {
+            "perpetuo": derivadas_dcf_perpetuo(datos, wacc_info["wacc"], escenarios),
+            "proyeccion": derivadas_dcf_proyeccion(datos, wacc_info["wacc"], anios_proyeccion, perfil_crecimiento),
+        }
+    if instr:
+        instr.registrar_resultado(resultado)
+    return resultado
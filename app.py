@@ -1,77 +1,72 @@
 """Mini app web de análisis financiero (MVP) con Streamlit."""
 
+import hashlib
+import io
+import os
+
+import altair as alt
+import numpy as np
 import streamlit as st
 
-from analysis import ejecutar_analisis
+import instrumentation
+from analysis import ANIOS_PROYECCION, PERFILES_CRECIMIENTO
+from batch import CAMPOS, aplanar_resultado, columnas_desde_registros, ejecutar_analisis_lote
+from cache import CacheAnalisis
+from montecarlo import distribucion_normal, simular_dcf_proyeccion
+from ranking import percentiles_resultado
+from sensitivity import (
+    METRICAS_TORNADO,
+    VARIABLES_RELATIVAS,
+    calcular_rejilla_dcf_perpetuo,
+    calcular_tornado,
+    rango_centrado,
+)
+from streaming import agrupar_en_lotes, leer_fundamentales
 
+MODO_INDIVIDUAL = "Empresa individual"
+MODO_MASIVO = "Carga masiva (CSV)"
+TAMANO_LOTE_APP = 2_000
+COLUMNAS_REJILLA = (
+    "tipo_empresa",
+    "PER",
+    "EV/EBITDA",
+    "ROE",
+    "Margen EBITDA",
+    "Deuda neta/EBITDA",
+    "precio_base",
+    "precio_proyeccion",
+    "clasificacion_mercado_perpetuo",
+    "score_total",
+    "score_clasificacion",
+    "percentil_score_total",
+    "percentil_tipo_score_total",
+)
 
-st.set_page_config(page_title="Análisis Financiero MVP", layout="wide")
-st.title("📊 Mini App de Análisis Financiero")
-st.caption("Ratios + DCF perpetuo + DCF 5 años + Investment Score")
-
-# Interfaz en dos columnas para mantener diseño limpio.
-col1, col2 = st.columns(2)
-
-with col1:
-    st.subheader("Datos de empresa")
-    tipo_empresa = st.selectbox("Tipo de empresa", ["growth", "madura", "defensiva", "cíclica"])
-    ingresos = st.number_input("Ingresos", min_value=0.0, value=1000.0, step=10.0)
-    ebitda = st.number_input("EBITDA", value=200.0, step=10.0)
-    fcf = st.number_input("FCF actual", value=120.0, step=10.0)
-    deuda = st.number_input("Deuda total", min_value=0.0, value=300.0, step=10.0)
-    caja = st.number_input("Caja disponible", min_value=0.0, value=100.0, step=10.0)
-    precio_accion = st.number_input("Precio de la acción", min_value=0.0, value=20.0, step=0.5)
-    numero_acciones = st.number_input("Número de acciones", min_value=0.0, value=100.0, step=1.0)
-    patrimonio_neto = st.number_input("Patrimonio neto", value=500.0, step=10.0)
-    activos_totales = st.number_input("Activos totales", value=1500.0, step=10.0)
-    beneficio_neto = st.number_input("Beneficio neto", value=80.0, step=10.0)
-
-with col2:
-    st.subheader("Supuestos DCF")
-    st.markdown("**DCF perpetuo (escenarios de crecimiento)**")
-    g_conservador_pct = st.number_input("g conservador (%)", value=1.5, step=0.1)
-    g_base_pct = st.number_input("g base (%)", value=2.0, step=0.1)
-    g_optimista_pct = st.number_input("g optimista (%)", value=2.5, step=0.1)
-
-    st.markdown("**DCF por proyección (5 años + terminal)**")
-    g_inicial_pct = st.number_input("Crecimiento inicial (%)", value=10.0, step=0.5)
-    g_terminal_pct = st.number_input("Crecimiento terminal (%)", value=2.0, step=0.1)
-
-if st.button("Analizar empresa", type="primary"):
-    # Validaciones de coherencia de input.
-    errores = []
-    if numero_acciones <= 0:
-        errores.append("El número de acciones debe ser mayor que 0.")
-    if precio_accion <= 0:
-        errores.append("El precio de la acción debe ser mayor que 0.")
-    if g_terminal_pct > g_inicial_pct:
-        errores.append("El crecimiento terminal no debe superar al crecimiento inicial para la senda decreciente.")
-
-    if errores:
-        for e in errores:
-            st.error(e)
-        st.stop()
-
-    datos = {
-        "tipo_empresa": tipo_empresa,
-        "ingresos": ingresos,
-        "ebitda": ebitda,
-        "fcf": fcf,
-        "deuda": deuda,
-        "caja": caja,
-        "precio_accion": precio_accion,
-        "numero_acciones": numero_acciones,
-        "patrimonio_neto": patrimonio_neto,
-        "activos_totales": activos_totales,
-        "beneficio_neto": beneficio_neto,
-        "g_conservador_pct": g_conservador_pct,
-        "g_base_pct": g_base_pct,
-        "g_optimista_pct": g_optimista_pct,
-        "g_inicial_pct": g_inicial_pct,
-        "g_terminal_pct": g_terminal_pct,
-    }
-
-    resultado = ejecutar_analisis(datos)
+
+@st.cache_resource
+def cache_analisis():
+    """Caché de análisis compartida entre reruns y sesiones de Streamlit."""
+    return CacheAnalisis(max_entradas=256, ttl_segundos=3600)
+
+
+def analizar_en_cache(datos, anios_proyeccion=ANIOS_PROYECCION, perfil_crecimiento="lineal"):
+    """Análisis memoizado con la clave canónica de ``datos`` y de las opciones (resultado de sólo lectura)."""
+    return cache_analisis().analizar(datos, anios_proyeccion=anios_proyeccion, perfil_crecimiento=perfil_crecimiento)
+
+
+# Métricas opcionales: con ANALISIS_METRICAS=/ruta/metricas.prom se instrumenta el
+# análisis y el renderizado, y se vuelca el fichero tras cada ejecución.
+if os.environ.get("ANALISIS_METRICAS") and instrumentation.ACTIVA is None:
+    instrumentation.activar(
+        instrumentation.Instrumentacion([instrumentation.ExportadorPrometheus(os.environ["ANALISIS_METRICAS"])])
+    )
+
+
+def mostrar_analisis(datos, resultado, anios_proyeccion, montecarlo=None, perfil_crecimiento="lineal"):
+    """Renderiza el análisis completo de una empresa (vista individual y detalle del lote)."""
+    instr = instrumentation.ACTIVA
+    if instr:
+        inicio_render = instr.reloj()
 
     st.subheader("WACC automático")
     st.write(f"**WACC final:** {resultado['wacc_info']['wacc'] * 100:.2f}%")
@@ -105,7 +100,88 @@ if st.button("Analizar empresa", type="primary"):
             )
     st.table(dcf_perpetuo_rows)
 
-    st.subheader("DCF por proyección (5 años)")
+    st.markdown("**Sensibilidad del precio teórico (WACC × g)**")
+    rejilla = calcular_rejilla_dcf_perpetuo(
+        datos,
+        rango_centrado(resultado["wacc_info"]["wacc"], 0.03, 25),
+        rango_centrado(datos["g_base_pct"], 2.0, 25),
+    )
+    celdas = [
+        {"WACC (%)": round(w * 100, 2), "g (%)": round(g, 2), "Precio teórico": float(rejilla["precios"][i, j])}
+        for i, w in enumerate(rejilla["waccs"])
+        for j, g in enumerate(rejilla["gs_pct"])
+        if rejilla["valido"][i, j]
+    ]
+    st.altair_chart(
+        alt.Chart(alt.Data(values=celdas))
+        .mark_rect()
+        .encode(
+            x=alt.X("g (%):O"),
+            y=alt.Y("WACC (%):O", sort="descending"),
+            color=alt.Color("Precio teórico:Q", scale=alt.Scale(scheme="redyellowgreen")),
+            tooltip=["WACC (%):O", "g (%):O", alt.Tooltip("Precio teórico:Q", format=".2f")],
+        ),
+        use_container_width=True,
+    )
+    st.caption("Las celdas con g ≥ WACC no tienen valor y se dejan en blanco.")
+
+    st.markdown("**Análisis tornado**")
+    col1, col2, col3 = st.columns(3)
+    variacion_relativa = col1.number_input("Variación de importes (%)", min_value=1.0, value=10.0, step=1.0) / 100
+    variacion_pp = col2.number_input("Variación de tasas (p.p.)", min_value=0.1, value=1.0, step=0.1)
+    metrica = col3.selectbox("Impacto sobre", METRICAS_TORNADO)
+    tornado = calcular_tornado(
+        datos,
+        variacion_relativa,
+        variacion_pp,
+        orden=metrica,
+        anios_proyeccion=anios_proyeccion,
+        perfil_crecimiento=perfil_crecimiento,
+    )
+    base_metrica = tornado["base"][metrica]
+    if base_metrica is None:
+        st.caption("La métrica base no se puede calcular con estos datos.")
+    else:
+        barras = [
+            {"Variable": fila["variable"], "Movimiento": movimiento, "Cambio": fila[f"{metrica}_{lado}"] - base_metrica}
+            for fila in tornado["filas"]
+            for movimiento, lado in (("Abajo", "bajo"), ("Arriba", "alto"))
+            if fila[f"{metrica}_{lado}"] is not None
+        ]
+        st.altair_chart(
+            alt.Chart(alt.Data(values=barras))
+            .mark_bar()
+            .encode(
+                x=alt.X("Cambio:Q", title=f"Cambio en {metrica}"),
+                y=alt.Y("Variable:N", sort=[fila["variable"] for fila in tornado["filas"]]),
+                color="Movimiento:N",
+                tooltip=["Variable:N", "Movimiento:N", alt.Tooltip("Cambio:Q", format=".2f")],
+            ),
+            use_container_width=True,
+        )
+
+    def cifra(valor):
+        return "N/A" if valor is None else f"{valor:.2f}"
+
+    st.table(
+        [
+            {
+                "Variable": fila["variable"],
+                "Bajo": f"{fila['valor_bajo']:.4g}",
+                "Alto": f"{fila['valor_alto']:.4g}",
+                "Impacto precio perpetuo": cifra(fila["impacto_precio_base"]),
+                "Impacto precio proyección": cifra(fila["impacto_precio_proyeccion"]),
+                "Impacto score": fila["impacto_score_total"],
+            }
+            for fila in tornado["filas"]
+        ]
+    )
+    st.caption(
+        f"Importes ({', '.join(VARIABLES_RELATIVAS)}) ±{variacion_relativa:.0%}; "
+        f"crecimientos y WACC ±{variacion_pp:g} p.p."
+    )
+
+    st.subheader(f"DCF por proyección ({anios_proyeccion} años)")
     dcf_proj = resultado["dcf_proyeccion"]
     if "error" in dcf_proj:
         st.error(dcf_proj["error"])
@@ -130,12 +206,42 @@ if st.button("Analizar empresa", type="primary"):
         st.write(f"**Valor equity:** {dcf_proj['equity']:.2f}")
         st.write(f"**Precio teórico por acción:** {dcf_proj['precio']:.2f}")
 
+    if montecarlo:
+        st.markdown("**Monte Carlo del DCF por proyección**")
+        simulacion = simular_dcf_proyeccion(
+            datos,
+            distribucion_normal(datos["g_inicial_pct"], montecarlo["desv_g_inicial"]),
+            distribucion_normal(datos["g_terminal_pct"], montecarlo["desv_g_terminal"]),
+            distribucion_normal(resultado["wacc_info"]["wacc"], montecarlo["desv_wacc"] / 100),
+            n_simulaciones=montecarlo["simulaciones"],
+            semilla=int(montecarlo["semilla"]),
+            anios=anios_proyeccion,
+            perfil=perfil_crecimiento,
+        )
+        if "error" in simulacion:
+            st.error(simulacion["error"])
+        else:
+            st.table(
+                [{"Percentil": f"P{p}", "Precio teórico": f"{v:.2f}"} for p, v in simulacion["percentiles"].items()]
+            )
+            st.write(f"**Probabilidad de 'Infravalorada':** {simulacion['prob_infravalorada']:.1%}")
+            st.write(f"**Probabilidad de 'Sobrevalorada':** {simulacion['prob_sobrevalorada']:.1%}")
+            if simulacion["proporcion_valida"] < 1:
+                st.caption(
+                    f"Se descartaron {1 - simulacion['proporcion_valida']:.1%} de las trayectorias por g_terminal ≥ WACC."
+                )
+
     st.subheader("Precio teórico vs mercado")
     precio_base = resultado["dcf_perpetuo"]["precio_base"]
+    precio_esperado = resultado["dcf_perpetuo"]["precio_esperado"]
     precio_proj = resultado["dcf_proyeccion"].get("precio") if isinstance(resultado["dcf_proyeccion"], dict) else None
     comparativa = [
         {"Métrica": "Precio mercado", "Valor": f"{datos['precio_accion']:.2f}"},
         {"Métrica": "Precio DCF perpetuo (base)", "Valor": "N/A" if precio_base is None else f"{precio_base:.2f}"},
+        {
+            "Métrica": "Precio DCF perpetuo (esperado)",
+            "Valor": "N/A" if precio_esperado is None else f"{precio_esperado:.2f}",
+        },
         {"Métrica": "Precio DCF proyección", "Valor": "N/A" if precio_proj is None else f"{precio_proj:.2f}"},
     ]
     st.table(comparativa)
@@ -168,3 +274,211 @@ if st.button("Analizar empresa", type="primary"):
             st.warning(a)
     else:
         st.success("Sin advertencias críticas con los supuestos actuales.")
+
+    if instr:
+        instr.etapa("render_app", inicio_render)
+        instr.exportar()
+
+
+def vista_individual():
+    # Interfaz en dos columnas para mantener diseño limpio.
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Datos de empresa")
+        tipo_empresa = st.selectbox("Tipo de empresa", ["growth", "madura", "defensiva", "cíclica"])
+        ingresos = st.number_input("Ingresos", min_value=0.0, value=1000.0, step=10.0)
+        ebitda = st.number_input("EBITDA", value=200.0, step=10.0)
+        fcf = st.number_input("FCF actual", value=120.0, step=10.0)
+        deuda = st.number_input("Deuda total", min_value=0.0, value=300.0, step=10.0)
+        caja = st.number_input("Caja disponible", min_value=0.0, value=100.0, step=10.0)
+        precio_accion = st.number_input("Precio de la acción", min_value=0.0, value=20.0, step=0.5)
+        numero_acciones = st.number_input("Número de acciones", min_value=0.0, value=100.0, step=1.0)
+        patrimonio_neto = st.number_input("Patrimonio neto", value=500.0, step=10.0)
+        activos_totales = st.number_input("Activos totales", value=1500.0, step=10.0)
+        beneficio_neto = st.number_input("Beneficio neto", value=80.0, step=10.0)
+
+    with col2:
+        st.subheader("Supuestos DCF")
+        st.markdown("**DCF perpetuo (escenarios de crecimiento)**")
+        g_conservador_pct = st.number_input("g conservador (%)", value=1.5, step=0.1)
+        g_base_pct = st.number_input("g base (%)", value=2.0, step=0.1)
+        g_optimista_pct = st.number_input("g optimista (%)", value=2.5, step=0.1)
+
+        st.markdown("**DCF por proyección (N años + terminal)**")
+        g_inicial_pct = st.number_input("Crecimiento inicial (%)", value=10.0, step=0.5)
+        g_terminal_pct = st.number_input("Crecimiento terminal (%)", value=2.0, step=0.1)
+        anios_proyeccion = st.slider("Horizonte de proyección (años)", min_value=1, max_value=50, value=ANIOS_PROYECCION)
+        perfil_crecimiento = st.selectbox("Senda hacia g terminal", PERFILES_CRECIMIENTO)
+
+        with st.expander("Monte Carlo del DCF por proyección"):
+            mc_activo = st.checkbox("Simular incertidumbre", value=False)
+            mc_desv_g_inicial = st.number_input("Desviación g inicial (p.p.)", min_value=0.0, value=3.0, step=0.5)
+            mc_desv_g_terminal = st.number_input("Desviación g terminal (p.p.)", min_value=0.0, value=0.5, step=0.1)
+            mc_desv_wacc = st.number_input("Desviación WACC (p.p.)", min_value=0.0, value=1.0, step=0.1)
+            mc_simulaciones = st.selectbox("Nº de simulaciones", [100_000, 1_000_000], index=1)
+            mc_semilla = st.number_input("Semilla", min_value=0, value=42, step=1)
+
+    if st.button("Analizar empresa", type="primary"):
+        # Validaciones de coherencia de input.
+        errores = []
+        if numero_acciones <= 0:
+            errores.append("El número de acciones debe ser mayor que 0.")
+        if precio_accion <= 0:
+            errores.append("El precio de la acción debe ser mayor que 0.")
+        if g_terminal_pct > g_inicial_pct:
+            errores.append("El crecimiento terminal no debe superar al crecimiento inicial para la senda decreciente.")
+
+        if errores:
+            for e in errores:
+                st.error(e)
+            st.stop()
+
+        datos = {
+            "tipo_empresa": tipo_empresa,
+            "ingresos": ingresos,
+            "ebitda": ebitda,
+            "fcf": fcf,
+            "deuda": deuda,
+            "caja": caja,
+            "precio_accion": precio_accion,
+            "numero_acciones": numero_acciones,
+            "patrimonio_neto": patrimonio_neto,
+            "activos_totales": activos_totales,
+            "beneficio_neto": beneficio_neto,
+            "g_conservador_pct": g_conservador_pct,
+            "g_base_pct": g_base_pct,
+            "g_optimista_pct": g_optimista_pct,
+            "g_inicial_pct": g_inicial_pct,
+            "g_terminal_pct": g_terminal_pct,
+        }
+
+        montecarlo = None
+        if mc_activo:
+            montecarlo = {
+                "desv_g_inicial": mc_desv_g_inicial,
+                "desv_g_terminal": mc_desv_g_terminal,
+                "desv_wacc": mc_desv_wacc,
+                "simulaciones": mc_simulaciones,
+                "semilla": mc_semilla,
+            }
+        # La empresa analizada se guarda en la sesión: tocar los controles del
+        # tornado vuelve a ejecutar el script con el botón sin pulsar.
+        st.session_state["individual"] = {
+            "datos": datos,
+            "anios_proyeccion": anios_proyeccion,
+            "perfil_crecimiento": perfil_crecimiento,
+            "montecarlo": montecarlo,
+        }
+
+    individual = st.session_state.get("individual")
+    if individual is not None:
+        datos = individual["datos"]
+        resultado = analizar_en_cache(datos, individual["anios_proyeccion"], individual["perfil_crecimiento"])
+        mostrar_analisis(
+            datos,
+            resultado,
+            individual["anios_proyeccion"],
+            individual["montecarlo"],
+            individual["perfil_crecimiento"],
+        )
+
+
+def _analizar_csv(contenido, anios_proyeccion, perfil_crecimiento):
+    """Analiza el CSV subido lote a lote y actualiza la barra de progreso al terminar cada lote."""
+    registros = list(leer_fundamentales(io.StringIO(contenido.decode("utf-8-sig")), "csv"))
+    barra = st.progress(0.0, text="Analizando empresas...")
+    partes = []
+    hechas = 0
+    for lote in agrupar_en_lotes(registros, TAMANO_LOTE_APP):
+        resultado = ejecutar_analisis_lote(columnas_desde_registros(lote), anios_proyeccion, perfil_crecimiento)
+        partes.append(aplanar_resultado(resultado))
+        hechas += len(lote)
+        barra.progress(hechas / len(registros), text=f"{hechas:,} de {len(registros):,} empresas analizadas")
+    barra.empty()
+    planas = {nombre: np.concatenate([parte[nombre] for parte in partes]) for nombre in partes[0]} if partes else {}
+    if planas:
+        # Percentiles sobre el CSV completo, no por lote.
+        planas.update(percentiles_resultado(planas))
+    return registros, planas
+
+
+def vista_masiva():
+    st.subheader("Carga masiva")
+    st.caption(
+        "CSV con una fila por empresa y columnas iguales a los campos de `datos`; "
+        "el resto de columnas (por ejemplo `ticker`) se conservan."
+    )
+    archivo = st.file_uploader("CSV de empresas", type=["csv"])
+    col1, col2 = st.columns(2)
+    anios_proyeccion = col1.slider(
+        "Horizonte de proyección (años)", min_value=1, max_value=50, value=ANIOS_PROYECCION, key="anios_lote"
+    )
+    perfil_crecimiento = col2.selectbox("Senda hacia g terminal", PERFILES_CRECIMIENTO, key="perfil_lote")
+    if archivo is None:
+        return
+
+    # El lote analizado se guarda en la sesión: ordenar, paginar o abrir un
+    # detalle no vuelve a analizar el fichero.
+    contenido = archivo.getvalue()
+    firma = (hashlib.sha256(contenido).hexdigest(), anios_proyeccion, perfil_crecimiento)
+    lote = st.session_state.get("lote")
+    if lote is None or lote["firma"] != firma:
+        try:
+            registros, planas = _analizar_csv(contenido, anios_proyeccion, perfil_crecimiento)
+        except (ValueError, UnicodeDecodeError) as error:
+            st.error(f"No se pudo leer el CSV: {error}")
+            return
+        if not registros:
+            st.warning("El CSV no contiene empresas.")
+            return
+        lote = {"firma": firma, "registros": registros, "planas": planas, "ordenes": {}}
+        st.session_state["lote"] = lote
+
+    registros = lote["registros"]
+    planas = lote["planas"]
+    n = len(registros)
+    extras = [campo for campo in registros[0] if campo not in CAMPOS]
+    numericas = [nombre for nombre in COLUMNAS_REJILLA if planas[nombre].dtype.kind in "fiu"]
+
+    col1, col2, col3 = st.columns(3)
+    orden = col1.selectbox("Ordenar por", numericas, index=numericas.index("score_total"))
+    descendente = col2.checkbox("Descendente", value=True)
+    tamano_pagina = col3.selectbox("Filas por página", [25, 50, 100, 250], index=1)
+    paginas = max(1, -(-n // tamano_pagina))
+    pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, step=1)
+
+    if (orden, descendente) not in lote["ordenes"]:
+        valores = planas[orden].astype(np.float64)
+        # argsort deja los NaN al final en ambos sentidos.
+        lote["ordenes"][(orden, descendente)] = np.argsort(-valores if descendente else valores, kind="stable")
+    visibles = lote["ordenes"][(orden, descendente)][(pagina - 1) * tamano_pagina : pagina * tamano_pagina]
+
+    # Sólo las filas de la página actual se convierten y se envían al navegador.
+    tabla = {"Fila": (visibles + 1).tolist()}
+    for campo in extras:
+        tabla[campo] = [registros[i][campo] for i in visibles]
+    for nombre in COLUMNAS_REJILLA:
+        tabla[nombre] = [None if isinstance(v, float) and v != v else v for v in planas[nombre][visibles].tolist()]
+    st.dataframe(tabla, use_container_width=True, hide_index=True)
+    st.caption(f"{n:,} empresas analizadas.")
+
+    def etiqueta(i):
+        return f"Fila {i + 1}" + (f" · {registros[i][extras[0]]}" if extras else "")
+
+    elegida = st.selectbox("Detalle de la empresa", visibles.tolist(), format_func=etiqueta)
+    if st.checkbox("Mostrar detalle"):
+        datos = {campo: registros[elegida][campo] for campo in CAMPOS}
+        resultado = analizar_en_cache(datos, anios_proyeccion, perfil_crecimiento)
+        mostrar_analisis(datos, resultado, anios_proyeccion, perfil_crecimiento=perfil_crecimiento)
+
+
+st.set_page_config(page_title="Análisis Financiero MVP", layout="wide")
+st.title("📊 Mini App de Análisis Financiero")
+st.caption("Ratios + DCF perpetuo + DCF por proyección + Investment Score")
+
+modo = st.sidebar.radio("Modo", (MODO_INDIVIDUAL, MODO_MASIVO))
+if modo == MODO_INDIVIDUAL:
+    vista_individual()
+else:
+    vista_masiva()
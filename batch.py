@@ -0,0 +1,562 @@
+"""Motor vectorizado para analizar universos completos de empresas.
+
+Reproduce con NumPy las mismas reglas de ``analysis.py`` sobre columnas: cada
+campo de ``datos`` pasa a ser un array con una posición por empresa. Los
+divisores nulos y los casos ``g ≥ WACC`` se tratan con máscaras en lugar de
+ramas, y los valores ``None`` del motor escalar se representan como ``NaN``.
+"""
+
+import numpy as np
+
+import instrumentation
+from analysis import (
+    ANIOS_PROYECCION,
+    ESCENARIOS_PERPETUO,
+    TIPO_EMPRESA_POR_DEFECTO,
+    WACC_BASE_TIPO,
+    WACC_MINIMO_ESCENARIO,
+    crecimiento_proyectado,
+    pesos_escenarios,
+    sensibilidad_crecimiento,
+    tabla_capitalizacion,
+)
+from rules import REGLAS, REGLAS_COMPILADAS, REGLAS_RATIOS, etiquetas_lote, indices_perfil, tramos_lote, valores_lote
+
+CAMPOS_NUMERICOS = (
+    "ingresos",
+    "ebitda",
+    "fcf",
+    "deuda",
+    "caja",
+    "precio_accion",
+    "numero_acciones",
+    "patrimonio_neto",
+    "activos_totales",
+    "beneficio_neto",
+    "g_conservador_pct",
+    "g_base_pct",
+    "g_optimista_pct",
+    "g_inicial_pct",
+    "g_terminal_pct",
+)
+CAMPOS = ("tipo_empresa",) + CAMPOS_NUMERICOS
+
+# Códigos de error compartidos por los escenarios perpetuos y la proyección.
+SIN_ERROR = 0
+ERROR_G_WACC = 1
+ERROR_WACC_NO_POSITIVO = 2
+ERROR_ACCIONES_CERO = 3
+
+# Advertencias del motor escalar, en el mismo orden en que aparecen al
+# concatenar las de ratios, DCF perpetuo y DCF por proyección. En el motor
+# vectorizado cada una es un bit de la columna ``advertencias``.
+ADVERTENCIAS = (
+    "PER > 30: posible sobrevaloración.",
+    "EV/EBITDA > 25: valoración exigente.",
+    "FCF ≤ 0: generación de caja débil.",
+    "Deuda neta/EBITDA > 3: apalancamiento elevado.",
+    "FCF ≤ 0: el DCF perpetuo puede no ser fiable.",
+    "FCF0 ≤ 0: la proyección puede no ser fiable.",
+    "Algún crecimiento g_t es extremadamente alto (>40%).",
+    "Algún crecimiento g_t es muy alto (>30%).",
+    "El valor terminal representa >70% del EV total.",
+)
+BIT_ADVERTENCIA = {texto: 1 << i for i, texto in enumerate(ADVERTENCIAS)}
+# Código de advertencia por tramo de cada regla de ratios que avisa de algo.
+CODIGOS_REGLA = {
+    nombre: REGLAS_COMPILADAS[nombre].codigos(BIT_ADVERTENCIA)
+    for nombre in REGLAS_RATIOS
+    if any(REGLAS_COMPILADAS[nombre].advertencias)
+}
+
+MENSAJES_ERROR_PERPETUO = {
+    ERROR_G_WACC: "Error crítico: g ≥ WACC.",
+    ERROR_WACC_NO_POSITIVO: "Error crítico: WACC <= 0.",
+    ERROR_ACCIONES_CERO: "No se puede calcular precio: Nº de acciones = 0.",
+}
+MENSAJES_ERROR_PROYECCION = {
+    ERROR_G_WACC: "Error crítico: g_terminal ≥ WACC.",
+    ERROR_WACC_NO_POSITIVO: "Error crítico: WACC <= 0.",
+    ERROR_ACCIONES_CERO: "No se puede calcular precio: Nº de acciones = 0.",
+}
+
+
+def preparar_columnas(columnas):
+    """Convierte un mapeo campo -> valores (dict o DataFrame) en arrays NumPy."""
+    preparadas = {"tipo_empresa": np.asarray(columnas["tipo_empresa"], dtype=object)}
+    for campo in CAMPOS_NUMERICOS:
+        preparadas[campo] = np.asarray(columnas[campo], dtype=np.float64)
+    return preparadas
+
+
+def columnas_desde_registros(registros):
+    """Traspone una secuencia de diccionarios ``datos`` a formato columnar."""
+    registros = list(registros)
+    columnas = {"tipo_empresa": np.array([r["tipo_empresa"] for r in registros], dtype=object)}
+    for campo in CAMPOS_NUMERICOS:
+        columnas[campo] = np.fromiter((r[campo] for r in registros), dtype=np.float64, count=len(registros))
+    return columnas
+
+
+def _dividir(numerador, divisor):
+    """División elemento a elemento con ``NaN`` donde el divisor es 0."""
+    return np.divide(numerador, divisor, out=np.full(np.shape(divisor), np.nan), where=divisor != 0)
+
+
+def _bits(*pares):
+    """Combina pares ``(mascara, texto)`` en una columna de bits de advertencias."""
+    advertencias = np.zeros(np.shape(pares[0][0]), dtype=np.uint16)
+    for mascara, texto in pares:
+        advertencias |= np.where(mascara, BIT_ADVERTENCIA[texto], 0).astype(np.uint16)
+    return advertencias
+
+
+def expandir_advertencias(bits):
+    """Lista de textos de advertencia codificados en un entero de bits."""
+    return [texto for i, texto in enumerate(ADVERTENCIAS) if int(bits) >> i & 1]
+
+
+def _clasificar_diferencia(precio_mercado, precio_teorico, valido):
+    """Clasificación de mercado (±20%) sólo donde ``valido`` es cierto."""
+    diff = _dividir(precio_mercado - precio_teorico, np.where(valido, precio_teorico, 0.0))
+    clasificacion = etiquetas_lote("diferencia_precio", tramos_lote("diferencia_precio", diff))
+    clasificacion[~valido] = None
+    return clasificacion, diff
+
+
+def factores_capitalizacion(wacc, anios):
+    """Tabla de factores ``(1 + wacc) ** t`` por WACC distinto e índice de cada empresa.
+
+    Devuelve ``(tabla, inversa)``: ``tabla[inversa, t - 1]`` es el factor del año
+    ``t`` de cada empresa. Las filas salen de ``analysis.tabla_capitalizacion``,
+    que las calcula una sola vez por WACC (el automático sólo toma un puñado de
+    valores) y coinciden bit a bit con las del motor escalar. Así no se
+    materializa una matriz empresas × años aunque el horizonte sea de 50 años.
+    """
+    valores, inversa = np.unique(wacc, return_inverse=True)
+    tabla = np.array([tabla_capitalizacion(w, anios) for w in valores.tolist()], dtype=np.float64)
+    return tabla.reshape(len(valores), anios), inversa.reshape(np.shape(wacc))
+
+
+def calcular_wacc_lote(tipo_empresa, deuda_neta, ebitda):
+    """Versión vectorizada de ``calcular_wacc_automatico``."""
+    tipo = np.asarray(tipo_empresa, dtype=object).copy()
+    tipo[~np.isin(tipo, list(WACC_BASE_TIPO))] = TIPO_EMPRESA_POR_DEFECTO
+
+    wacc = np.empty(tipo.shape, dtype=np.float64)
+    for nombre, base in WACC_BASE_TIPO.items():
+        wacc[tipo == nombre] = base
+
+    deuda_neta_ebitda = _dividir(deuda_neta, ebitda)
+    wacc = wacc + valores_lote("ajuste_wacc", tramos_lote("ajuste_wacc", deuda_neta_ebitda))
+    return {"tipo_empresa": tipo, "wacc": wacc, "deuda_neta_ebitda": deuda_neta_ebitda}
+
+
+def calcular_ratios_lote(c, perfil=0):
+    """Versión vectorizada de ``calcular_ratios`` (ratios y veredicto).
+
+    ``perfil`` es un índice de ``rules.PERFILES`` o un array con uno por empresa.
+    """
+    capitalizacion = c["precio_accion"] * c["numero_acciones"]
+    deuda_neta = c["deuda"] - c["caja"]
+    ev = capitalizacion + deuda_neta
+
+    ratios = {
+        "PER": _dividir(capitalizacion, c["beneficio_neto"]),
+        "PSR": _dividir(capitalizacion, c["ingresos"]),
+        "EV/EBITDA": _dividir(ev, c["ebitda"]),
+        "EV/FCF": _dividir(ev, c["fcf"]),
+        "ROE": _dividir(c["beneficio_neto"], c["patrimonio_neto"]),
+        "ROA": _dividir(c["beneficio_neto"], c["activos_totales"]),
+        "Margen EBITDA": _dividir(c["ebitda"], c["ingresos"]),
+        "Capitalización": capitalizacion,
+        "EV": ev,
+    }
+    deuda_neta_ebitda = _dividir(deuda_neta, c["ebitda"])
+
+    variables = {**ratios, "Deuda neta/EBITDA": deuda_neta_ebitda, "fcf": c["fcf"]}
+    tramos = {nombre: tramos_lote(nombre, variables[REGLAS[nombre]["sobre"]], perfil) for nombre in REGLAS_RATIOS}
+
+    valoracion_exigente = (tramos["per"] == 2) | (tramos["ev_ebitda"] == 2)
+    rentabilidad_sana = tramos["roe"] >= 1
+    apalancamiento_alto = tramos["apalancamiento"] == 2
+
+    veredicto = np.full(capitalizacion.shape, "neutral", dtype=object)
+    favorable = ~valoracion_exigente & rentabilidad_sana & ~apalancamiento_alto
+    cautela = ~favorable & (valoracion_exigente | apalancamiento_alto | (tramos["fcf"] == 0))
+    veredicto[favorable] = "favorable"
+    veredicto[cautela] = "cautela"
+
+    advertencias = np.zeros(capitalizacion.shape, dtype=np.uint16)
+    for nombre, codigos in CODIGOS_REGLA.items():
+        advertencias |= codigos[tramos[nombre]]
+    return {
+        "ratios": ratios,
+        "deuda_neta_ebitda": deuda_neta_ebitda,
+        "advertencias": advertencias,
+        "veredicto_preliminar": veredicto,
+    }
+
+
+def supuestos_dcf_perpetuo_lote(c, wacc, escenarios=ESCENARIOS_PERPETUO):
+    """Matrices escenarios × empresas con el g (en tanto por uno) y el WACC de cada escenario."""
+    # Una fila por campo de crecimiento usado más una de ceros para los g fijos.
+    campos = list(dict.fromkeys(esc.g for esc in escenarios if isinstance(esc.g, str)))
+    columnas = np.stack([c[campo] for campo in campos] + [np.zeros(np.shape(wacc))])
+    filas = [campos.index(esc.g) if isinstance(esc.g, str) else len(campos) for esc in escenarios]
+    desplazamiento_g = [esc.desplazamiento_g_pct + (0.0 if isinstance(esc.g, str) else esc.g) for esc in escenarios]
+    desplazamiento_wacc = np.array([esc.desplazamiento_wacc for esc in escenarios])
+
+    g = columnas[filas]
+    g += np.array(desplazamiento_g)[:, None]
+    g /= 100
+    wacc_esc = wacc + desplazamiento_wacc[:, None]
+    rebajados = desplazamiento_wacc < 0
+    if rebajados.any():
+        wacc_esc[rebajados] = np.maximum(wacc_esc[rebajados], WACC_MINIMO_ESCENARIO)
+    return g, wacc_esc
+
+
+def calcular_dcf_perpetuo_lote(c, wacc, escenarios=ESCENARIOS_PERPETUO):
+    """Versión vectorizada de ``calcular_dcf_perpetuo``.
+
+    Todos los escenarios se valoran a la vez sobre matrices escenarios ×
+    empresas; cada escenario del resultado es una fila de esas matrices. Los
+    escenarios sin precio quedan a ``NaN`` poniendo a ``NaN`` su margen
+    ``WACC - g``, que arrastra el ``NaN`` hasta el precio sin más máscaras.
+    """
+    pesos = pesos_escenarios(tuple(escenarios))
+    n_acc = c["numero_acciones"]
+    g, wacc_esc = supuestos_dcf_perpetuo_lote(c, wacc, escenarios)
+    margen = wacc_esc - g
+
+    # ``WACC - g <= 0`` equivale a ``g >= WACC`` en coma flotante.
+    error = np.zeros(g.shape, dtype=np.int8)
+    error[:, n_acc == 0] = ERROR_ACCIONES_CERO
+    error[wacc_esc <= 0] = ERROR_WACC_NO_POSITIVO
+    error[margen <= 0] = ERROR_G_WACC
+    margen[error != SIN_ERROR] = np.nan
+
+    valor_empresa = g + 1
+    valor_empresa *= c["fcf"]
+    valor_empresa /= margen
+    valor_equity = valor_empresa - (c["deuda"] - c["caja"])
+    precio = valor_equity / n_acc
+    resultados = {
+        esc.nombre: {
+            "g": g[i],
+            "wacc": wacc_esc[i],
+            "valor_empresa": valor_empresa[i],
+            "valor_equity": valor_equity[i],
+            "precio": precio[i],
+            "error": error[i],
+        }
+        for i, esc in enumerate(escenarios)
+    }
+
+    # Suma en el orden de los escenarios, como ``analysis.precio_esperado``; un
+    # escenario con peso y sin precio deja el esperado a ``NaN``.
+    esperado = None
+    for fila, peso in zip(precio, pesos):
+        if peso:
+            esperado = fila * peso if esperado is None else esperado + fila * peso
+    precio_base = resultados["Base"]["precio"] if "Base" in resultados else esperado
+    clasificacion, _ = _clasificar_diferencia(
+        c["precio_accion"], precio_base, ~np.isnan(precio_base) & (precio_base != 0)
+    )
+    return {
+        "escenarios": resultados,
+        "precio_base": precio_base,
+        "precio_esperado": esperado,
+        "clasificacion_mercado": clasificacion,
+        "advertencias": _bits((c["fcf"] <= 0, "FCF ≤ 0: el DCF perpetuo puede no ser fiable.")),
+    }
+
+
+def calcular_dcf_proyeccion_lote(c, wacc, anios=ANIOS_PROYECCION, perfil="lineal"):
+    """Versión vectorizada de ``calcular_dcf_proyeccion``."""
+    g_terminal = c["g_terminal_pct"] / 100
+    deuda_neta = c["deuda"] - c["caja"]
+    n_acc = c["numero_acciones"]
+
+    error = np.full(wacc.shape, SIN_ERROR, dtype=np.int8)
+    error[n_acc == 0] = ERROR_ACCIONES_CERO
+    error[wacc <= 0] = ERROR_WACC_NO_POSITIVO
+    error[g_terminal >= wacc] = ERROR_G_WACC
+    valido = error == SIN_ERROR
+
+    if anios < 1:
+        raise ValueError("El horizonte de proyección debe ser de al menos 1 año.")
+    tabla, inversa = factores_capitalizacion(wacc, anios)
+    fcf_t = c["fcf"]
+    suma_vp = 0
+    g_max = np.full(wacc.shape, -np.inf)
+    for t in range(1, anios + 1):
+        g_pct = crecimiento_proyectado(c["g_inicial_pct"], c["g_terminal_pct"], t, anios, perfil)
+        g_max = np.maximum(g_max, g_pct)
+        fcf_t = fcf_t * (1 + g_pct / 100)
+        factor = tabla[inversa, t - 1]
+        suma_vp = suma_vp + _dividir(fcf_t, factor)
+
+    valor_terminal = _dividir(fcf_t * (1 + g_terminal), np.where(valido, wacc - g_terminal, 0.0))
+    vp_terminal = _dividir(valor_terminal, factor)
+    ev = suma_vp + vp_terminal
+    equity = ev - deuda_neta
+    precio = _dividir(equity, np.where(valido, n_acc, 0.0))
+    peso_terminal = np.where(valido & (ev == 0), 0.0, _dividir(vp_terminal, ev))
+
+    clasificacion, _ = _clasificar_diferencia(c["precio_accion"], precio, valido & (precio != 0))
+    advertencias = _bits(
+        (c["fcf"] <= 0, "FCF0 ≤ 0: la proyección puede no ser fiable."),
+        (g_max > 40, "Algún crecimiento g_t es extremadamente alto (>40%)."),
+        ((g_max > 30) & ~(g_max > 40), "Algún crecimiento g_t es muy alto (>30%)."),
+        (valido & (peso_terminal > 0.70), "El valor terminal representa >70% del EV total."),
+    )
+    return {
+        "valor_terminal": valor_terminal,
+        "vp_terminal": vp_terminal,
+        "peso_terminal": peso_terminal,
+        "ev": np.where(valido, ev, np.nan),
+        "equity": np.where(valido, equity, np.nan),
+        "precio": precio,
+        "clasificacion_mercado": clasificacion,
+        "advertencias": advertencias,
+        "error": error,
+    }
+
+
+def derivadas_dcf_perpetuo_lote(c, wacc, escenarios=ESCENARIOS_PERPETUO):
+    """Versión vectorizada de ``derivadas_dcf_perpetuo`` (``NaN`` donde no hay precio)."""
+    g, wacc_esc = supuestos_dcf_perpetuo_lote(c, wacc, escenarios)
+    valido = (g < wacc_esc) & (wacc_esc > 0) & (c["numero_acciones"] != 0)
+    margen = np.where(valido, wacc_esc - g, np.nan)
+    n_acc = np.where(valido, c["numero_acciones"], np.nan)
+    cuadrado = margen * margen * n_acc
+    cubo = cuadrado * margen
+    sensibilidad_wacc = np.where(wacc_esc == WACC_MINIMO_ESCENARIO, 0.0, 1.0)
+    primeras = {
+        "wacc": -c["fcf"] * (1 + g) / cuadrado * sensibilidad_wacc,
+        "g": c["fcf"] * (1 + wacc_esc) / cuadrado,
+        "fcf": (1 + g) / (margen * n_acc),
+        "deuda_neta": -1 / n_acc,
+    }
+    segundas = {
+        "wacc": 2 * c["fcf"] * (1 + g) / cubo * sensibilidad_wacc,
+        "g": 2 * c["fcf"] * (1 + wacc_esc) / cubo,
+        "wacc_g": -c["fcf"] * (2 + wacc_esc + g) / cubo * sensibilidad_wacc,
+    }
+    return {
+        esc.nombre: {
+            **{variable: valores[i] for variable, valores in primeras.items()},
+            "segundas": {variable: valores[i] for variable, valores in segundas.items()},
+        }
+        for i, esc in enumerate(escenarios)
+    }
+
+
+def derivadas_dcf_proyeccion_lote(c, wacc, anios=ANIOS_PROYECCION, perfil="lineal"):
+    """Versión vectorizada de ``derivadas_dcf_proyeccion`` (``NaN`` donde no hay precio)."""
+    g_terminal = c["g_terminal_pct"] / 100
+    n_acc = c["numero_acciones"]
+    valido = (g_terminal < wacc) & (wacc > 0) & (n_acc != 0)
+    n_acc = np.where(valido, n_acc, np.nan)
+
+    if anios < 1:
+        raise ValueError("El horizonte de proyección debe ser de al menos 1 año.")
+    tabla, inversa = factores_capitalizacion(wacc, anios)
+    multiplicador = np.ones(wacc.shape)
+    vp = duracion = convexidad = vp_inicial = vp_terminal = senda_inicial = senda_terminal = 0.0
+    for t in range(1, anios + 1):
+        g = crecimiento_proyectado(c["g_inicial_pct"], c["g_terminal_pct"], t, anios, perfil) / 100
+        s = sensibilidad_crecimiento(t, anios, perfil)
+        multiplicador = multiplicador * (1 + g)
+        senda_inicial = senda_inicial + s / (1 + g)
+        senda_terminal = senda_terminal + (1 - s) / (1 + g)
+        factor = tabla[inversa, t - 1]
+        descontado = multiplicador / factor
+        vp = vp + descontado
+        duracion = duracion + t * descontado
+        convexidad = convexidad + t * (t + 1) * descontado
+        vp_inicial = vp_inicial + descontado * senda_inicial
+        vp_terminal = vp_terminal + descontado * senda_terminal
+
+    margen = np.where(valido, wacc - g_terminal, np.nan)
+    terminal = multiplicador * (1 + g_terminal) / margen / factor
+    d_wacc = -(duracion + anios * terminal) / (1 + wacc) - terminal / margen
+    d2_wacc = convexidad / (1 + wacc) ** 2 + terminal * (
+        2 / margen**2 + 2 * anios / ((1 + wacc) * margen) + anios * (anios + 1) / (1 + wacc) ** 2
+    )
+    fcf0 = c["fcf"]
+    d_g_terminal = vp_terminal + terminal * senda_terminal + multiplicador * (1 + wacc) / margen**2 / factor
+    return {
+        "wacc": fcf0 * d_wacc / n_acc,
+        "g_inicial": fcf0 * (vp_inicial + terminal * senda_inicial) / n_acc,
+        "g_terminal": fcf0 * d_g_terminal / n_acc,
+        "fcf": (vp + terminal) / n_acc,
+        "deuda_neta": -1 / n_acc,
+        "segundas": {"wacc": fcf0 * d2_wacc / n_acc},
+    }
+
+
+def calcular_investment_score_lote(ratios, deuda_neta_ebitda, fcf, precio_mercado, precio_dcf_base, perfil=0):
+    """Versión vectorizada de ``calcular_investment_score``."""
+
+    def puntos(nombre, valores):
+        return valores_lote(nombre, tramos_lote(nombre, valores, perfil))
+
+    score_val = puntos("per", ratios["PER"]) + puntos("ev_ebitda", ratios["EV/EBITDA"]) + puntos("ev_fcf", ratios["EV/FCF"])
+    score_ren = puntos("roe", ratios["ROE"]) + puntos("margen_ebitda", ratios["Margen EBITDA"])
+    score_riesgo = puntos("apalancamiento", deuda_neta_ebitda) + puntos("fcf", fcf)
+
+    valido = ~np.isnan(precio_dcf_base) & (precio_dcf_base != 0)
+    diff = _dividir(precio_mercado - precio_dcf_base, np.where(valido, precio_dcf_base, 0.0))
+    score_dcf = np.where(valido, puntos("diferencia_precio", diff), 0)
+
+    total = np.clip(score_val + score_ren + score_riesgo + score_dcf, 0, 100)
+    clasificacion = etiquetas_lote("clasificacion_score", tramos_lote("clasificacion_score", total))
+
+    return {
+        "valoracion": score_val,
+        "rentabilidad": score_ren,
+        "riesgo": score_riesgo,
+        "dcf_vs_mercado": score_dcf,
+        "total": total,
+        "clasificacion": clasificacion,
+    }
+
+
+_ETIQUETAS_ERROR = {
+    ERROR_G_WACC: "g_wacc",
+    ERROR_WACC_NO_POSITIVO: "wacc_no_positivo",
+    ERROR_ACCIONES_CERO: "acciones_cero",
+}
+
+
+def _registrar_lote(instr, c, dcf_perpetuo, dcf_proyeccion, ratios_info):
+    """Vuelca en ``instr`` los mismos contadores que el motor escalar, agregados por lote."""
+    instr.contar("analisis", n=len(c["ebitda"]))
+    instr.contar("errores", "ebitda_cero", int(np.count_nonzero(c["ebitda"] == 0)))
+    errores_perpetuo = np.concatenate([esc["error"] for esc in dcf_perpetuo["escenarios"].values()])
+    for codigo, etiqueta in _ETIQUETAS_ERROR.items():
+        instr.contar("errores", f"perpetuo_{etiqueta}", int(np.count_nonzero(errores_perpetuo == codigo)))
+        instr.contar("errores", f"proyeccion_{etiqueta}", int(np.count_nonzero(dcf_proyeccion["error"] == codigo)))
+    bits = ratios_info["advertencias"] | dcf_perpetuo["advertencias"] | dcf_proyeccion["advertencias"]
+    for texto, bit in BIT_ADVERTENCIA.items():
+        instr.contar("advertencias", instrumentation.etiqueta_advertencia(texto), int(np.count_nonzero(bits & bit)))
+
+
+def ejecutar_analisis_lote(
+    columnas,
+    anios_proyeccion=ANIOS_PROYECCION,
+    perfil_crecimiento="lineal",
+    criterios="estandar",
+    wacc=None,
+    derivadas=False,
+    escenarios=ESCENARIOS_PERPETUO,
+):
+    """Analiza un universo completo en formato columnar.
+
+    ``columnas`` es un dict de arrays o un DataFrame con los mismos campos que
+    ``datos``. No modifica la entrada: el ``tipo_empresa`` normalizado se
+    devuelve en ``wacc_info``. ``criterios`` como en ``ejecutar_analisis``.
+    ``wacc`` (un valor o uno por empresa), si se indica, sustituye al WACC
+    automático en los DCF. ``derivadas`` y ``escenarios`` como en
+    ``ejecutar_analisis``.
+    """
+    escenarios = tuple(escenarios)
+    instr = instrumentation.ACTIVA
+    if instr:
+        t = instr.reloj()
+
+    c = preparar_columnas(columnas)
+    deuda_neta = c["deuda"] - c["caja"]
+    wacc_info = calcular_wacc_lote(c["tipo_empresa"], deuda_neta, c["ebitda"])
+    if wacc is not None:
+        wacc_info["wacc"] = np.broadcast_to(np.asarray(wacc, dtype=np.float64), deuda_neta.shape).copy()
+    perfil = indices_perfil(wacc_info["tipo_empresa"], criterios)
+    if instr:
+        t = instr.etapa("lote.wacc", t)
+
+    ratios_info = calcular_ratios_lote(c, perfil)
+    ratios_info["ratios"]["Deuda neta/EBITDA"] = wacc_info["deuda_neta_ebitda"]
+    if instr:
+        t = instr.etapa("lote.ratios", t)
+
+    dcf_perpetuo = calcular_dcf_perpetuo_lote(c, wacc_info["wacc"], escenarios)
+    if instr:
+        t = instr.etapa("lote.dcf_perpetuo", t)
+    dcf_proyeccion = calcular_dcf_proyeccion_lote(c, wacc_info["wacc"], anios_proyeccion, perfil_crecimiento)
+    if instr:
+        t = instr.etapa("lote.dcf_proyeccion", t)
+
+    score = calcular_investment_score_lote(
+        ratios_info["ratios"],
+        wacc_info["deuda_neta_ebitda"],
+        c["fcf"],
+        c["precio_accion"],
+        dcf_perpetuo["precio_base"],
+        perfil,
+    )
+    if instr:
+        instr.etapa("lote.score", t)
+        _registrar_lote(instr, c, dcf_perpetuo, dcf_proyeccion, ratios_info)
+
+    resultado = {
+        "wacc_info": wacc_info,
+        "ratios_info": ratios_info,
+        "dcf_perpetuo": dcf_perpetuo,
+        "dcf_proyeccion": dcf_proyeccion,
+        "score": score,
+    }
+    if derivadas:
+        resultado["derivadas"] = {
+            "perpetuo": derivadas_dcf_perpetuo_lote(c, wacc_info["wacc"], escenarios),
+            "proyeccion": derivadas_dcf_proyeccion_lote(c, wacc_info["wacc"], anios_proyeccion, perfil_crecimiento),
+        }
+    return resultado
+
+
+def aplanar_resultado(resultado):
+    """Devuelve las columnas de salida de ``ejecutar_analisis_lote`` con nombres planos."""
+    planas = {
+        "tipo_empresa": resultado["wacc_info"]["tipo_empresa"],
+        "wacc": resultado["wacc_info"]["wacc"],
+    }
+    for nombre, valores in resultado["ratios_info"]["ratios"].items():
+        planas[nombre] = valores
+    planas["veredicto_preliminar"] = resultado["ratios_info"]["veredicto_preliminar"]
+    for nombre, esc in resultado["dcf_perpetuo"]["escenarios"].items():
+        planas[f"precio_{nombre.lower()}"] = esc["precio"]
+    planas["precio_esperado"] = resultado["dcf_perpetuo"]["precio_esperado"]
+    planas["clasificacion_mercado_perpetuo"] = resultado["dcf_perpetuo"]["clasificacion_mercado"]
+    planas["precio_proyeccion"] = resultado["dcf_proyeccion"]["precio"]
+    planas["clasificacion_mercado_proyeccion"] = resultado["dcf_proyeccion"]["clasificacion_mercado"]
+    for bloque in ("valoracion", "rentabilidad", "riesgo", "dcf_vs_mercado", "total", "clasificacion"):
+        planas[f"score_{bloque}"] = resultado["score"][bloque]
+    planas["advertencias"] = (
+        resultado["ratios_info"]["advertencias"]
+        | resultado["dcf_perpetuo"]["advertencias"]
+        | resultado["dcf_proyeccion"]["advertencias"]
+    )
+    if "derivadas" in resultado:
+        precios = {f"precio_{nombre.lower()}": d for nombre, d in resultado["derivadas"]["perpetuo"].items()}
+        precios["precio_proyeccion"] = resultado["derivadas"]["proyeccion"]
+        for precio, derivadas in precios.items():
+            for variable, valores in derivadas.items():
+                if variable != "segundas":
+                    planas[f"d_{precio}_d_{variable}"] = valores
+            for variable, valores in derivadas["segundas"].items():
+                planas[f"d2_{precio}_d_{variable}"] = valores
+    return planas
+
+
+def filas_planas(planas):
+    """Genera una fila (dict de tipos Python, ``NaN`` -> ``None``) por empresa."""
+    nombres = list(planas)
+    for valores in zip(*(columna.tolist() for columna in planas.values())):
+        yield {n: None if isinstance(v, float) and v != v else v for n, v in zip(nombres, valores)}
+
+
+def filas_resultado(resultado):
+    """Genera una fila plana por empresa a partir de ``ejecutar_analisis_lote``."""
+    return filas_planas(aplanar_resultado(resultado))
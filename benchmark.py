@@ -0,0 +1,245 @@
+"""Benchmarks reproducibles de ``analysis.py`` y del motor vectorizado.
+
+Genera universos sintéticos con semilla fija y mide, para cada función y
+tamaño de universo, throughput, latencia mínima y mediana por llamada y pico
+de memoria. Los casos ``*_rejilla`` repiten el DCF perpetuo y el análisis completo
+con la rejilla de 25 escenarios de ``ESCENARIOS_REJILLA`` (motor vectorizado).
+Los resultados pueden guardarse como línea base en JSON y compararse con
+ejecuciones posteriores para detectar regresiones.
+
+Uso::
+
+    python benchmark.py --tamanos 1 1000 100000 1000000 --guardar benchmark_base.json
+    python benchmark.py --comparar benchmark_base.json --umbral 0.20
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from analysis import (
+    calcular_dcf_perpetuo,
+    calcular_dcf_proyeccion,
+    calcular_investment_score,
+    calcular_ratios,
+    calcular_wacc_automatico,
+    ejecutar_analisis,
+    rejilla_escenarios,
+)
+from batch import (
+    CAMPOS_NUMERICOS,
+    calcular_dcf_perpetuo_lote,
+    calcular_dcf_proyeccion_lote,
+    calcular_investment_score_lote,
+    calcular_ratios_lote,
+    calcular_wacc_lote,
+    ejecutar_analisis_lote,
+    preparar_columnas,
+)
+
+SEMILLA = 20240101
+TAMANOS = (1, 1_000, 100_000, 1_000_000)
+MAX_ESCALAR = 100_000
+TIPOS = ("growth", "madura", "defensiva", "cíclica")
+# Rejilla de 5 x 5 escenarios (g ± 2 puntos, WACC ± 1%) para medir el DCF perpetuo con N escenarios.
+ESCENARIOS_REJILLA = rejilla_escenarios([-2, -1, 0, 1, 2], [-0.01, -0.005, 0, 0.005, 0.01])
+
+
+def generar_universo(n, semilla=SEMILLA):
+    """Universo sintético columnar de ``n`` empresas con distribuciones plausibles."""
+    rng = np.random.default_rng(semilla)
+    ingresos = rng.lognormal(7.0, 1.2, n)
+    margen = rng.normal(0.20, 0.10, n)
+    ebitda = ingresos * margen
+    activos = ingresos * rng.uniform(0.8, 3.0, n)
+    patrimonio = activos * rng.uniform(0.2, 0.7, n)
+    columnas = {
+        "tipo_empresa": np.array(TIPOS, dtype=object)[rng.integers(0, len(TIPOS), n)],
+        "ingresos": ingresos,
+        "ebitda": ebitda,
+        "fcf": ebitda * rng.normal(0.5, 0.3, n),
+        "deuda": np.abs(ebitda) * rng.uniform(0.0, 6.0, n),
+        "caja": ingresos * rng.uniform(0.0, 0.3, n),
+        "precio_accion": rng.lognormal(3.0, 0.8, n),
+        "numero_acciones": rng.lognormal(4.5, 1.0, n),
+        "patrimonio_neto": patrimonio,
+        "activos_totales": activos,
+        "beneficio_neto": ebitda * rng.uniform(0.2, 0.7, n),
+        "g_conservador_pct": rng.uniform(0.0, 2.0, n),
+        "g_base_pct": rng.uniform(1.0, 3.0, n),
+        "g_optimista_pct": rng.uniform(2.0, 4.0, n),
+        "g_inicial_pct": rng.uniform(0.0, 25.0, n),
+        "g_terminal_pct": rng.uniform(0.5, 3.0, n),
+    }
+    # Algunos divisores nulos para ejercitar las ramas de error.
+    for campo in ("beneficio_neto", "ebitda", "fcf"):
+        columnas[campo][rng.random(n) < 0.01] = 0.0
+    return columnas
+
+
+def registros_desde_columnas(columnas):
+    """Lista de diccionarios ``datos`` a partir de columnas."""
+    listas = {campo: np.asarray(valores).tolist() for campo, valores in columnas.items()}
+    return [dict(zip(listas, fila)) for fila in zip(*listas.values())]
+
+
+def _casos_escalares(registros):
+    """Funciones escalares a medir, cada una aplicada a todo el universo."""
+    wacc_infos = [calcular_wacc_automatico(d["tipo_empresa"], d["deuda"] - d["caja"], d["ebitda"]) for d in registros]
+    waccs = [w["wacc"] for w in wacc_infos]
+    ratios = [
+        {**calcular_ratios(d)["ratios"], "Deuda neta/EBITDA": w["deuda_neta_ebitda"]}
+        for d, w in zip(registros, wacc_infos)
+    ]
+    precios_base = [calcular_dcf_perpetuo(d, w)["precio_base"] for d, w in zip(registros, waccs)]
+    return {
+        "calcular_wacc_automatico": lambda: [
+            calcular_wacc_automatico(d["tipo_empresa"], d["deuda"] - d["caja"], d["ebitda"]) for d in registros
+        ],
+        "calcular_ratios": lambda: [calcular_ratios(d) for d in registros],
+        "calcular_dcf_perpetuo": lambda: [calcular_dcf_perpetuo(d, w) for d, w in zip(registros, waccs)],
+        "calcular_dcf_proyeccion": lambda: [calcular_dcf_proyeccion(d, w) for d, w in zip(registros, waccs)],
+        "calcular_investment_score": lambda: [
+            calcular_investment_score(r, d["fcf"], d["precio_accion"], p)
+            for r, d, p in zip(ratios, registros, precios_base)
+        ],
+        "ejecutar_analisis": lambda: [ejecutar_analisis(d) for d in registros],
+    }
+
+
+def _casos_lote(columnas):
+    """Funciones vectorizadas equivalentes sobre el universo columnar."""
+    c = preparar_columnas(columnas)
+    deuda_neta = c["deuda"] - c["caja"]
+    wacc = calcular_wacc_lote(c["tipo_empresa"], deuda_neta, c["ebitda"])
+    ratios = calcular_ratios_lote(c)
+    ratios["ratios"]["Deuda neta/EBITDA"] = wacc["deuda_neta_ebitda"]
+    precio_base = calcular_dcf_perpetuo_lote(c, wacc["wacc"])["precio_base"]
+    return {
+        "calcular_wacc_automatico": lambda: calcular_wacc_lote(c["tipo_empresa"], deuda_neta, c["ebitda"]),
+        "calcular_ratios": lambda: calcular_ratios_lote(c),
+        "calcular_dcf_perpetuo": lambda: calcular_dcf_perpetuo_lote(c, wacc["wacc"]),
+        "calcular_dcf_proyeccion": lambda: calcular_dcf_proyeccion_lote(c, wacc["wacc"]),
+        "calcular_investment_score": lambda: calcular_investment_score_lote(
+            ratios["ratios"], wacc["deuda_neta_ebitda"], c["fcf"], c["precio_accion"], precio_base
+        ),
+        "ejecutar_analisis": lambda: ejecutar_analisis_lote(c),
+        "calcular_dcf_perpetuo_rejilla": lambda: calcular_dcf_perpetuo_lote(c, wacc["wacc"], ESCENARIOS_REJILLA),
+        "ejecutar_analisis_rejilla": lambda: ejecutar_analisis_lote(c, escenarios=ESCENARIOS_REJILLA),
+    }
+
+
+def medir(funcion, n, repeticiones, presupuesto_segundos=5.0):
+    """Mide una función que procesa ``n`` empresas por llamada.
+
+    Con tan pocas repeticiones sólo se informa del mínimo y la mediana: un
+    percentil alto sería, en la práctica, el máximo.
+    """
+    funcion()  # Calentamiento.
+    tiempos = []
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+        if time.perf_counter() - inicio > presupuesto_segundos:
+            break
+
+    tracemalloc.start()
+    funcion()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tiempos = np.array(tiempos)
+    mediana = float(np.median(tiempos))
+    return {
+        "n": n,
+        "repeticiones": len(tiempos),
+        "mediana_s": mediana,
+        "minimo_s": float(tiempos.min()),
+        "latencia_por_empresa_us": mediana / n * 1e6,
+        "empresas_por_segundo": n / mediana if mediana else float("inf"),
+        "pico_memoria_bytes": int(pico),
+    }
+
+
+def ejecutar_benchmarks(tamanos=TAMANOS, max_escalar=MAX_ESCALAR, repeticiones=7, semilla=SEMILLA, salida=None):
+    """Ejecuta todos los casos y devuelve ``{"meta": ..., "resultados": ...}``."""
+    resultados = {}
+    for n in tamanos:
+        columnas = generar_universo(n, semilla)
+        motores = [("lote", _casos_lote(columnas))]
+        if n <= max_escalar:
+            motores.append(("escalar", _casos_escalares(registros_desde_columnas(columnas))))
+        for motor, casos in motores:
+            for nombre, funcion in casos.items():
+                clave = f"{nombre}/{motor}/{n}"
+                resultados[clave] = medir(funcion, n, repeticiones)
+                if salida is not None:
+                    r = resultados[clave]
+                    print(
+                        f"{clave:<45} {r['empresas_por_segundo']:>14,.0f} emp/s  "
+                        f"min {r['minimo_s'] * 1e3:>9.3f} ms  p50 {r['mediana_s'] * 1e3:>9.3f} ms  "
+                        f"pico {r['pico_memoria_bytes'] / 2**20:>8.1f} MiB",
+                        file=salida,
+                    )
+    meta = {
+        "semilla": semilla,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "campos": list(CAMPOS_NUMERICOS),
+    }
+    return {"meta": meta, "resultados": resultados}
+
+
+def comparar(actual, base, umbral):
+    """Lista de regresiones (mediana más lenta que ``base * (1 + umbral)``)."""
+    regresiones = []
+    for clave, r in actual["resultados"].items():
+        referencia = base["resultados"].get(clave)
+        if referencia is None:
+            continue
+        ratio = r["mediana_s"] / referencia["mediana_s"] if referencia["mediana_s"] else float("inf")
+        if ratio > 1 + umbral:
+            regresiones.append({"caso": clave, "ratio": ratio})
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del motor de análisis financiero.")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS))
+    parser.add_argument(
+        "--max-escalar", type=int, default=MAX_ESCALAR, help="Tamaño máximo para medir el motor escalar (más lento)."
+    )
+    parser.add_argument("--repeticiones", type=int, default=7)
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    parser.add_argument("--guardar", help="Ruta donde guardar los resultados como línea base JSON.")
+    parser.add_argument("--comparar", help="Línea base JSON con la que comparar.")
+    parser.add_argument(
+        "--umbral", type=float, default=0.20, help="Regresión tolerada sobre la mediana (0.20 = 20%%)."
+    )
+    args = parser.parse_args(argv)
+
+    informe = ejecutar_benchmarks(args.tamanos, args.max_escalar, args.repeticiones, args.semilla, sys.stdout)
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        regresiones = comparar(informe, base, args.umbral)
+        for r in regresiones:
+            print(f"REGRESIÓN {r['caso']}: {r['ratio']:.2f}x más lento que la línea base")
+        if regresiones:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Caché memoizada de ``ejecutar_analisis`` con expulsión LRU y caducidad.
+
+La clave se construye a partir de los campos de ``datos`` normalizados (floats
+redondeados a un número fijo de cifras significativas, ``-0.0`` como ``0.0`` y
+tipo de empresa desconocido como el tipo por defecto) y de las opciones del
+análisis (horizonte, perfil, criterios, derivadas y escenarios), de modo que
+entradas equivalentes comparten entrada de caché.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from analysis import (
+    ANIOS_PROYECCION,
+    ESCENARIOS_PERPETUO,
+    TIPO_EMPRESA_POR_DEFECTO,
+    WACC_BASE_TIPO,
+    Escenario,
+    ejecutar_analisis,
+)
+from batch import CAMPOS_NUMERICOS
+
+CIFRAS_SIGNIFICATIVAS = 12
+
+
+def _normalizar_float(valor, cifras):
+    valor = float(f"{float(valor):.{cifras}g}")
+    return 0.0 if valor == 0 else valor
+
+
+def clave_analisis(datos, cifras=CIFRAS_SIGNIFICATIVAS):
+    """Clave canónica (tupla en el orden de ``CAMPOS``) para unos ``datos``."""
+    tipo = datos["tipo_empresa"]
+    if tipo not in WACC_BASE_TIPO:
+        tipo = TIPO_EMPRESA_POR_DEFECTO
+    return (tipo,) + tuple(_normalizar_float(datos[campo], cifras) for campo in CAMPOS_NUMERICOS)
+
+
+def clave_opciones(
+    anios_proyeccion=ANIOS_PROYECCION,
+    perfil_crecimiento="lineal",
+    criterios="estandar",
+    derivadas=False,
+    escenarios=ESCENARIOS_PERPETUO,
+):
+    """Clave canónica de las opciones de ``ejecutar_analisis`` (las omitidas valen lo mismo que por defecto)."""
+    return (
+        int(anios_proyeccion),
+        perfil_crecimiento,
+        criterios,
+        bool(derivadas),
+        tuple(Escenario(*escenario) for escenario in escenarios),
+    )
+
+
+def huella_analisis(datos, cifras=CIFRAS_SIGNIFICATIVAS):
+    """Hash hexadecimal estable de la clave canónica (útil para persistir)."""
+    return hashlib.sha256(repr(clave_analisis(datos, cifras)).encode("utf-8")).hexdigest()
+
+
+class CacheAnalisis:
+    """Caché LRU acotada por número de entradas y antigüedad.
+
+    Los resultados devueltos se comparten entre llamadas con la misma clave y
+    deben tratarse como de sólo lectura. Un fallo analiza los ``datos`` del
+    llamante; un acierto devuelve el resultado de unos datos que sólo difieren a
+    partir de la cifra ``cifras`` (con ``cifras=17`` la clave distingue cualquier
+    par de floats distintos).
+    """
+
+    def __init__(self, max_entradas=1024, ttl_segundos=None, reloj=time.monotonic, cifras=CIFRAS_SIGNIFICATIVAS):
+        if max_entradas <= 0:
+            raise ValueError("max_entradas debe ser mayor que 0.")
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.cifras = cifras
+        self._reloj = reloj
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _vigente(self, instante):
+        return self.ttl_segundos is None or self._reloj() - instante <= self.ttl_segundos
+
+    def analizar(self, datos, **opciones):
+        """Devuelve ``ejecutar_analisis(datos, **opciones)``, reutilizando el resultado si existe."""
+        clave = (clave_analisis(datos, self.cifras), clave_opciones(**opciones))
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and self._vigente(entrada[0]):
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+            self.fallos += 1
+
+        resultado = ejecutar_analisis(datos, **opciones)
+        with self._lock:
+            self._entradas[clave] = (self._reloj(), resultado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+        return resultado
+
+    def limpiar(self):
+        """Vacía la caché y reinicia los contadores."""
+        with self._lock:
+            self._entradas.clear()
+            self.aciertos = self.fallos = self.expulsiones = 0
+
+    def estadisticas(self):
+        """Contadores de uso de la caché."""
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._entradas),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "expulsiones": self.expulsiones,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+        }
@@ -0,0 +1,369 @@
+"""Formato binario columnar para universos de empresas, leído con ``np.memmap``.
+
+Un fichero tiene una cabecera JSON y, a continuación, cada columna como un
+bloque contiguo alineado a 64 bytes: un float64 por empresa para los 15 campos
+numéricos de ``datos``, un código ``uint8`` para ``tipo_empresa`` (catálogo en
+la cabecera) y una tabla de tickers (desplazamientos ``int64`` + bytes UTF-8).
+Abrir un universo sólo lee la cabecera; las columnas son vistas de la página
+de caché del sistema, así que varios procesos comparten los mismos datos sin
+copiarlos. Los resultados se escriben con el mismo formato, una columna por
+campo de ``records.dtype_resultado`` para los escenarios del análisis
+(``records.DTYPE_RESULTADO`` con los de por defecto).
+
+Uso::
+
+    python columnar.py convertir fundamentales.csv universo.col
+    python columnar.py valorar universo.col resultados.col --trabajadores 4
+"""
+
+import argparse
+import json
+import os
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from analysis import (
+    ANIOS_PROYECCION,
+    ESCENARIOS_PERPETUO,
+    PERFILES_CRECIMIENTO,
+    TIPO_EMPRESA_POR_DEFECTO,
+    leer_escenarios,
+)
+from batch import CAMPOS_NUMERICOS, aplanar_resultado, columnas_desde_registros, ejecutar_analisis_lote
+from records import (
+    CLASIFICACIONES_MERCADO,
+    CLASIFICACIONES_SCORE,
+    TIPOS_EMPRESA,
+    VEREDICTOS,
+    dtype_resultado,
+    resultados_compactos,
+)
+from rules import CRITERIOS
+from streaming import TAMANO_LOTE_POR_DEFECTO, agrupar_en_lotes, detectar_formato, leer_fundamentales
+
+MAGIA = b"COLUMNAR"
+VERSION = 1
+ALINEACION = 64
+_PREAMBULO = struct.Struct("<8sQ")  # magia + longitud de la cabecera JSON
+
+CATALOGOS_RESULTADO = {
+    "tipo_empresa": TIPOS_EMPRESA,
+    "veredicto_preliminar": VEREDICTOS,
+    "clasificacion_mercado_perpetuo": CLASIFICACIONES_MERCADO,
+    "clasificacion_mercado_proyeccion": CLASIFICACIONES_MERCADO,
+    "score_clasificacion": CLASIFICACIONES_SCORE,
+}
+
+
+def _alinear(posicion):
+    return -(-posicion // ALINEACION) * ALINEACION
+
+
+def crear_fichero(ruta, esquema, filas, catalogos=None):
+    """Crea un fichero columnar vacío con ``esquema`` (``{columna: (dtype, longitud)}``).
+
+    El fichero se dimensiona de una vez (sin escribir los datos) para poder
+    rellenar las columnas por tramos con ``ArchivoColumnar(ruta, "r+")``.
+    """
+    columnas = {}
+    for nombre, (dtype, longitud) in esquema.items():
+        columnas[nombre] = {"dtype": np.dtype(dtype).newbyteorder("<").str, "longitud": int(longitud)}
+    cabecera = {"version": VERSION, "filas": int(filas), "columnas": columnas, "catalogos": catalogos or {}}
+
+    # Los desplazamientos dependen del tamaño de la cabecera, que a su vez los
+    # contiene: se reserva sitio de sobra para ellos antes de la primera columna.
+    reserva = len(json.dumps(cabecera).encode("utf-8")) + 32 * len(columnas) + 64
+    posicion = _alinear(_PREAMBULO.size + reserva)
+    for info in columnas.values():
+        info["offset"] = posicion
+        posicion = _alinear(posicion + np.dtype(info["dtype"]).itemsize * info["longitud"])
+    texto = json.dumps(cabecera).encode("utf-8")
+    if len(texto) > reserva:
+        raise ValueError("Cabecera demasiado grande para el espacio reservado.")
+
+    with open(ruta, "wb") as fichero:
+        fichero.write(_PREAMBULO.pack(MAGIA, len(texto)))
+        fichero.write(texto)
+        fichero.truncate(posicion)
+    return cabecera
+
+
+def leer_cabecera(ruta):
+    with open(ruta, "rb") as fichero:
+        magia, longitud = _PREAMBULO.unpack(fichero.read(_PREAMBULO.size))
+        if magia != MAGIA:
+            raise ValueError(f"'{ruta}' no es un fichero columnar.")
+        cabecera = json.loads(fichero.read(longitud).decode("utf-8"))
+    if cabecera.get("version") != VERSION:
+        raise ValueError(f"Versión de fichero columnar no soportada: {cabecera.get('version')}.")
+    return cabecera
+
+
+class ArchivoColumnar:
+    """Fichero columnar abierto con ``np.memmap``; ``modo`` ``"r"`` o ``"r+"``."""
+
+    def __init__(self, ruta, modo="r"):
+        self.ruta = ruta
+        cabecera = leer_cabecera(ruta)
+        self.filas = cabecera["filas"]
+        self.catalogos = {nombre: tuple(valores) for nombre, valores in cabecera["catalogos"].items()}
+        self.columnas = {}
+        for nombre, info in cabecera["columnas"].items():
+            if info["longitud"]:
+                self.columnas[nombre] = np.memmap(
+                    ruta, dtype=info["dtype"], mode=modo, offset=info["offset"], shape=(info["longitud"],)
+                )
+            else:
+                self.columnas[nombre] = np.empty(0, dtype=info["dtype"])
+
+    def __len__(self):
+        return self.filas
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        """Vuelca los cambios pendientes (en ``"r+"``) y suelta las vistas."""
+        for columna in self.columnas.values():
+            if isinstance(columna, np.memmap):
+                columna.flush()
+        self.columnas = {}
+
+    def tickers(self, inicio=0, fin=None):
+        """Tickers de las filas ``inicio:fin`` (``None`` si el fichero no los tiene)."""
+        if "ticker_offsets" not in self.columnas:
+            return None
+        fin = self.filas if fin is None else min(fin, self.filas)
+        desplazamientos = self.columnas["ticker_offsets"][inicio : fin + 1].tolist()
+        datos = self.columnas["ticker_bytes"]
+        bloque = bytes(datos[desplazamientos[0] : desplazamientos[-1]]) if fin > inicio else b""
+        base = desplazamientos[0] if desplazamientos else 0
+        return [
+            bloque[a - base : b - base].decode("utf-8") for a, b in zip(desplazamientos[:-1], desplazamientos[1:])
+        ]
+
+    def columnas_tramo(self, inicio=0, fin=None, decodificar=True):
+        """Vistas de las filas ``inicio:fin`` (sin la tabla de tickers).
+
+        Con ``decodificar``, las columnas con catálogo se devuelven como textos
+        (un array de objetos nuevo); el resto son vistas sin copia del fichero.
+        """
+        tramo = {}
+        for nombre, columna in self.columnas.items():
+            if nombre.startswith("ticker_"):
+                continue
+            valores = columna[inicio:fin]
+            if decodificar and nombre in self.catalogos:
+                valores = np.array(self.catalogos[nombre], dtype=object)[valores]
+            tramo[nombre] = valores
+        return tramo
+
+
+def _tabla_tickers(tickers):
+    codificados = [str(ticker).encode("utf-8") for ticker in tickers]
+    desplazamientos = np.zeros(len(codificados) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in codificados], out=desplazamientos[1:])
+    return desplazamientos, np.frombuffer(b"".join(codificados), dtype=np.uint8)
+
+
+def _esquema_tickers(desplazamientos, datos):
+    return {"ticker_offsets": (np.int64, len(desplazamientos)), "ticker_bytes": (np.uint8, len(datos))}
+
+
+def _codigos_tipo(tipos):
+    """Códigos de ``tipo_empresa``; los no reconocidos pasan al tipo por defecto, como en el motor."""
+    tipos = np.asarray(tipos, dtype=object)
+    codigos = np.full(len(tipos), TIPOS_EMPRESA.index(TIPO_EMPRESA_POR_DEFECTO), dtype=np.uint8)
+    for codigo, nombre in enumerate(TIPOS_EMPRESA):
+        codigos[tipos == nombre] = codigo
+    return codigos
+
+
+def escribir_universo(ruta, columnas, tickers=None):
+    """Escribe un universo (dict de arrays o DataFrame con los campos de ``datos``).
+
+    Los tipos de empresa no reconocidos se guardan como el tipo por defecto,
+    igual que los normaliza el motor.
+    """
+    codigos = _codigos_tipo(columnas["tipo_empresa"])
+    n = len(codigos)
+
+    esquema = {"tipo_empresa": (np.uint8, n)}
+    esquema.update({campo: (np.float64, n) for campo in CAMPOS_NUMERICOS})
+    if tickers is not None:
+        desplazamientos, datos = _tabla_tickers(tickers)
+        esquema.update(_esquema_tickers(desplazamientos, datos))
+    crear_fichero(ruta, esquema, n, {"tipo_empresa": TIPOS_EMPRESA})
+
+    with ArchivoColumnar(ruta, "r+") as archivo:
+        archivo.columnas["tipo_empresa"][:] = codigos
+        for campo in CAMPOS_NUMERICOS:
+            archivo.columnas[campo][:] = np.asarray(columnas[campo], dtype=np.float64)
+        if tickers is not None:
+            archivo.columnas["ticker_offsets"][:] = desplazamientos
+            archivo.columnas["ticker_bytes"][:] = datos
+    return n
+
+
+def _copiar_volcado(ruta, destino, tamano_lote):
+    """Copia por tramos un volcado binario (``ndarray.tofile``) en la columna ``destino``."""
+    with open(ruta, "rb") as volcado:
+        for inicio in range(0, len(destino), tamano_lote):
+            tramo = np.fromfile(volcado, dtype=destino.dtype, count=tamano_lote)
+            destino[inicio : inicio + len(tramo)] = tramo
+
+
+def convertir_archivo(ruta_entrada, ruta_salida, tamano_lote=TAMANO_LOTE_POR_DEFECTO):
+    """Convierte un fichero CSV/JSONL de fundamentales (con ``ticker`` opcional) a columnar.
+
+    Cada lote leído se vuelca columna a columna a ficheros temporales junto a
+    la salida; al terminar, con el número de filas ya conocido, se dimensiona
+    el fichero columnar y se copian las columnas por tramos. La memoria depende
+    de ``tamano_lote``, no del tamaño del universo.
+    """
+    columnas_fijas = ("tipo_empresa",) + CAMPOS_NUMERICOS
+    n = 0
+    con_tickers = False
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(ruta_salida))) as temporal:
+        rutas = {nombre: os.path.join(temporal, nombre) for nombre in columnas_fijas + ("ticker_len", "ticker_bytes")}
+        volcados = {nombre: open(ruta, "wb") for nombre, ruta in rutas.items()}
+        try:
+            with open(ruta_entrada, encoding="utf-8", newline="") as entrada:
+                registros = leer_fundamentales(entrada, detectar_formato(ruta_entrada))
+                for lote in agrupar_en_lotes(registros, tamano_lote):
+                    columnas = columnas_desde_registros(lote)
+                    _codigos_tipo(columnas["tipo_empresa"]).tofile(volcados["tipo_empresa"])
+                    for campo in CAMPOS_NUMERICOS:
+                        np.asarray(columnas[campo], dtype=np.float64).tofile(volcados[campo])
+                    codificados = [str(registro.get("ticker", "")).encode("utf-8") for registro in lote]
+                    con_tickers = con_tickers or any(codificados)
+                    np.array([len(c) for c in codificados], dtype=np.int64).tofile(volcados["ticker_len"])
+                    volcados["ticker_bytes"].write(b"".join(codificados))
+                    n += len(lote)
+        finally:
+            for volcado in volcados.values():
+                volcado.close()
+
+        esquema = {"tipo_empresa": (np.uint8, n)}
+        esquema.update({campo: (np.float64, n) for campo in CAMPOS_NUMERICOS})
+        if con_tickers:
+            longitud_tickers = os.path.getsize(rutas["ticker_bytes"])
+            esquema.update({"ticker_offsets": (np.int64, n + 1), "ticker_bytes": (np.uint8, longitud_tickers)})
+        crear_fichero(ruta_salida, esquema, n, {"tipo_empresa": TIPOS_EMPRESA})
+
+        with ArchivoColumnar(ruta_salida, "r+") as archivo:
+            for nombre in columnas_fijas:
+                _copiar_volcado(rutas[nombre], archivo.columnas[nombre], tamano_lote)
+            if con_tickers:
+                desplazamientos = archivo.columnas["ticker_offsets"]
+                desplazamientos[0] = 0
+                with open(rutas["ticker_len"], "rb") as longitudes:
+                    for inicio in range(0, n, tamano_lote):
+                        tramo = np.cumsum(np.fromfile(longitudes, dtype=np.int64, count=tamano_lote))
+                        desplazamientos[inicio + 1 : inicio + 1 + len(tramo)] = tramo + desplazamientos[inicio]
+                _copiar_volcado(rutas["ticker_bytes"], archivo.columnas["ticker_bytes"], 1 << 20)
+    return n
+
+
+def _valorar_tramo(ruta_universo, ruta_resultados, inicio, fin, tamano_lote, opciones):
+    """Valora las filas ``inicio:fin`` y escribe sus resultados en el fichero de salida."""
+    escenarios = opciones.get("escenarios", ESCENARIOS_PERPETUO)
+    with ArchivoColumnar(ruta_universo) as universo, ArchivoColumnar(ruta_resultados, "r+") as resultados:
+        for desde in range(inicio, fin, tamano_lote):
+            hasta = min(desde + tamano_lote, fin)
+            planas = aplanar_resultado(ejecutar_analisis_lote(universo.columnas_tramo(desde, hasta), **opciones))
+            compactos = resultados_compactos(planas, escenarios)
+            for campo in compactos.dtype.names:
+                resultados.columnas[campo][desde:hasta] = compactos[campo]
+    return fin - inicio
+
+
+def valorar_universo(
+    ruta_universo,
+    ruta_resultados,
+    trabajadores=1,
+    tamano_lote=TAMANO_LOTE_POR_DEFECTO,
+    **opciones,
+):
+    """Valora un universo columnar y escribe los resultados en otro fichero columnar.
+
+    Con ``trabajadores > 1`` cada proceso abre ambos ficheros con ``np.memmap``
+    y escribe su tramo de filas: sólo se envían las rutas, no los datos.
+    ``opciones`` se pasan a ``ejecutar_analisis_lote``; con ``escenarios`` hay
+    una columna ``precio_<escenario>`` por escenario.
+    """
+    dtype = dtype_resultado(opciones.get("escenarios", ESCENARIOS_PERPETUO))
+    with ArchivoColumnar(ruta_universo) as universo:
+        n = universo.filas
+        esquema = {campo: (dtype[campo], n) for campo in dtype.names}
+        tablas_tickers = None
+        if "ticker_offsets" in universo.columnas:
+            tablas_tickers = (universo.columnas["ticker_offsets"], universo.columnas["ticker_bytes"])
+            esquema.update(_esquema_tickers(*tablas_tickers))
+        crear_fichero(ruta_resultados, esquema, n, {k: list(v) for k, v in CATALOGOS_RESULTADO.items()})
+        if tablas_tickers is not None:
+            with ArchivoColumnar(ruta_resultados, "r+") as resultados:
+                resultados.columnas["ticker_offsets"][:] = tablas_tickers[0]
+                resultados.columnas["ticker_bytes"][:] = tablas_tickers[1]
+
+    trabajadores = max(1, min(trabajadores or os.cpu_count() or 1, -(-n // tamano_lote) if n else 1))
+    if trabajadores == 1:
+        return _valorar_tramo(ruta_universo, ruta_resultados, 0, n, tamano_lote, opciones)
+
+    tramo = -(-n // trabajadores)
+    with ProcessPoolExecutor(max_workers=trabajadores) as pool:
+        futuros = [
+            pool.submit(
+                _valorar_tramo, ruta_universo, ruta_resultados, inicio, min(inicio + tramo, n), tamano_lote, opciones
+            )
+            for inicio in range(0, n, tramo)
+        ]
+        return sum(futuro.result() for futuro in futuros)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Universos de empresas en formato columnar (np.memmap).")
+    ordenes = parser.add_subparsers(dest="orden", required=True)
+    convertir = ordenes.add_parser("convertir", help="CSV/JSONL de fundamentales -> fichero columnar.")
+    convertir.add_argument("entrada")
+    convertir.add_argument("salida")
+    valorar = ordenes.add_parser("valorar", help="Fichero columnar -> resultados columnares.")
+    valorar.add_argument("entrada")
+    valorar.add_argument("salida")
+    valorar.add_argument("--trabajadores", type=int, default=1)
+    valorar.add_argument("--anios-proyeccion", type=int, default=ANIOS_PROYECCION)
+    valorar.add_argument("--perfil-crecimiento", choices=PERFILES_CRECIMIENTO, default="lineal")
+    valorar.add_argument("--criterios", choices=CRITERIOS, default="estandar")
+    valorar.add_argument("--escenarios", help="Escenarios del DCF perpetuo, como en main.py.")
+    for orden in (convertir, valorar):
+        orden.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_POR_DEFECTO)
+    args = parser.parse_args(argv)
+
+    if args.orden == "convertir":
+        n = convertir_archivo(args.entrada, args.salida, args.tamano_lote)
+    else:
+        try:
+            escenarios = leer_escenarios(args.escenarios)
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+        n = valorar_universo(
+            args.entrada,
+            args.salida,
+            args.trabajadores,
+            args.tamano_lote,
+            anios_proyeccion=args.anios_proyeccion,
+            perfil_crecimiento=args.perfil_crecimiento,
+            criterios=args.criterios,
+            escenarios=escenarios,
+        )
+    print(f"{n:,} empresas -> {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
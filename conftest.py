@@ -0,0 +1 @@
+"""Configuración de pytest: al estar en la raíz, los módulos del proyecto se importan desde ``tests/``."""
@@ -0,0 +1,240 @@
+"""Grafo de dependencias para recalcular ``ejecutar_analisis`` de forma incremental.
+
+Cada nodo declara qué campos de ``datos`` y qué otros nodos necesita. Al
+cambiar una entrada sólo se recalculan los nodos afectados y, si un nodo
+recalculado produce el mismo valor que antes (por ejemplo, el WACC cuando el
+apalancamiento no cruza ningún umbral), sus dependientes no se recalculan.
+"""
+
+from collections import namedtuple
+
+from analysis import (
+    ANIOS_PROYECCION,
+    ESCENARIOS_PERPETUO,
+    calcular_escenario_perpetuo,
+    calcular_investment_score,
+    calcular_ratios,
+    calcular_wacc_automatico,
+    clasificar_dcf_proyeccion,
+    derivadas_dcf_perpetuo,
+    derivadas_dcf_proyeccion,
+    pesos_escenarios,
+    resumir_dcf_perpetuo,
+    supuestos_dcf_perpetuo,
+    valorar_dcf_proyeccion,
+)
+from batch import CAMPOS
+from rules import indice_perfil
+
+Nodo = namedtuple("Nodo", ["nombre", "entradas", "dependencias", "funcion"])
+# Campos de ``datos`` que usan las derivadas de los precios DCF.
+_ENTRADAS_DERIVADAS = (
+    "fcf",
+    "deuda",
+    "caja",
+    "numero_acciones",
+    "g_conservador_pct",
+    "g_base_pct",
+    "g_optimista_pct",
+    "g_inicial_pct",
+    "g_terminal_pct",
+)
+
+
+def _escenario(escenario):
+    def calcular(datos, v):
+        g, wacc_esc = supuestos_dcf_perpetuo(datos, v["wacc_info"]["wacc"], (escenario,))[escenario.nombre]
+        return calcular_escenario_perpetuo(datos["fcf"], v["deuda_neta"], datos["numero_acciones"], g, wacc_esc)
+
+    return calcular
+
+
+def _ratios(datos, v):
+    ratios_info = calcular_ratios(datos, v["perfil"])
+    ratios_info["ratios"]["Deuda neta/EBITDA"] = v["wacc_info"]["deuda_neta_ebitda"]
+    return ratios_info
+
+
+def _comparacion(datos, v):
+    precio_perpetuo = v["precio_dcf_base"]
+    precio_proyeccion = v["precio_dcf_proyeccion"]
+    if precio_perpetuo is None or precio_proyeccion is None:
+        return None
+    if precio_proyeccion < precio_perpetuo:
+        return (
+            "El DCF por proyección arroja un valor inferior al perpetuo debido a la "
+            "desaceleración del crecimiento prevista."
+        )
+    if precio_proyeccion > precio_perpetuo:
+        return (
+            "El DCF por proyección arroja un valor superior al perpetuo por una "
+            "fase inicial de crecimiento más intensa."
+        )
+    return "Ambos DCF son coherentes con supuestos de crecimiento similares."
+
+
+def construir_nodos(
+    anios_proyeccion=ANIOS_PROYECCION,
+    perfil_crecimiento="lineal",
+    criterios="estandar",
+    derivadas=False,
+    escenarios=ESCENARIOS_PERPETUO,
+):
+    """Nodos del análisis con las opciones de ``ejecutar_analisis``, en orden topológico.
+
+    Cada nodo sólo depende de nodos anteriores. Con ``derivadas=True`` se añade
+    el nodo ``derivadas``.
+    """
+    escenarios = tuple(escenarios)
+    pesos = pesos_escenarios(escenarios)
+    indice_perfil("madura", criterios)  # Valida los criterios antes de construir el grafo.
+    nombres_escenarios = tuple(f"escenario_{esc.nombre}" for esc in escenarios)
+    nodos = (
+        Nodo("deuda_neta", ("deuda", "caja"), (), lambda d, v: d["deuda"] - d["caja"]),
+        Nodo(
+            "wacc_info",
+            ("tipo_empresa", "ebitda"),
+            ("deuda_neta",),
+            lambda d, v: calcular_wacc_automatico(d["tipo_empresa"], v["deuda_neta"], d["ebitda"]),
+        ),
+        Nodo("perfil", (), ("wacc_info",), lambda d, v: indice_perfil(v["wacc_info"]["tipo_empresa"], criterios)),
+        Nodo(
+            "ratios_info",
+            (
+                "precio_accion",
+                "numero_acciones",
+                "deuda",
+                "caja",
+                "ingresos",
+                "ebitda",
+                "fcf",
+                "patrimonio_neto",
+                "activos_totales",
+                "beneficio_neto",
+            ),
+            ("wacc_info", "perfil"),
+            _ratios,
+        ),
+        *(
+            Nodo(
+                nombre,
+                ("fcf", "numero_acciones", *((esc.g,) if isinstance(esc.g, str) else ())),
+                ("deuda_neta", "wacc_info"),
+                _escenario(esc),
+            )
+            for nombre, esc in zip(nombres_escenarios, escenarios)
+        ),
+        Nodo(
+            "dcf_perpetuo",
+            ("precio_accion", "fcf"),
+            nombres_escenarios,
+            lambda d, v: resumir_dcf_perpetuo(
+                d, {esc.nombre: v[nombre] for nombre, esc in zip(nombres_escenarios, escenarios)}, pesos
+            ),
+        ),
+        Nodo(
+            "valoracion_proyeccion",
+            ("fcf", "deuda", "caja", "numero_acciones", "g_inicial_pct", "g_terminal_pct"),
+            ("wacc_info",),
+            lambda d, v: valorar_dcf_proyeccion(d, v["wacc_info"]["wacc"], anios_proyeccion, perfil_crecimiento),
+        ),
+        Nodo(
+            "dcf_proyeccion",
+            ("precio_accion",),
+            ("valoracion_proyeccion",),
+            lambda d, v: clasificar_dcf_proyeccion(d, v["valoracion_proyeccion"]),
+        ),
+        Nodo("precio_dcf_base", (), ("dcf_perpetuo",), lambda d, v: v["dcf_perpetuo"]["precio_base"]),
+        Nodo(
+            "precio_dcf_proyeccion",
+            (),
+            ("valoracion_proyeccion",),
+            lambda d, v: v["valoracion_proyeccion"].get("precio"),
+        ),
+        Nodo(
+            "score",
+            ("fcf", "precio_accion"),
+            ("ratios_info", "precio_dcf_base", "perfil"),
+            lambda d, v: calcular_investment_score(
+                v["ratios_info"]["ratios"], d["fcf"], d["precio_accion"], v["precio_dcf_base"], v["perfil"]
+            ),
+        ),
+        Nodo("comparacion_dcf", (), ("precio_dcf_base", "precio_dcf_proyeccion"), _comparacion),
+    )
+    if derivadas:
+        nodos += (
+            Nodo(
+                "derivadas",
+                _ENTRADAS_DERIVADAS,
+                ("wacc_info",),
+                lambda d, v: {
+                    "perpetuo": derivadas_dcf_perpetuo(d, v["wacc_info"]["wacc"], escenarios),
+                    "proyeccion": derivadas_dcf_proyeccion(
+                        d, v["wacc_info"]["wacc"], anios_proyeccion, perfil_crecimiento
+                    ),
+                },
+            ),
+        )
+    return nodos
+
+
+NODOS = construir_nodos()
+SALIDAS = ("wacc_info", "ratios_info", "dcf_perpetuo", "dcf_proyeccion", "score", "comparacion_dcf")
+
+
+class GrafoAnalisis:
+    """Análisis de una empresa que se recalcula de forma incremental.
+
+    >>> grafo = GrafoAnalisis(datos)
+    >>> grafo.actualizar(g_optimista_pct=3.0)
+    ['escenario_Optimista', 'dcf_perpetuo', 'precio_dcf_base']
+
+    ``opciones`` son las de ``ejecutar_analisis`` (``anios_proyeccion``,
+    ``perfil_crecimiento``, ``criterios``, ``derivadas`` y ``escenarios``) y
+    ``resultado()`` devuelve lo mismo que ``ejecutar_analisis(datos, **opciones)``
+    con los datos actuales. Los valores devueltos se comparten con el grafo y
+    deben tratarse como de sólo lectura.
+    """
+
+    def __init__(self, datos, **opciones):
+        self.nodos = construir_nodos(**opciones) if opciones else NODOS
+        self.datos = {campo: datos[campo] for campo in CAMPOS}
+        self.valores = {}
+        self.recalculados = []
+        self._recalcular(set(CAMPOS), todo=True)
+
+    def _recalcular(self, entradas_cambiadas, todo=False):
+        cambiados = set()
+        self.recalculados = []
+        for nodo in self.nodos:
+            afectado = todo or cambiados.intersection(nodo.dependencias) or entradas_cambiadas.intersection(
+                nodo.entradas
+            )
+            if not afectado:
+                continue
+            nuevo = nodo.funcion(self.datos, self.valores)
+            self.recalculados.append(nodo.nombre)
+            if todo or self.valores.get(nodo.nombre) != nuevo:
+                cambiados.add(nodo.nombre)
+            self.valores[nodo.nombre] = nuevo
+
+    def actualizar(self, cambios=None, **kwargs):
+        """Aplica cambios de entrada y recalcula sólo los nodos afectados.
+
+        Devuelve la lista de nodos recalculados (también en ``recalculados``).
+        """
+        cambios = {**(cambios or {}), **kwargs}
+        desconocidos = set(cambios) - set(CAMPOS)
+        if desconocidos:
+            raise KeyError(f"Campos desconocidos: {', '.join(sorted(desconocidos))}.")
+        entradas_cambiadas = {campo for campo, valor in cambios.items() if self.datos[campo] != valor}
+        self.datos.update(cambios)
+        if entradas_cambiadas:
+            self._recalcular(entradas_cambiadas)
+        else:
+            self.recalculados = []
+        return self.recalculados
+
+    def resultado(self):
+        """Resultado completo con la misma estructura que ``ejecutar_analisis``."""
+        return {nombre: self.valores[nombre] for nombre in SALIDAS + ("derivadas",) if nombre in self.valores}
@@ -0,0 +1,195 @@
+"""Instrumentación opcional del análisis: tiempos por etapa y contadores.
+
+Por defecto está desactivada (``ACTIVA`` es ``None``) y el motor sólo paga una
+comprobación de atributo por etapa. Al activarla con ``activar`` se acumulan
+tiempos de cada etapa (WACC, ratios, DCF, score, renderizado...) y contadores de
+errores y advertencias, que pueden volcarse a memoria, a ``logging`` o a un
+fichero en formato de texto de Prometheus.
+"""
+
+import logging
+import os
+import re
+import tempfile
+import time
+import unicodedata
+from contextlib import contextmanager
+
+ACTIVA = None
+
+_MODELOS_ERROR = {
+    "Error crítico: g ≥ WACC.": "g_wacc",
+    "Error crítico: g_terminal ≥ WACC.": "g_wacc",
+    "Error crítico: WACC <= 0.": "wacc_no_positivo",
+    "No se puede calcular precio: Nº de acciones = 0.": "acciones_cero",
+}
+
+
+def etiqueta_advertencia(texto):
+    """Etiqueta corta y estable a partir de un texto de advertencia."""
+    texto = texto.lower().replace("≤", "le").replace(">", "gt")
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", texto).strip("_")
+
+
+class Instrumentacion:
+    """Acumula tiempos por etapa y contadores de errores y advertencias."""
+
+    def __init__(self, exportadores=(), reloj=time.perf_counter):
+        self.exportadores = list(exportadores)
+        self.reloj = reloj
+        self.tiempos = {}
+        self.contadores = {}
+
+    def etapa(self, nombre, inicio):
+        """Registra el tiempo transcurrido desde ``inicio`` y devuelve el instante actual."""
+        ahora = self.reloj()
+        duracion = ahora - inicio
+        acumulado = self.tiempos.get(nombre)
+        if acumulado is None:
+            self.tiempos[nombre] = [1, duracion, duracion]
+        else:
+            acumulado[0] += 1
+            acumulado[1] += duracion
+            if duracion > acumulado[2]:
+                acumulado[2] = duracion
+        return ahora
+
+    @contextmanager
+    def cronometro(self, nombre):
+        """Context manager para medir bloques fuera del motor (p. ej. el renderizado)."""
+        inicio = self.reloj()
+        try:
+            yield
+        finally:
+            self.etapa(nombre, inicio)
+
+    def contar(self, nombre, etiqueta="", n=1):
+        if not n:
+            return
+        clave = (nombre, etiqueta)
+        self.contadores[clave] = self.contadores.get(clave, 0) + n
+
+    def registrar_resultado(self, resultado):
+        """Cuenta errores y advertencias de una salida de ``ejecutar_analisis``."""
+        self.contar("analisis")
+        if resultado["wacc_info"]["deuda_neta_ebitda"] is None:
+            self.contar("errores", "ebitda_cero")
+        for escenario in resultado["dcf_perpetuo"]["escenarios"].values():
+            if "error" in escenario:
+                self.contar("errores", f"perpetuo_{_MODELOS_ERROR[escenario['error']]}")
+        if "error" in resultado["dcf_proyeccion"]:
+            self.contar("errores", f"proyeccion_{_MODELOS_ERROR[resultado['dcf_proyeccion']['error']]}")
+        for texto in (
+            resultado["ratios_info"]["advertencias"]
+            + resultado["dcf_perpetuo"]["advertencias"]
+            + resultado["dcf_proyeccion"].get("advertencias", [])
+        ):
+            self.contar("advertencias", etiqueta_advertencia(texto))
+
+    def instantanea(self):
+        """Copia de las métricas actuales."""
+        return {
+            "tiempos": {
+                nombre: {"llamadas": n, "total_s": total, "max_s": maximo}
+                for nombre, (n, total, maximo) in self.tiempos.items()
+            },
+            "contadores": dict(self.contadores),
+        }
+
+    def exportar(self):
+        instantanea = self.instantanea()
+        for exportador in self.exportadores:
+            exportador.exportar(instantanea)
+
+    def reiniciar(self):
+        self.tiempos.clear()
+        self.contadores.clear()
+
+
+class ExportadorMemoria:
+    """Guarda cada instantánea exportada en una lista (útil en pruebas y notebooks)."""
+
+    def __init__(self):
+        self.instantaneas = []
+
+    def exportar(self, instantanea):
+        self.instantaneas.append(instantanea)
+
+
+class ExportadorLogging:
+    """Escribe un resumen de las métricas en un logger."""
+
+    def __init__(self, logger=None, nivel=logging.INFO):
+        self.logger = logger or logging.getLogger("analisis.metricas")
+        self.nivel = nivel
+
+    def exportar(self, instantanea):
+        for nombre, t in instantanea["tiempos"].items():
+            media_ms = t["total_s"] / t["llamadas"] * 1e3
+            self.logger.log(
+                self.nivel,
+                "etapa=%s llamadas=%d media_ms=%.4f max_ms=%.4f",
+                nombre,
+                t["llamadas"],
+                media_ms,
+                t["max_s"] * 1e3,
+            )
+        for (nombre, etiqueta), valor in sorted(instantanea["contadores"].items()):
+            self.logger.log(self.nivel, "contador=%s etiqueta=%s valor=%d", nombre, etiqueta, valor)
+
+
+class ExportadorPrometheus:
+    """Escribe las métricas en formato de texto de Prometheus (p. ej. para node_exporter)."""
+
+    def __init__(self, ruta, prefijo="analisis"):
+        self.ruta = ruta
+        self.prefijo = prefijo
+
+    def formatear(self, instantanea):
+        p = self.prefijo
+        tiempos = instantanea["tiempos"]
+        lineas = [f"# TYPE {p}_etapa_segundos_total counter"]
+        lineas += [f'{p}_etapa_segundos_total{{etapa="{n}"}} {t["total_s"]:.9f}' for n, t in tiempos.items()]
+        lineas.append(f"# TYPE {p}_etapa_llamadas_total counter")
+        lineas += [f'{p}_etapa_llamadas_total{{etapa="{n}"}} {t["llamadas"]}' for n, t in tiempos.items()]
+        nombres = sorted({nombre for nombre, _ in instantanea["contadores"]})
+        for nombre in nombres:
+            lineas.append(f"# TYPE {p}_{nombre}_total counter")
+            for (n, etiqueta), valor in sorted(instantanea["contadores"].items()):
+                if n == nombre:
+                    etiquetas = f'{{tipo="{etiqueta}"}}' if etiqueta else ""
+                    lineas.append(f"{p}_{nombre}_total{etiquetas} {valor}")
+        return "\n".join(lineas) + "\n"
+
+    def exportar(self, instantanea):
+        # Escritura atómica: el lector nunca ve un fichero a medio escribir.
+        directorio = os.path.dirname(os.path.abspath(self.ruta))
+        with tempfile.NamedTemporaryFile("w", dir=directorio, delete=False, encoding="utf-8") as tmp:
+            tmp.write(self.formatear(instantanea))
+        os.replace(tmp.name, self.ruta)
+
+
+def activar(instrumentacion=None):
+    """Activa la instrumentación global y la devuelve."""
+    global ACTIVA
+    ACTIVA = instrumentacion or Instrumentacion()
+    return ACTIVA
+
+
+def desactivar():
+    """Desactiva la instrumentación global."""
+    global ACTIVA
+    ACTIVA = None
+
+
+@contextmanager
+def instrumentado(instrumentacion=None):
+    """Activa la instrumentación dentro de un bloque ``with``."""
+    global ACTIVA
+    anterior = ACTIVA
+    ACTIVA = instrumentacion or Instrumentacion()
+    try:
+        yield ACTIVA
+    finally:
+        ACTIVA = anterior
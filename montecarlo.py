@@ -0,0 +1,110 @@
+"""Valoración Monte Carlo del DCF por proyección (N años + valor terminal).
+
+Muestrea el crecimiento inicial, el crecimiento terminal y el WACC a partir de
+distribuciones configurables y evalúa todas las trayectorias a la vez como
+operaciones sobre arrays. La senda de crecimiento de cada trayectoria sale de
+``analysis.crecimiento_proyectado`` con el mismo horizonte y perfil que el DCF
+por proyección, así que sin dispersión el precio simulado es el del análisis.
+"""
+
+import numpy as np
+
+from analysis import ANIOS_PROYECCION, crecimiento_proyectado, tabla_capitalizacion
+
+PERCENTILES = (5, 25, 50, 75, 95)
+N_SIMULACIONES_POR_DEFECTO = 1_000_000
+
+
+def distribucion_normal(media, desviacion):
+    """Especificación de una distribución normal."""
+    return {"tipo": "normal", "media": media, "desviacion": desviacion}
+
+
+def distribucion_uniforme(minimo, maximo):
+    """Especificación de una distribución uniforme en ``[minimo, maximo]``."""
+    return {"tipo": "uniforme", "minimo": minimo, "maximo": maximo}
+
+
+def distribucion_triangular(minimo, moda, maximo):
+    """Especificación de una distribución triangular."""
+    return {"tipo": "triangular", "minimo": minimo, "moda": moda, "maximo": maximo}
+
+
+def muestrear(generador, especificacion, n):
+    """Extrae ``n`` muestras de una especificación de distribución (o de una constante)."""
+    if not isinstance(especificacion, dict):
+        return np.full(n, float(especificacion))
+    tipo = especificacion["tipo"]
+    if tipo == "normal":
+        if especificacion["desviacion"] == 0:
+            return np.full(n, float(especificacion["media"]))
+        return generador.normal(especificacion["media"], especificacion["desviacion"], n)
+    if tipo == "uniforme":
+        return generador.uniform(especificacion["minimo"], especificacion["maximo"], n)
+    if tipo == "triangular":
+        return generador.triangular(especificacion["minimo"], especificacion["moda"], especificacion["maximo"], n)
+    raise ValueError(f"Distribución no soportada: {tipo}.")
+
+
+def simular_dcf_proyeccion(
+    datos,
+    g_inicial_pct,
+    g_terminal_pct,
+    wacc,
+    n_simulaciones=N_SIMULACIONES_POR_DEFECTO,
+    semilla=None,
+    ruido_anual_pct=0.0,
+    anios=ANIOS_PROYECCION,
+    perfil="lineal",
+):
+    """Simula el precio por acción del DCF por proyección.
+
+    ``g_inicial_pct`` y ``g_terminal_pct`` (en porcentaje) y ``wacc`` (en tanto
+    por uno) pueden ser constantes o especificaciones de ``distribucion_*``.
+    ``ruido_anual_pct`` añade un shock normal independiente a cada año de la
+    senda. ``anios`` y ``perfil`` son los de ``calcular_dcf_proyeccion``. Las
+    trayectorias con ``g_terminal ≥ WACC`` o ``WACC <= 0`` se descartan y su
+    proporción se informa en ``proporcion_valida``.
+    """
+    if datos["numero_acciones"] == 0:
+        return {"error": "No se puede calcular precio: Nº de acciones = 0."}
+
+    generador = np.random.default_rng(semilla)
+    g_ini = muestrear(generador, g_inicial_pct, n_simulaciones)
+    g_ter_pct = muestrear(generador, g_terminal_pct, n_simulaciones)
+    w = muestrear(generador, wacc, n_simulaciones)
+    g_ter = g_ter_pct / 100
+
+    valido = (g_ter < w) & (w > 0)
+    g_ini, g_ter_pct, g_ter, w = g_ini[valido], g_ter_pct[valido], g_ter[valido], w[valido]
+    if not g_ini.size:
+        return {"error": "Error crítico: g_terminal ≥ WACC en todas las simulaciones."}
+
+    if anios < 1:
+        raise ValueError("El horizonte de proyección debe ser de al menos 1 año.")
+    # Con un WACC constante se usan los mismos factores que el motor escalar.
+    constantes = tabla_capitalizacion(float(w[0]), anios) if w.min() == w.max() else None
+    capitalizacion = 1 + w
+    fcf_t = np.full_like(w, datos["fcf"])
+    ev = 0
+    for t in range(1, anios + 1):
+        g_t = crecimiento_proyectado(g_ini, g_ter_pct, t, anios, perfil)
+        if ruido_anual_pct:
+            g_t = g_t + generador.normal(0.0, ruido_anual_pct, g_t.size)
+        fcf_t = fcf_t * (1 + g_t / 100)
+        factor = constantes[t - 1] if constantes else capitalizacion**t
+        ev = ev + fcf_t / factor
+    ev = ev + fcf_t * (1 + g_ter) / (w - g_ter) / factor
+
+    precios = (ev - (datos["deuda"] - datos["caja"])) / datos["numero_acciones"]
+    con_precio = precios != 0
+    diff = (datos["precio_accion"] - precios[con_precio]) / precios[con_precio]
+
+    return {
+        "n_simulaciones": n_simulaciones,
+        "proporcion_valida": g_ini.size / n_simulaciones,
+        "media": float(precios.mean()),
+        "percentiles": dict(zip(PERCENTILES, np.percentile(precios, PERCENTILES).tolist())),
+        "prob_infravalorada": float(np.count_nonzero(diff < -0.20)) / precios.size,
+        "prob_sobrevalorada": float(np.count_nonzero(diff > 0.20)) / precios.size,
+    }
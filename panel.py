@@ -0,0 +1,143 @@
+"""Análisis de series temporales: ratios y score sobre un panel empresa × trimestre.
+
+Cada campo de ``datos`` es una matriz con una fila por empresa y una columna
+por trimestre (``tipo_empresa`` y los supuestos de crecimiento pueden ser un
+valor por empresa). Los flujos trimestrales (ingresos, EBITDA, FCF y beneficio)
+se agregan en doce meses móviles (TTM) y los saldos se toman a cierre de
+trimestre. Todas las celdas con datos completos se analizan en una sola llamada
+a ``ejecutar_analisis_lote`` y las medianas móviles se calculan sobre ventanas
+del panel completo, sin bucles por empresa ni por trimestre.
+"""
+
+import warnings
+
+import numpy as np
+
+from batch import CAMPOS_NUMERICOS, aplanar_resultado, ejecutar_analisis_lote
+
+CAMPOS_FLUJO = ("ingresos", "ebitda", "fcf", "beneficio_neto")
+TRIMESTRES_TTM = 4
+VENTANA_MEDIANA = 20
+COLUMNAS_PANEL = (
+    "PER",
+    "PSR",
+    "EV/EBITDA",
+    "EV/FCF",
+    "ROE",
+    "ROA",
+    "Margen EBITDA",
+    "Deuda neta/EBITDA",
+    "precio_base",
+    "precio_proyeccion",
+    "score_total",
+)
+COLUMNAS_MEDIANA = ("PER", "EV/EBITDA", "ROE", "Margen EBITDA", "score_total")
+
+
+def _como_panel(valores, forma):
+    """Expande un valor por empresa a la forma ``(empresas, trimestres)``."""
+    valores = np.asarray(valores)
+    if valores.ndim == 1:
+        valores = valores[:, None]
+    return np.broadcast_to(valores, forma)
+
+
+def suma_movil(valores, ventana=TRIMESTRES_TTM):
+    """Suma de las últimas ``ventana`` columnas; ``NaN`` si falta algún trimestre.
+
+    Se suman ``ventana`` vistas desplazadas del panel (en lugar de restar sumas
+    acumuladas) para no arrastrar error de redondeo a lo largo de la serie.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    trimestres = valores.shape[1]
+    suma = np.full(valores.shape, np.nan)
+    if trimestres >= ventana:
+        cola = valores[:, : trimestres - ventana + 1].copy()
+        for desplazamiento in range(1, ventana):
+            cola += valores[:, desplazamiento : trimestres - ventana + 1 + desplazamiento]
+        suma[:, ventana - 1 :] = cola
+    return suma
+
+
+def mediana_movil(valores, ventana=VENTANA_MEDIANA, min_observaciones=None):
+    """Mediana de las últimas ``ventana`` columnas ignorando ``NaN``.
+
+    Las ventanas con menos de ``min_observaciones`` valores (por defecto la
+    ventana completa) devuelven ``NaN``.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    min_observaciones = ventana if min_observaciones is None else min_observaciones
+    relleno = np.full((valores.shape[0], ventana - 1), np.nan)
+    ventanas = np.lib.stride_tricks.sliding_window_view(np.hstack([relleno, valores]), ventana, axis=1)
+    observaciones = np.count_nonzero(~np.isnan(ventanas), axis=2)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # Ventanas vacías: "All-NaN slice".
+        mediana = np.nanmedian(ventanas, axis=2)
+    mediana[observaciones < max(min_observaciones, 1)] = np.nan
+    return mediana
+
+
+def fundamentales_ttm(panel, trimestres=TRIMESTRES_TTM):
+    """Panel con los flujos en doce meses móviles y el resto de campos sin cambios."""
+    forma = np.shape(panel["precio_accion"])
+    ttm = {"tipo_empresa": _como_panel(np.asarray(panel["tipo_empresa"], dtype=object), forma)}
+    for campo in CAMPOS_NUMERICOS:
+        valores = _como_panel(np.asarray(panel[campo], dtype=np.float64), forma)
+        ttm[campo] = suma_movil(valores, trimestres) if campo in CAMPOS_FLUJO else valores
+    return ttm
+
+
+def analizar_panel(
+    panel,
+    columnas=COLUMNAS_PANEL,
+    columnas_mediana=COLUMNAS_MEDIANA,
+    ventana_mediana=VENTANA_MEDIANA,
+    min_observaciones=None,
+):
+    """Analiza cada celda empresa × trimestre con fundamentales TTM.
+
+    Devuelve ``valido`` (celdas con datos completos), ``series`` (una matriz por
+    columna de ``columnas``, ``NaN`` donde no hay dato) y ``medianas`` (mediana
+    móvil de ``ventana_mediana`` trimestres de cada columna de ``columnas_mediana``).
+    """
+    ttm = fundamentales_ttm(panel)
+    forma = ttm["precio_accion"].shape
+    valido = np.ones(forma, dtype=bool)
+    for campo in CAMPOS_NUMERICOS:
+        valido &= ~np.isnan(ttm[campo])
+
+    planas = aplanar_resultado(ejecutar_analisis_lote({campo: valores[valido] for campo, valores in ttm.items()}))
+    series = {}
+    for nombre in columnas:
+        serie = np.full(forma, np.nan)
+        serie[valido] = planas[nombre]
+        series[nombre] = serie
+
+    medianas = {
+        nombre: mediana_movil(series[nombre], ventana_mediana, min_observaciones) for nombre in columnas_mediana
+    }
+    return {"valido": valido, "series": series, "medianas": medianas}
+
+
+def panel_desde_filas(columnas):
+    """Pasa de formato largo (una fila por ``ticker`` y ``trimestre``) a panel.
+
+    ``columnas`` es un dict de arrays o un DataFrame con ``ticker``,
+    ``trimestre`` (cualquier valor ordenable, p. ej. ``"2024Q1"``) y los campos
+    de ``datos``. Devuelve ``(tickers, trimestres, panel)``; los huecos quedan a
+    ``NaN`` y ``tipo_empresa`` es el del último trimestre de cada empresa.
+    """
+    tickers, fila = np.unique(np.asarray(columnas["ticker"]), return_inverse=True)
+    trimestres, columna = np.unique(np.asarray(columnas["trimestre"]), return_inverse=True)
+    forma = (len(tickers), len(trimestres))
+
+    panel = {}
+    for campo in CAMPOS_NUMERICOS:
+        matriz = np.full(forma, np.nan)
+        matriz[fila, columna] = np.asarray(columnas[campo], dtype=np.float64)
+        panel[campo] = matriz
+    tipo = np.empty(forma[0], dtype=object)
+    orden = np.argsort(columna, kind="stable")
+    tipo[fila[orden]] = np.asarray(columnas["tipo_empresa"], dtype=object)[orden]
+    panel["tipo_empresa"] = tipo
+    return tickers, trimestres, panel
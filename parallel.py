@@ -0,0 +1,99 @@
+"""Ejecución multinúcleo del screener sobre un pool de procesos.
+
+Las empresas se reparten en lotes columnares (un array NumPy por campo), que
+se serializan mucho mejor que un diccionario por empresa. Cada proceso aplica
+el motor vectorizado a su lote y los resultados se devuelven en el orden de
+entrada.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch import (
+    CAMPOS,
+    aplanar_resultado,
+    columnas_desde_registros,
+    ejecutar_analisis_lote,
+    filas_planas,
+    preparar_columnas,
+)
+from streaming import EscritorResultados, agrupar_en_lotes, detectar_formato, leer_fundamentales
+
+TAMANO_LOTE_PARALELO = 20_000
+
+
+def _analizar_lote(columnas):
+    """Tarea de cada proceso: analiza un lote columnar y devuelve columnas planas."""
+    return aplanar_resultado(ejecutar_analisis_lote(columnas))
+
+
+def _ejecutar_en_orden(tareas, trabajadores, en_vuelo):
+    """Envía ``(columnas, contexto)`` al pool y devuelve ``(planas, contexto)`` en orden.
+
+    Como mucho ``en_vuelo`` lotes están pendientes a la vez, de modo que un
+    iterador de entrada muy largo no se materializa entero en memoria.
+    """
+    with ProcessPoolExecutor(max_workers=trabajadores) as pool:
+        pendientes = deque()
+        for columnas, contexto in tareas:
+            pendientes.append((pool.submit(_analizar_lote, columnas), contexto))
+            if len(pendientes) >= en_vuelo:
+                futuro, ctx = pendientes.popleft()
+                yield futuro.result(), ctx
+        while pendientes:
+            futuro, ctx = pendientes.popleft()
+            yield futuro.result(), ctx
+
+
+def analizar_columnas_en_paralelo(columnas, trabajadores=None, tamano_lote=TAMANO_LOTE_PARALELO):
+    """Analiza un universo columnar en paralelo y devuelve sus columnas planas.
+
+    Equivale a ``aplanar_resultado(ejecutar_analisis_lote(columnas))`` repartiendo
+    el trabajo entre ``trabajadores`` procesos (por defecto, uno por núcleo).
+    """
+    c = preparar_columnas(columnas)
+    n = len(c["precio_accion"])
+    trabajadores = trabajadores or os.cpu_count() or 1
+    if trabajadores == 1 or n <= tamano_lote:
+        return _analizar_lote(c)
+
+    tareas = (
+        ({campo: valores[inicio:inicio + tamano_lote] for campo, valores in c.items()}, None)
+        for inicio in range(0, n, tamano_lote)
+    )
+    partes = [planas for planas, _ in _ejecutar_en_orden(tareas, trabajadores, 2 * trabajadores)]
+    return {nombre: np.concatenate([p[nombre] for p in partes]) for nombre in partes[0]}
+
+
+def analizar_en_paralelo(registros, trabajadores=None, tamano_lote=TAMANO_LOTE_PARALELO):
+    """Versión multinúcleo de ``streaming.analizar_en_streaming``.
+
+    Genera las mismas filas y en el mismo orden que la versión secuencial.
+    """
+    trabajadores = trabajadores or os.cpu_count() or 1
+
+    def tareas():
+        for lote in agrupar_en_lotes(registros, tamano_lote):
+            extras = [{k: v for k, v in r.items() if k not in CAMPOS} for r in lote]
+            yield columnas_desde_registros(lote), extras
+
+    for planas, extras in _ejecutar_en_orden(tareas(), trabajadores, 2 * trabajadores):
+        for extra, fila in zip(extras, filas_planas(planas)):
+            yield {**extra, **fila}
+
+
+def analizar_archivo_en_paralelo(
+    ruta_entrada, ruta_salida, trabajadores=None, tamano_lote=TAMANO_LOTE_PARALELO
+):
+    """Versión multinúcleo de ``streaming.analizar_archivo``."""
+    formato_entrada = detectar_formato(ruta_entrada)
+    formato_salida = detectar_formato(ruta_salida)
+    with open(ruta_entrada, encoding="utf-8", newline="") as entrada, open(
+        ruta_salida, "w", encoding="utf-8", newline=""
+    ) as salida:
+        registros = leer_fundamentales(entrada, formato_entrada)
+        escritor = EscritorResultados(salida, formato_salida)
+        return escritor.escribir(analizar_en_paralelo(registros, trabajadores, tamano_lote))
@@ -0,0 +1,107 @@
+"""Percentiles del score y de los ratios dentro del universo y por tipo de empresa.
+
+Cada columna se ordena una sola vez por valor; el orden por grupo sale de una
+ordenación estable por código de grupo (entero pequeño, ordenación por
+cubetas) sobre ese mismo orden, así que ambos percentiles cuestan una
+ordenación por comparación. Los empates reciben el mismo percentil (rango
+medio) y los valores ``NaN`` (``None`` en el motor escalar) no cuentan en el
+universo ni en el grupo y quedan a ``NaN``.
+"""
+
+import numpy as np
+
+from records import COLUMNAS_RATIOS, TIPOS_EMPRESA
+
+COLUMNAS_PERCENTIL = (
+    "score_total",
+    "PER",
+    "PSR",
+    "EV/EBITDA",
+    "EV/FCF",
+    "ROE",
+    "ROA",
+    "Margen EBITDA",
+    "Deuda neta/EBITDA",
+)
+_NOMBRES_CORTOS = {ratio: nombre for nombre, ratio in COLUMNAS_RATIOS.items()}
+
+
+def _percentiles_ordenados(valores, grupos=None):
+    """Percentil de cada posición de ``valores`` ya ordenados (por grupo y, dentro, por valor).
+
+    Un valor con ``d`` valores por debajo y ``e`` iguales en un grupo de ``n``
+    tiene percentil ``100 * (d + e / 2) / n``.
+    """
+    m = len(valores)
+    cambio = np.empty(m, dtype=bool)
+    cambio[:1] = True
+    np.not_equal(valores[1:], valores[:-1], out=cambio[1:])
+    if grupos is None:
+        inicio_grupo = np.zeros(m, dtype=np.intp)
+        tamano_grupo = m
+    else:
+        nuevo_grupo = np.empty(m, dtype=bool)
+        nuevo_grupo[:1] = True
+        np.not_equal(grupos[1:], grupos[:-1], out=nuevo_grupo[1:])
+        cambio |= nuevo_grupo
+        inicios = np.flatnonzero(nuevo_grupo)
+        grupo = np.cumsum(nuevo_grupo) - 1
+        inicio_grupo = inicios[grupo]
+        tamano_grupo = np.diff(np.append(inicios, m))[grupo]
+
+    inicios_empate = np.flatnonzero(cambio)
+    empate = np.cumsum(cambio) - 1
+    debajo = inicios_empate[empate] - inicio_grupo
+    iguales = np.diff(np.append(inicios_empate, m))[empate]
+    return 100.0 * (debajo + 0.5 * iguales) / tamano_grupo
+
+
+def percentiles(valores, grupos=None):
+    """Percentil (0-100) de cada valor en el universo y, si hay ``grupos``, en su grupo.
+
+    ``grupos`` son códigos enteros no negativos, uno por fila. Devuelve
+    ``(universo, por_grupo)``; ``por_grupo`` es ``None`` sin ``grupos``. Para
+    ratios en los que menos es mejor (PER, EV/EBITDA...), el percentil del
+    valor cambiado de signo es ``100 - percentil``.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    universo = np.full(valores.shape, np.nan)
+    por_grupo = None if grupos is None else np.full(valores.shape, np.nan)
+
+    validos = np.flatnonzero(~np.isnan(valores))
+    if not len(validos):
+        return universo, por_grupo
+    orden = validos[np.argsort(valores[validos])]
+    universo[orden] = _percentiles_ordenados(valores[orden])
+
+    if grupos is not None:
+        grupos = np.asarray(grupos)
+        codigos = grupos.astype(np.int16) if len(grupos) and grupos.max() < np.iinfo(np.int16).max else grupos
+        orden = orden[np.argsort(codigos[orden], kind="stable")]
+        por_grupo[orden] = _percentiles_ordenados(valores[orden], codigos[orden])
+    return universo, por_grupo
+
+
+def codigos_tipo(tipo_empresa):
+    """Código entero de cada ``tipo_empresa`` normalizado (posición en ``records.TIPOS_EMPRESA``)."""
+    tipo_empresa = np.asarray(tipo_empresa, dtype=object)
+    codigos = np.zeros(tipo_empresa.shape, dtype=np.int16)
+    for i, nombre in enumerate(TIPOS_EMPRESA):
+        codigos[tipo_empresa == nombre] = i
+    return codigos
+
+
+def percentiles_resultado(planas, columnas=COLUMNAS_PERCENTIL):
+    """Columnas ``percentil_<col>`` y ``percentil_tipo_<col>`` para ``batch.aplanar_resultado``.
+
+    ``<col>`` es el nombre corto de ``records.COLUMNAS_RATIOS`` (``per``,
+    ``ev_ebitda``...) o el de la columna de score.
+    """
+    grupos = codigos_tipo(planas["tipo_empresa"])
+    columnas_percentil = {}
+    for nombre in columnas:
+        corto = _NOMBRES_CORTOS.get(nombre, nombre)
+        universo, por_tipo = percentiles(planas[nombre], grupos)
+        columnas_percentil[f"percentil_{corto}"] = universo
+        columnas_percentil[f"percentil_tipo_{corto}"] = por_tipo
+    return columnas_percentil
@@ -0,0 +1,251 @@
+"""Registros compactos para empresas y resultados.
+
+``Empresa`` es un registro con ``__slots__`` que sustituye al diccionario
+``datos`` en el motor escalar: admite ``empresa["campo"]`` y ``{**empresa}``,
+así que ``calcular_ratios``, los DCF y ``ejecutar_analisis`` lo aceptan sin
+cambios. Para universos completos, ``DTYPE_EMPRESA`` y ``DTYPE_RESULTADO`` son
+dtypes estructurados de NumPy en los que textos y advertencias se guardan como
+códigos enteros y bits. ``DTYPE_RESULTADO`` lleva los precios de
+``ESCENARIOS_PERPETUO``; ``dtype_resultado(escenarios)`` da el de otro conjunto.
+"""
+
+from dataclasses import astuple, dataclass
+
+import numpy as np
+
+from analysis import ESCENARIOS_PERPETUO, TIPO_EMPRESA_POR_DEFECTO, WACC_BASE_TIPO, pesos_escenarios
+from batch import (
+    BIT_ADVERTENCIA,
+    CAMPOS,
+    CAMPOS_NUMERICOS,
+    expandir_advertencias,
+)
+
+TIPOS_EMPRESA = tuple(WACC_BASE_TIPO)
+CLASIFICACIONES_MERCADO = (None, "Infravalorada", "Precio razonable", "Sobrevalorada")
+VEREDICTOS = ("favorable", "neutral", "cautela")
+CLASIFICACIONES_SCORE = ("Compra", "Mantener", "Neutral", "Evitar")
+
+DTYPE_EMPRESA = np.dtype([("tipo_empresa", np.uint8)] + [(campo, np.float64) for campo in CAMPOS_NUMERICOS])
+
+# Nombre de columna en DTYPE_RESULTADO -> nombre en ``batch.aplanar_resultado``.
+COLUMNAS_RATIOS = {
+    "per": "PER",
+    "psr": "PSR",
+    "ev_ebitda": "EV/EBITDA",
+    "ev_fcf": "EV/FCF",
+    "roe": "ROE",
+    "roa": "ROA",
+    "margen_ebitda": "Margen EBITDA",
+    "capitalizacion": "Capitalización",
+    "ev": "EV",
+    "deuda_neta_ebitda": "Deuda neta/EBITDA",
+}
+COLUMNAS_SCORE = ("score_valoracion", "score_rentabilidad", "score_riesgo", "score_dcf_vs_mercado", "score_total")
+
+
+def _columnas_precios(nombres):
+    columnas = tuple(f"precio_{nombre.lower()}" for nombre in nombres) + ("precio_esperado", "precio_proyeccion")
+    if len(set(columnas)) != len(columnas):
+        raise ValueError(f"Los nombres de los escenarios dan columnas de precios repetidas: {', '.join(columnas)}.")
+    return columnas
+
+
+def _dtype_resultado(precios):
+    return np.dtype(
+        [("tipo_empresa", np.uint8), ("wacc", np.float64)]
+        + [(nombre, np.float64) for nombre in COLUMNAS_RATIOS]
+        + [(nombre, np.float64) for nombre in precios]
+        + [
+            ("veredicto_preliminar", np.uint8),
+            ("clasificacion_mercado_perpetuo", np.uint8),
+            ("clasificacion_mercado_proyeccion", np.uint8),
+        ]
+        + [(nombre, np.uint8) for nombre in COLUMNAS_SCORE]
+        + [("score_clasificacion", np.uint8), ("advertencias", np.uint16)]
+    )
+
+
+def columnas_precios(escenarios=ESCENARIOS_PERPETUO):
+    """Columnas de precios de ``batch.aplanar_resultado`` para un conjunto de escenarios.
+
+    Una ``precio_<escenario>`` por escenario, ``precio_esperado`` y
+    ``precio_proyeccion``.
+    """
+    escenarios = tuple(escenarios)
+    pesos_escenarios(escenarios)
+    return _columnas_precios(esc.nombre for esc in escenarios)
+
+
+def dtype_resultado(escenarios=ESCENARIOS_PERPETUO):
+    """Dtype estructurado de un resultado compacto con los precios de ``escenarios``."""
+    return _dtype_resultado(columnas_precios(escenarios))
+
+
+COLUMNAS_PRECIOS = columnas_precios()
+DTYPE_RESULTADO = dtype_resultado()
+
+
+@dataclass
+class Empresa:
+    """Datos de entrada de una empresa, con la misma interfaz que ``datos``."""
+
+    __slots__ = CAMPOS
+
+    tipo_empresa: str
+    ingresos: float
+    ebitda: float
+    fcf: float
+    deuda: float
+    caja: float
+    precio_accion: float
+    numero_acciones: float
+    patrimonio_neto: float
+    activos_totales: float
+    beneficio_neto: float
+    g_conservador_pct: float
+    g_base_pct: float
+    g_optimista_pct: float
+    g_inicial_pct: float
+    g_terminal_pct: float
+
+    def __getitem__(self, campo):
+        if campo not in CAMPOS:
+            raise KeyError(campo)
+        return getattr(self, campo)
+
+    def keys(self):
+        return CAMPOS
+
+    @classmethod
+    def desde_datos(cls, datos):
+        """Crea el registro a partir de un diccionario ``datos``."""
+        return cls(str(datos["tipo_empresa"]), *(float(datos[campo]) for campo in CAMPOS_NUMERICOS))
+
+    def a_datos(self):
+        """Devuelve el diccionario ``datos`` equivalente."""
+        return dict(zip(CAMPOS, astuple(self)))
+
+
+def _codigos(valores, catalogo, por_defecto=0):
+    """Convierte un array de textos en códigos enteros según ``catalogo``."""
+    codigos = np.full(len(valores), por_defecto, dtype=np.uint8)
+    for codigo, texto in enumerate(catalogo):
+        if texto is not None:
+            codigos[valores == texto] = codigo
+    return codigos
+
+
+def empresas_desde_columnas(columnas):
+    """Empaqueta columnas (dict de arrays o DataFrame) en un array ``DTYPE_EMPRESA``."""
+    tipos = np.asarray(columnas["tipo_empresa"], dtype=object)
+    empresas = np.empty(len(tipos), dtype=DTYPE_EMPRESA)
+    empresas["tipo_empresa"] = _codigos(tipos, TIPOS_EMPRESA, TIPOS_EMPRESA.index(TIPO_EMPRESA_POR_DEFECTO))
+    for campo in CAMPOS_NUMERICOS:
+        empresas[campo] = columnas[campo]
+    return empresas
+
+
+def columnas_desde_empresas(empresas):
+    """Vista columnar de un array ``DTYPE_EMPRESA`` lista para ``ejecutar_analisis_lote``."""
+    columnas = {"tipo_empresa": np.array(TIPOS_EMPRESA, dtype=object)[empresas["tipo_empresa"]]}
+    for campo in CAMPOS_NUMERICOS:
+        columnas[campo] = empresas[campo]
+    return columnas
+
+
+def resultados_compactos(planas, escenarios=ESCENARIOS_PERPETUO):
+    """Empaqueta la salida de ``batch.aplanar_resultado`` en un array ``dtype_resultado(escenarios)``.
+
+    ``escenarios`` debe ser el conjunto con el que se hizo el análisis.
+    """
+    precios = columnas_precios(escenarios)
+    faltan = [columna for columna in precios if columna not in planas]
+    if faltan:
+        raise ValueError(f"El resultado no tiene las columnas {', '.join(faltan)}: ¿otro conjunto de escenarios?")
+    n = len(planas["wacc"])
+    compactos = np.empty(n, dtype=dtype_resultado(escenarios))
+    compactos["tipo_empresa"] = _codigos(planas["tipo_empresa"], TIPOS_EMPRESA)
+    compactos["wacc"] = planas["wacc"]
+    for columna, nombre in COLUMNAS_RATIOS.items():
+        compactos[columna] = planas[nombre]
+    for columna in precios + COLUMNAS_SCORE + ("advertencias",):
+        compactos[columna] = planas[columna]
+    compactos["veredicto_preliminar"] = _codigos(planas["veredicto_preliminar"], VEREDICTOS)
+    for columna in ("clasificacion_mercado_perpetuo", "clasificacion_mercado_proyeccion"):
+        compactos[columna] = _codigos(planas[columna], CLASIFICACIONES_MERCADO)
+    compactos["score_clasificacion"] = _codigos(planas["score_clasificacion"], CLASIFICACIONES_SCORE)
+    return compactos
+
+
+def comprimir_resultado(resultado):
+    """Convierte la salida de ``ejecutar_analisis`` en un registro compacto.
+
+    El dtype es ``DTYPE_RESULTADO`` o, si el análisis usó otros escenarios, el
+    de ``dtype_resultado`` con esos escenarios.
+    """
+    ratios = resultado["ratios_info"]["ratios"]
+    dcf_perpetuo = resultado["dcf_perpetuo"]
+    escenarios = dcf_perpetuo["escenarios"]
+    dcf_proyeccion = resultado["dcf_proyeccion"]
+    score = resultado["score"]
+    advertencias = 0
+    for texto in (
+        resultado["ratios_info"]["advertencias"]
+        + resultado["dcf_perpetuo"]["advertencias"]
+        + dcf_proyeccion.get("advertencias", [])
+    ):
+        advertencias |= BIT_ADVERTENCIA[texto]
+
+    def numero(valor):
+        return np.nan if valor is None else valor
+
+    nombres = tuple(escenarios)
+    precios = _columnas_precios(nombres)
+    registro = np.zeros((), dtype=DTYPE_RESULTADO if precios == COLUMNAS_PRECIOS else _dtype_resultado(precios))
+    registro["tipo_empresa"] = TIPOS_EMPRESA.index(resultado["wacc_info"]["tipo_empresa"])
+    registro["wacc"] = resultado["wacc_info"]["wacc"]
+    for columna, nombre in COLUMNAS_RATIOS.items():
+        registro[columna] = numero(ratios[nombre])
+    for nombre in nombres:
+        registro[f"precio_{nombre.lower()}"] = numero(escenarios[nombre].get("precio"))
+    registro["precio_esperado"] = numero(dcf_perpetuo.get("precio_esperado"))
+    registro["precio_proyeccion"] = numero(dcf_proyeccion.get("precio"))
+    registro["veredicto_preliminar"] = VEREDICTOS.index(resultado["ratios_info"]["veredicto_preliminar"])
+    registro["clasificacion_mercado_perpetuo"] = CLASIFICACIONES_MERCADO.index(
+        resultado["dcf_perpetuo"]["clasificacion_mercado"]
+    )
+    registro["clasificacion_mercado_proyeccion"] = CLASIFICACIONES_MERCADO.index(
+        dcf_proyeccion.get("clasificacion_mercado")
+    )
+    for bloque in ("valoracion", "rentabilidad", "riesgo", "dcf_vs_mercado", "total"):
+        registro[f"score_{bloque}"] = score[bloque]
+    registro["score_clasificacion"] = CLASIFICACIONES_SCORE.index(score["clasificacion"])
+    registro["advertencias"] = advertencias
+    return registro
+
+
+def expandir_resultado(registro):
+    """Diccionario plano legible (textos y ``None``) a partir de un registro compacto."""
+
+    def numero(valor):
+        valor = float(valor)
+        return None if valor != valor else valor
+
+    fila = {
+        "tipo_empresa": TIPOS_EMPRESA[registro["tipo_empresa"]],
+        "wacc": float(registro["wacc"]),
+    }
+    for columna, nombre in COLUMNAS_RATIOS.items():
+        fila[nombre] = numero(registro[columna])
+    for columna in registro.dtype.names:
+        if columna.startswith("precio_"):
+            fila[columna] = numero(registro[columna])
+    fila["veredicto_preliminar"] = VEREDICTOS[registro["veredicto_preliminar"]]
+    for columna in ("clasificacion_mercado_perpetuo", "clasificacion_mercado_proyeccion"):
+        fila[columna] = CLASIFICACIONES_MERCADO[registro[columna]]
+    for columna in COLUMNAS_SCORE:
+        fila[columna] = int(registro[columna])
+    fila["score_clasificacion"] = CLASIFICACIONES_SCORE[registro["score_clasificacion"]]
+    fila["advertencias"] = expandir_advertencias(registro["advertencias"])
+    return fila
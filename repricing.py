@@ -0,0 +1,164 @@
+"""Revalorización por ticks de precio con la parte independiente del precio en caché.
+
+De todo el análisis, sólo la capitalización, el EV, PER, PSR, EV/EBITDA,
+EV/FCF, la diferencia DCF-mercado y los bloques del score que salen de ellos
+dependen de ``precio_accion``. El WACC, ROE, ROA, márgenes, apalancamiento y
+los precios teóricos de ambos DCF no. ``RevalorizadorPrecios`` hace un análisis
+completo una vez, guarda por empresa lo que no depende del precio (acciones,
+deuda neta, divisores de los ratios, perfil de cortes, puntos de rentabilidad y
+riesgo, precios DCF) y cada tick de precios cuesta un número fijo de
+operaciones vectorizadas por empresa. Sólo se devuelven las empresas cuya
+clasificación del score o de mercado cambió. PSR no interviene en ninguna
+clasificación y no se recalcula.
+
+>>> motor = RevalorizadorPrecios(columnas, tickers)
+>>> cambios = motor.actualizar(nuevos_precios)
+>>> cambios = motor.actualizar([101.5, 7.2], motor.posiciones(["AAA", "BBB"]))
+"""
+
+import numpy as np
+
+from batch import ejecutar_analisis_lote, preparar_columnas
+from rules import REGLAS_COMPILADAS, indices_perfil
+
+_PER = REGLAS_COMPILADAS["per"]
+_EV_EBITDA = REGLAS_COMPILADAS["ev_ebitda"]
+_EV_FCF = REGLAS_COMPILADAS["ev_fcf"]
+_DIFERENCIA = REGLAS_COMPILADAS["diferencia_precio"]
+_CLASIFICACION = REGLAS_COMPILADAS["clasificacion_score"]
+
+# Clasificación -> (regla cuyas etiquetas le corresponden, atributo con el tramo actual).
+CLASIFICACIONES = {
+    "score_clasificacion": (_CLASIFICACION, "tramo_score"),
+    "clasificacion_mercado_perpetuo": (_DIFERENCIA, "tramo_perpetuo"),
+    "clasificacion_mercado_proyeccion": (_DIFERENCIA, "tramo_proyeccion"),
+}
+
+
+def _divisor(valores):
+    """Divisor con 0 donde no hay dato (``NaN``), para ``np.divide(..., where=divisor != 0)``."""
+    return np.where(np.isnan(valores), 0.0, valores)
+
+
+def _dividir(numerador, divisor):
+    """Como ``batch._dividir``: ``NaN`` donde el divisor es 0."""
+    return np.divide(numerador, divisor, out=np.full(np.shape(divisor), np.nan), where=divisor != 0)
+
+
+class RevalorizadorPrecios:
+    """Estado independiente del precio de un universo y su revalorización por ticks.
+
+    ``columnas`` y ``opciones`` son los de ``batch.ejecutar_analisis_lote``;
+    ``tickers`` identifica a cada empresa en los cambios devueltos.
+    """
+
+    def __init__(self, columnas, tickers=None, **opciones):
+        c = preparar_columnas(columnas)
+        resultado = ejecutar_analisis_lote(c, **opciones)
+        self.tickers = None if tickers is None else np.asarray(tickers, dtype=object)
+        self._posicion = None
+
+        self.numero_acciones = c["numero_acciones"]
+        self.deuda_neta = c["deuda"] - c["caja"]
+        self.beneficio_neto = c["beneficio_neto"]
+        self.ebitda = c["ebitda"]
+        self.fcf = c["fcf"]
+        # 0 con los cortes estándar; si no, un índice de perfil por empresa.
+        self.perfil = indices_perfil(resultado["wacc_info"]["tipo_empresa"], opciones.get("criterios", "estandar"))
+        score = resultado["score"]
+        self.puntos_fijos = score["rentabilidad"] + score["riesgo"]
+
+        # Precios teóricos y su divisor (0 donde no hay precio o es 0: sin clasificación).
+        self.precio_perpetuo = resultado["dcf_perpetuo"]["precio_base"]
+        self.precio_proyeccion = resultado["dcf_proyeccion"]["precio"]
+        self.divisor_perpetuo = _divisor(self.precio_perpetuo)
+        self.divisor_proyeccion = _divisor(self.precio_proyeccion)
+
+        self.precios = c["precio_accion"].copy()
+        estado = self._valorar(self.precios, slice(None))
+        self.score_total, self.tramo_score, self.tramo_perpetuo, self.tramo_proyeccion = estado
+
+    def __len__(self):
+        return len(self.precios)
+
+    def posiciones(self, tickers):
+        """Posición de cada ticker en el universo (para ``actualizar`` con ``indices``)."""
+        if self.tickers is None:
+            raise ValueError("El revalorizador no tiene tickers.")
+        if self._posicion is None:
+            self._posicion = {ticker: i for i, ticker in enumerate(self.tickers.tolist())}
+        return np.fromiter((self._posicion[ticker] for ticker in tickers), dtype=np.intp)
+
+    def _valorar(self, precios, indices):
+        """Score total y tramos de clasificación para ``precios`` de las empresas ``indices``.
+
+        Repite las operaciones de ``batch`` sobre los mismos valores, así que
+        coincide bit a bit con un análisis completo con esos precios.
+        """
+        capitalizacion = precios * self.numero_acciones[indices]
+        ev = capitalizacion + self.deuda_neta[indices]
+        perfil = self.perfil if np.ndim(self.perfil) == 0 else self.perfil[indices]
+        puntos = (
+            _PER.tabla_valores[_PER.tramos(_dividir(capitalizacion, self.beneficio_neto[indices]), perfil)]
+            + _EV_EBITDA.tabla_valores[_EV_EBITDA.tramos(_dividir(ev, self.ebitda[indices]), perfil)]
+            + _EV_FCF.tabla_valores[_EV_FCF.tramos(_dividir(ev, self.fcf[indices]), perfil)]
+        )
+
+        diferencia = _dividir(precios - self.precio_perpetuo[indices], self.divisor_perpetuo[indices])
+        tramo_perpetuo = _DIFERENCIA.tramos(diferencia)
+        # El tramo "sin dato" (-1) vale 0 puntos, como un DCF sin precio en el score.
+        puntos = puntos + self.puntos_fijos[indices] + _DIFERENCIA.tabla_valores[tramo_perpetuo]
+        score_total = np.clip(puntos, 0, 100)
+
+        diferencia = _dividir(precios - self.precio_proyeccion[indices], self.divisor_proyeccion[indices])
+        return score_total, _CLASIFICACION.tramos(score_total), tramo_perpetuo, _DIFERENCIA.tramos(diferencia)
+
+    def actualizar(self, precios, indices=None):
+        """Aplica nuevos precios (a todo el universo o a ``indices``) y devuelve los cambios.
+
+        Devuelve columnas (como ``batch.aplanar_resultado``) con una fila por
+        empresa cuya ``score_clasificacion`` o clasificación de mercado
+        (perpetuo o proyección) cambió: ``indice``, ``ticker`` si hay tickers,
+        ``precio_accion``, ``score_total`` y cada clasificación junto a su
+        valor anterior (``<clasificacion>_anterior``).
+        """
+        precios = np.array(precios, dtype=np.float64)
+        completo = indices is None
+        if completo:
+            if precios.shape != self.precios.shape:
+                raise ValueError(f"Se esperaban {len(self.precios)} precios y llegaron {precios.size}.")
+            indices = slice(None)
+            posiciones = np.arange(len(self.precios))
+        else:
+            posiciones = indices = np.asarray(indices, dtype=np.intp)
+            if precios.shape != indices.shape:
+                raise ValueError("Hace falta un precio por índice.")
+
+        score_total, *tramos = self._valorar(precios, indices)
+        anteriores = [getattr(self, atributo)[indices] for _, atributo in CLASIFICACIONES.values()]
+        cambio = np.zeros(precios.shape, dtype=bool)
+        for nuevo, anterior in zip(tramos, anteriores):
+            cambio |= nuevo != anterior
+
+        if completo:
+            # Se sustituyen los arrays: ``anteriores`` son vistas de los actuales.
+            self.precios = precios
+            self.score_total = score_total
+            for (_, atributo), nuevo in zip(CLASIFICACIONES.values(), tramos):
+                setattr(self, atributo, nuevo)
+        else:
+            self.precios[indices] = precios
+            self.score_total[indices] = score_total
+            for (_, atributo), nuevo in zip(CLASIFICACIONES.values(), tramos):
+                getattr(self, atributo)[indices] = nuevo
+
+        filas = np.flatnonzero(cambio)
+        cambios = {"indice": posiciones[filas]}
+        if self.tickers is not None:
+            cambios["ticker"] = self.tickers[cambios["indice"]]
+        cambios["precio_accion"] = precios[filas]
+        cambios["score_total"] = score_total[filas]
+        for (nombre, (regla, _)), nuevo, anterior in zip(CLASIFICACIONES.items(), tramos, anteriores):
+            cambios[nombre] = regla.tabla_etiquetas[0, nuevo[filas]]
+            cambios[f"{nombre}_anterior"] = regla.tabla_etiquetas[0, anterior[filas]]
+        return cambios
@@ -0,0 +1,160 @@
+"""DCF inverso: crecimiento y WACC implícitos en el precio de mercado.
+
+Para el DCF perpetuo (Gordon) hay solución cerrada. Para el DCF por proyección
+se usa una bisección vectorizada: todas las empresas avanzan a la vez, el
+intervalo inicial debe contener un cambio de signo (si no, la empresa queda sin
+solución) y una máscara indica qué empresas han convergido.
+"""
+
+import numpy as np
+
+from analysis import ANIOS_PROYECCION, crecimiento_proyectado
+from batch import calcular_wacc_lote, factores_capitalizacion, preparar_columnas
+
+TOLERANCIA = 1e-10
+MAX_ITERACIONES = 200
+
+
+def _contexto(columnas, wacc):
+    """Columnas preparadas, deuda neta, EV objetivo y WACC (automático si es ``None``)."""
+    c = preparar_columnas(columnas)
+    deuda_neta = c["deuda"] - c["caja"]
+    if wacc is None:
+        wacc = calcular_wacc_lote(c["tipo_empresa"], deuda_neta, c["ebitda"])["wacc"]
+    wacc = np.broadcast_to(np.asarray(wacc, dtype=np.float64), deuda_neta.shape)
+    # EV que justifica exactamente el precio de mercado.
+    ev_objetivo = c["precio_accion"] * c["numero_acciones"] + deuda_neta
+    return c, deuda_neta, ev_objetivo, wacc
+
+
+def g_implicito_perpetuo(columnas, wacc=None):
+    """Crecimiento perpetuo (en %) con el que el DCF perpetuo iguala el precio de mercado.
+
+    Resuelve ``fcf·(1+g)/(WACC-g) = EV`` con ``EV = precio·acciones + deuda neta``.
+    Devuelve ``NaN`` cuando no existe un ``g < WACC`` que lo cumpla.
+    """
+    c, _, ev, wacc = _contexto(columnas, wacc)
+    fcf = c["fcf"]
+    denominador = ev + fcf
+    valido = (denominador != 0) & (fcf != 0) & (c["numero_acciones"] != 0) & (wacc > 0)
+    g = np.divide(ev * wacc - fcf, denominador, out=np.full(ev.shape, np.nan), where=valido)
+    return np.where(valido & (g < wacc), g * 100, np.nan)
+
+
+def wacc_implicito_perpetuo(columnas, g_pct=None):
+    """WACC con el que el DCF perpetuo iguala el precio de mercado.
+
+    Usa ``g_base_pct`` salvo que se indique ``g_pct``. Devuelve ``NaN`` cuando
+    el WACC implícito no es positivo o no supera a ``g``.
+    """
+    c, _, ev, _ = _contexto(columnas, 0.0)
+    g = (c["g_base_pct"] if g_pct is None else np.asarray(g_pct, dtype=np.float64)) / 100
+    valido = (ev != 0) & (c["numero_acciones"] != 0)
+    wacc = np.divide(c["fcf"] * (1 + g), ev, out=np.full(ev.shape, np.nan), where=valido) + g
+    return np.where(valido & (wacc > g) & (wacc > 0), wacc, np.nan)
+
+
+def ev_dcf_proyeccion(fcf, g_inicial_pct, g_terminal_pct, wacc, anios=ANIOS_PROYECCION, perfil="lineal", factores=None):
+    """EV del DCF por proyección para arrays de supuestos (sin máscaras de error).
+
+    Sigue la senda de ``calcular_dcf_proyeccion_lote`` (``anios`` y ``perfil``
+    incluidos). ``factores`` es la salida de ``batch.factores_capitalizacion``
+    para ``wacc``; sin ella se calcula ``(1 + wacc) ** t``, que es lo que
+    conviene cuando cada empresa tiene un WACC distinto.
+    """
+    if anios < 1:
+        raise ValueError("El horizonte de proyección debe ser de al menos 1 año.")
+    g_terminal = g_terminal_pct / 100
+    fcf_t = fcf * np.ones(np.broadcast(fcf, g_inicial_pct, g_terminal_pct, wacc).shape)
+    ev = np.zeros_like(fcf_t)
+    for t in range(1, anios + 1):
+        fcf_t = fcf_t * (1 + crecimiento_proyectado(g_inicial_pct, g_terminal_pct, t, anios, perfil) / 100)
+        factor = (1 + wacc) ** t if factores is None else factores[0][factores[1], t - 1]
+        ev = ev + fcf_t / factor
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return ev + fcf_t * (1 + g_terminal) / (wacc - g_terminal) / factor
+
+
+def biseccion(funcion, bajo, alto, tolerancia=TOLERANCIA, max_iteraciones=MAX_ITERACIONES):
+    """Bisección vectorizada de ``funcion`` en ``[bajo, alto]`` elemento a elemento.
+
+    Devuelve ``raiz`` (``NaN`` donde no hay cambio de signo en el intervalo),
+    ``convergido`` (ancho final menor que ``tolerancia``) e ``iteraciones``.
+    """
+    bajo = np.array(bajo, dtype=np.float64)
+    alto = np.array(alto, dtype=np.float64)
+    f_bajo = funcion(bajo)
+    f_alto = funcion(alto)
+    acotado = np.isfinite(f_bajo) & np.isfinite(f_alto) & (np.sign(f_bajo) * np.sign(f_alto) <= 0)
+
+    iteraciones = 0
+    activo = acotado & (alto - bajo > tolerancia)
+    while activo.any() and iteraciones < max_iteraciones:
+        medio = (bajo + alto) / 2
+        f_medio = funcion(medio)
+        mismo_signo = np.sign(f_medio) == np.sign(f_bajo)
+        mover_bajo = activo & mismo_signo
+        mover_alto = activo & ~mismo_signo
+        bajo = np.where(mover_bajo, medio, bajo)
+        f_bajo = np.where(mover_bajo, f_medio, f_bajo)
+        alto = np.where(mover_alto, medio, alto)
+        activo = acotado & (alto - bajo > tolerancia)
+        iteraciones += 1
+
+    convergido = acotado & (alto - bajo <= tolerancia)
+    return {
+        "raiz": np.where(acotado, (bajo + alto) / 2, np.nan),
+        "convergido": convergido,
+        "iteraciones": iteraciones,
+    }
+
+
+def g_implicito_proyeccion(
+    columnas,
+    wacc=None,
+    g_min_pct=-50.0,
+    g_max_pct=100.0,
+    tolerancia=TOLERANCIA,
+    anios=ANIOS_PROYECCION,
+    perfil_crecimiento="lineal",
+):
+    """Crecimiento inicial (en %) con el que el DCF por proyección iguala el precio.
+
+    Mantiene ``g_terminal_pct`` y el WACC (automático si es ``None``) y busca
+    ``g_inicial_pct`` en ``[g_min_pct, g_max_pct]``. ``anios`` y
+    ``perfil_crecimiento`` son los de ``ejecutar_analisis_lote``.
+    """
+    c, _, ev, wacc = _contexto(columnas, wacc)
+    valido = (c["g_terminal_pct"] / 100 < wacc) & (wacc > 0) & (c["numero_acciones"] != 0)
+    factores = factores_capitalizacion(wacc, anios)
+
+    def residuo(g_pct):
+        return ev_dcf_proyeccion(c["fcf"], g_pct, c["g_terminal_pct"], wacc, anios, perfil_crecimiento, factores) - ev
+
+    n = ev.shape
+    resultado = biseccion(residuo, np.full(n, g_min_pct), np.full(n, g_max_pct), tolerancia)
+    resultado["convergido"] &= valido
+    resultado["raiz"] = np.where(valido, resultado["raiz"], np.nan)
+    return resultado
+
+
+def wacc_implicito_proyeccion(
+    columnas, wacc_max=1.0, tolerancia=TOLERANCIA, anios=ANIOS_PROYECCION, perfil_crecimiento="lineal"
+):
+    """WACC con el que el DCF por proyección iguala el precio de mercado.
+
+    Busca en ``(max(g_terminal, 0), wacc_max]`` con los crecimientos de ``datos``
+    y la senda de ``anios`` y ``perfil_crecimiento``.
+    """
+    c, _, ev, _ = _contexto(columnas, 0.0)
+    g_terminal = c["g_terminal_pct"] / 100
+    valido = c["numero_acciones"] != 0
+
+    def residuo(w):
+        return ev_dcf_proyeccion(c["fcf"], c["g_inicial_pct"], c["g_terminal_pct"], w, anios, perfil_crecimiento) - ev
+
+    bajo = np.maximum(g_terminal, 0.0) + 1e-9
+    resultado = biseccion(residuo, bajo, np.maximum(np.full(ev.shape, wacc_max), bajo), tolerancia)
+    resultado["convergido"] &= valido
+    resultado["raiz"] = np.where(valido, resultado["raiz"], np.nan)
+    return resultado
@@ -0,0 +1,275 @@
+"""Tabla declarativa de reglas de interpretación compilada en búsquedas por tramos.
+
+Cada regla parte una variable en tramos con cortes ordenados y asigna a cada
+tramo un valor (puntos del score o ajuste del WACC), una etiqueta y, si
+procede, una advertencia. Al compilarla, los cortes ``<=`` se desplazan al
+siguiente float, de modo que todos los límites significan ``x >= límite`` y el
+tramo de un array completo de valores sale de un solo ``np.searchsorted``. Los
+perfiles por tipo de empresa sólo cambian los cortes: se compilan juntos sobre
+la unión de sus límites y el perfil de cada fila es un índice más de la tabla.
+"""
+
+import math
+from bisect import bisect_right
+
+import numpy as np
+
+# ``(c, "<")``: el tramo inferior acaba en ``x < c``; ``(c, "<=")``: en ``x <= c``.
+# ``escala`` sólo afecta al texto de las etiquetas (p. ej. ROE en %).
+REGLAS = {
+    "per": {
+        "sobre": "PER",
+        "bloque": "valoracion",
+        "cortes": ((15, "<"), (25, "<=")),
+        "valores": (14, 10, 4),
+        "etiquetas": ("PER bajo (<{0:g}).", "PER razonable ({0:g}–{1:g}).", "PER exigente (>{1:g})."),
+    },
+    "per_sobrevaloracion": {
+        "sobre": "PER",
+        "cortes": ((30, "<="),),
+        "advertencias": (None, "PER > 30: posible sobrevaloración."),
+    },
+    "ev_ebitda": {
+        "sobre": "EV/EBITDA",
+        "bloque": "valoracion",
+        "cortes": ((8, "<"), (15, "<=")),
+        "valores": (14, 10, 4),
+        "etiquetas": ("EV/EBITDA bajo (<{0:g}).", "EV/EBITDA razonable ({0:g}–{1:g}).", "EV/EBITDA elevado (>{1:g})."),
+    },
+    "ev_ebitda_exigente": {
+        "sobre": "EV/EBITDA",
+        "cortes": ((25, "<="),),
+        "advertencias": (None, "EV/EBITDA > 25: valoración exigente."),
+    },
+    "ev_fcf": {
+        "sobre": "EV/FCF",
+        "bloque": "calidad_cash_flow",
+        "cortes": ((15, "<"), (30, "<=")),
+        "valores": (12, 8, 2),
+        "etiquetas": ("EV/FCF atractivo (<{0:g}).", "EV/FCF exigente ({0:g}–{1:g}).", "EV/FCF muy exigente (>{1:g})."),
+    },
+    "roe": {
+        "sobre": "ROE",
+        "bloque": "rentabilidad",
+        "cortes": ((0.10, "<"), (0.15, "<=")),
+        "valores": (4, 9, 13),
+        "etiquetas": ("ROE bajo (<{0:g}%).", "ROE correcto ({0:g}–{1:g}%).", "ROE elevado (>{1:g}%)."),
+        "escala": 100,
+    },
+    "margen_ebitda": {
+        "sobre": "Margen EBITDA",
+        "bloque": "rentabilidad",
+        "cortes": ((0.15, "<"), (0.25, "<=")),
+        "valores": (3, 8, 12),
+        "etiquetas": (
+            "Margen EBITDA bajo (<{0:g}%).",
+            "Margen EBITDA normal ({0:g}–{1:g}%).",
+            "Margen EBITDA alto (>{1:g}%).",
+        ),
+        "escala": 100,
+    },
+    "fcf": {
+        "sobre": "fcf",
+        "bloque": "calidad_cash_flow",
+        "cortes": ((0, "<="),),
+        "valores": (2, 8),
+        "etiquetas": ("FCF débil o negativo.", None),
+        "advertencias": ("FCF ≤ 0: generación de caja débil.", None),
+    },
+    "apalancamiento": {
+        "sobre": "Deuda neta/EBITDA",
+        "bloque": "solvencia",
+        "cortes": ((2, "<="), (3, "<=")),
+        "valores": (12, 8, 3),
+        "etiquetas": (None, None, "Apalancamiento alto."),
+        "advertencias": (None, None, "Deuda neta/EBITDA > 3: apalancamiento elevado."),
+    },
+    "ajuste_wacc": {
+        "sobre": "Deuda neta/EBITDA",
+        "cortes": ((3, "<="), (4, "<=")),
+        "valores": (0.0, 0.01, 0.02),
+        "etiquetas": (
+            None,
+            "WACC ajustado al alza por apalancamiento elevado (>{0:g}x).",
+            "WACC ajustado al alza por apalancamiento muy elevado (>{1:g}x).",
+        ),
+    },
+    "diferencia_precio": {
+        "sobre": "(precio_mercado - precio_teorico) / precio_teorico",
+        "cortes": ((-0.20, "<"), (0.20, "<=")),
+        "valores": (15, 10, 4),
+        "etiquetas": ("Infravalorada", "Precio razonable", "Sobrevalorada"),
+    },
+    "clasificacion_score": {
+        "sobre": "score_total",
+        "cortes": ((45, "<"), (60, "<"), (75, "<")),
+        "etiquetas": ("Evitar", "Neutral", "Mantener", "Compra"),
+    },
+}
+
+# Reglas de ``calcular_ratios``, en el orden en que aparecen sus etiquetas y advertencias.
+REGLAS_RATIOS = (
+    "per",
+    "per_sobrevaloracion",
+    "ev_ebitda",
+    "ev_ebitda_exigente",
+    "ev_fcf",
+    "roe",
+    "margen_ebitda",
+    "fcf",
+    "apalancamiento",
+)
+
+# Cortes propios de cada tipo de empresa (PER y EV/EBITDA "razonables" por perfil).
+# El perfil ``estandar`` usa los cortes de ``REGLAS`` para todas las empresas.
+PERFIL_ESTANDAR = "estandar"
+PERFILES_TIPO = {
+    "growth": {"per": (15, 35), "ev_ebitda": (8, 20)},
+    "madura": {"per": (15, 20), "ev_ebitda": (8, 12)},
+    "defensiva": {"per": (15, 18), "ev_ebitda": (8, 10)},
+    "cíclica": {"per": (15, 22), "ev_ebitda": (8, 14)},
+}
+PERFILES = (PERFIL_ESTANDAR,) + tuple(PERFILES_TIPO)
+INDICE_PERFIL = {nombre: i for i, nombre in enumerate(PERFILES)}
+CRITERIOS = ("estandar", "por_tipo")
+
+SIN_DATO = -1
+
+
+def _limite(corte, operador):
+    """Límite inferior del tramo siguiente, siempre con la forma ``x >= límite``."""
+    if operador == "<":
+        return float(corte)
+    if operador == "<=":
+        return math.nextafter(float(corte), math.inf)
+    raise ValueError(f"Operador de corte no soportado: {operador}.")
+
+
+class ReglaCompilada:
+    """Regla lista para clasificar escalares (``bisect``) o arrays (``np.searchsorted``).
+
+    Las tablas tienen una columna por tramo más una final para "sin dato", a la
+    que apunta ``SIN_DATO`` (-1) al indexar.
+    """
+
+    __slots__ = (
+        "nombre",
+        "limites_perfil",
+        "limites",
+        "tramo_por_intervalo",
+        "valores",
+        "etiquetas",
+        "advertencias",
+        "tabla_valores",
+        "tabla_etiquetas",
+    )
+
+    def __init__(self, nombre, regla, perfiles=PERFILES, cortes_perfil=PERFILES_TIPO):
+        self.nombre = nombre
+        operadores = [operador for _, operador in regla["cortes"]]
+        cortes_base = tuple(corte for corte, _ in regla["cortes"])
+        n_tramos = len(cortes_base) + 1
+
+        cortes_por_perfil = [cortes_perfil.get(perfil, {}).get(nombre, cortes_base) for perfil in perfiles]
+        for cortes in cortes_por_perfil:
+            if len(cortes) != len(operadores) or list(cortes) != sorted(cortes):
+                raise ValueError(f"Cortes no válidos para la regla '{nombre}': {cortes}.")
+        self.limites_perfil = tuple(
+            tuple(_limite(corte, operador) for corte, operador in zip(cortes, operadores)) for cortes in cortes_por_perfil
+        )
+
+        # Unión ordenada de los límites de todos los perfiles y, por perfil, el
+        # tramo que corresponde a cada intervalo de esa unión.
+        self.limites = np.array(sorted({l for limites in self.limites_perfil for l in limites}), dtype=np.float64)
+        self.tramo_por_intervalo = np.array(
+            [
+                [0] + [bisect_right(limites, inferior) for inferior in self.limites.tolist()]
+                for limites in self.limites_perfil
+            ],
+            dtype=np.intp,
+        )
+
+        valores = tuple(regla.get("valores", (0,) * n_tramos))
+        escala = regla.get("escala", 1)
+        plantillas = regla.get("etiquetas", (None,) * n_tramos)
+        self.valores = valores + (0,)
+        self.etiquetas = tuple(
+            tuple(None if p is None else p.format(*(c * escala for c in cortes)) for p in plantillas) + (None,)
+            for cortes in cortes_por_perfil
+        )
+        self.advertencias = tuple(regla.get("advertencias", (None,) * n_tramos)) + (None,)
+        self.tabla_valores = np.array(self.valores, dtype=np.float64 if _hay_float(valores) else np.int64)
+        self.tabla_etiquetas = np.empty((len(perfiles), n_tramos + 1), dtype=object)
+        self.tabla_etiquetas[:] = self.etiquetas
+
+    def tramo(self, valor, perfil=0):
+        """Tramo de un escalar; ``SIN_DATO`` si es ``None`` o ``NaN``."""
+        if valor is None or valor != valor:
+            return SIN_DATO
+        return bisect_right(self.limites_perfil[perfil], valor)
+
+    def tramos(self, valores, perfil=0):
+        """Tramo de cada valor de un array; ``perfil`` es un índice o un array de índices."""
+        valores = np.asarray(valores, dtype=np.float64)
+        tramos = self.tramo_por_intervalo[perfil, np.searchsorted(self.limites, valores, side="right")]
+        return np.where(np.isnan(valores), SIN_DATO, tramos)
+
+    def codigos(self, bits):
+        """Tabla de códigos de advertencia por tramo a partir de ``{texto: bit}``."""
+        return np.array([bits.get(texto, 0) if texto else 0 for texto in self.advertencias], dtype=np.uint16)
+
+
+def _hay_float(valores):
+    return any(isinstance(v, float) for v in valores)
+
+
+REGLAS_COMPILADAS = {nombre: ReglaCompilada(nombre, regla) for nombre, regla in REGLAS.items()}
+
+
+def indice_perfil(tipo_empresa, criterios="estandar"):
+    """Índice de perfil de una empresa con tipo ya normalizado."""
+    if criterios == "estandar":
+        return 0
+    if criterios == "por_tipo":
+        return INDICE_PERFIL[tipo_empresa]
+    raise ValueError(f"Criterios no soportados: {criterios}. Use {', '.join(CRITERIOS)}.")
+
+
+def indices_perfil(tipo_empresa, criterios="estandar"):
+    """Versión vectorizada de ``indice_perfil`` (un escalar 0 con ``estandar``)."""
+    if criterios == "estandar":
+        return 0
+    if criterios != "por_tipo":
+        raise ValueError(f"Criterios no soportados: {criterios}. Use {', '.join(CRITERIOS)}.")
+    indices = np.zeros(np.shape(tipo_empresa), dtype=np.intp)
+    for nombre in PERFILES_TIPO:
+        indices[tipo_empresa == nombre] = INDICE_PERFIL[nombre]
+    return indices
+
+
+def tramo(nombre, valor, perfil=0):
+    return REGLAS_COMPILADAS[nombre].tramo(valor, perfil)
+
+
+def valor(nombre, tramo_valor):
+    return REGLAS_COMPILADAS[nombre].valores[tramo_valor]
+
+
+def etiqueta(nombre, tramo_valor, perfil=0):
+    return REGLAS_COMPILADAS[nombre].etiquetas[perfil][tramo_valor]
+
+
+def advertencia(nombre, tramo_valor):
+    return REGLAS_COMPILADAS[nombre].advertencias[tramo_valor]
+
+
+def tramos_lote(nombre, valores, perfil=0):
+    return REGLAS_COMPILADAS[nombre].tramos(valores, perfil)
+
+
+def valores_lote(nombre, tramos):
+    return REGLAS_COMPILADAS[nombre].tabla_valores[tramos]
+
+
+def etiquetas_lote(nombre, tramos, perfil=0):
+    return REGLAS_COMPILADAS[nombre].tabla_etiquetas[perfil, tramos]
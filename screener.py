@@ -0,0 +1,187 @@
+"""Screener top-k con filtros sobre ratios antes de las etapas DCF.
+
+Los predicados se separan en baratos (WACC, ratios y veredicto preliminar, que
+sólo necesitan ``calcular_wacc_lote`` y ``calcular_ratios_lote``) y caros
+(precios DCF, clasificaciones de mercado y score). Cada lote evalúa primero los
+baratos y sólo analiza por completo las empresas que los superan. Al ordenar
+por ``score_total``, además, se descartan antes del DCF las empresas que ni con
+los 15 puntos máximos del bloque DCF podrían entrar en el top-k actual. Las
+columnas caras son las del análisis con las opciones indicadas (p. ej. una
+``precio_<escenario>`` por escenario y ``precio_esperado``).
+
+>>> seleccionar_mejores(columnas, [("PER", "<", 15), ("Deuda neta/EBITDA", "<=", 2)], k=100)
+"""
+
+import heapq
+import operator
+
+import numpy as np
+
+from batch import (
+    aplanar_resultado,
+    calcular_investment_score_lote,
+    calcular_ratios_lote,
+    calcular_wacc_lote,
+    columnas_desde_registros,
+    ejecutar_analisis_lote,
+    filas_planas,
+    preparar_columnas,
+)
+from rules import REGLAS, indices_perfil
+from streaming import TAMANO_LOTE_POR_DEFECTO
+
+OPERADORES = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+# Operadores que también admiten las columnas de texto (tipo, clasificaciones y veredicto).
+OPERADORES_TEXTO = ("==", "!=")
+COLUMNAS_BARATAS = (
+    "tipo_empresa",
+    "wacc",
+    "PER",
+    "PSR",
+    "EV/EBITDA",
+    "EV/FCF",
+    "ROE",
+    "ROA",
+    "Margen EBITDA",
+    "Capitalización",
+    "EV",
+    "Deuda neta/EBITDA",
+    "veredicto_preliminar",
+)
+# Máximo del bloque ``dcf_vs_mercado`` de ``calcular_investment_score``.
+MAX_PUNTOS_DCF = max(REGLAS["diferencia_precio"]["valores"])
+
+
+def tipos_columnas(**opciones):
+    """Tipo (``dtype.kind``) de cada columna filtrable con las opciones de ``ejecutar_analisis_lote``."""
+    planas = aplanar_resultado(ejecutar_analisis_lote(columnas_desde_registros([]), **opciones))
+    return {nombre: columna.dtype.kind for nombre, columna in planas.items()}
+
+
+def _validar(predicados, orden, tipos):
+    for columna, simbolo, _ in predicados:
+        if columna not in tipos:
+            raise ValueError(f"Columna desconocida en el filtro: {columna}.")
+        if simbolo not in OPERADORES:
+            raise ValueError(f"Operador no soportado: {simbolo}.")
+        if tipos[columna] == "O" and simbolo not in OPERADORES_TEXTO:
+            raise ValueError(f"La columna {columna} es de texto: use {' o '.join(OPERADORES_TEXTO)}, no {simbolo}.")
+    if orden not in tipos:
+        raise ValueError(f"Columna de orden desconocida: {orden}.")
+    if tipos[orden] == "O":
+        raise ValueError(f"No se puede ordenar por la columna de texto {orden}.")
+
+
+def _cumplen(columnas, predicados, n):
+    """Máscara de filas que cumplen todos los predicados (``NaN`` nunca cumple)."""
+    mascara = np.ones(n, dtype=bool)
+    for columna, simbolo, valor in predicados:
+        valores = columnas[columna]
+        with np.errstate(invalid="ignore"):
+            mascara &= np.asarray(OPERADORES[simbolo](valores, valor), dtype=bool)
+        if valores.dtype.kind == "f":
+            mascara &= ~np.isnan(valores)
+    return mascara
+
+
+def seleccionar_mejores(
+    columnas,
+    predicados=(),
+    k=100,
+    orden="score_total",
+    descendente=True,
+    tamano_lote=TAMANO_LOTE_POR_DEFECTO,
+    **opciones,
+):
+    """Las ``k`` empresas que cumplen ``predicados`` con mayor (o menor) ``orden``.
+
+    ``predicados`` es una secuencia de ``(columna, operador, valor)`` sobre las
+    columnas de ``batch.aplanar_resultado``; las de texto sólo admiten ``==`` y
+    ``!=``. Las filas con ``orden`` a ``NaN`` no se ordenan. A igualdad de
+    ``orden`` gana la empresa que aparece antes. ``opciones`` se pasan a
+    ``ejecutar_analisis_lote`` (``anios_proyeccion``, ``perfil_crecimiento``,
+    ``criterios``, ``escenarios``...) y determinan las columnas disponibles.
+
+    Devuelve ``filas`` (filas planas con su ``indice`` en la entrada, ya
+    ordenadas) y ``estadisticas`` con cuántas empresas llegaron a cada etapa.
+    """
+    predicados = list(predicados)
+    _validar(predicados, orden, tipos_columnas(**opciones))
+    baratos = [p for p in predicados if p[0] in COLUMNAS_BARATAS]
+    caros = [p for p in predicados if p[0] not in COLUMNAS_BARATAS]
+    podar = orden == "score_total" and descendente
+    criterios = opciones.get("criterios", "estandar")
+    # Con criterios por tipo, el veredicto y la cota del score dependen del tipo normalizado.
+    necesita_wacc = criterios != "estandar" or any(columna in ("tipo_empresa", "wacc") for columna, _, _ in baratos)
+    signo = 1 if descendente else -1
+
+    c = preparar_columnas(columnas)
+    n = len(c["precio_accion"])
+    mejores = []  # Montículo de mínimos con (clave, -indice, fila).
+    estadisticas = {"empresas": n, "tras_ratios": 0, "analizadas": 0, "candidatas": 0}
+
+    for inicio in range(0, n, tamano_lote):
+        lote = {campo: valores[inicio : inicio + tamano_lote] for campo, valores in c.items()}
+        m = len(lote["precio_accion"])
+        deuda_neta = lote["deuda"] - lote["caja"]
+        perfil = 0
+        if necesita_wacc:
+            wacc_info = calcular_wacc_lote(lote["tipo_empresa"], deuda_neta, lote["ebitda"])
+            perfil = indices_perfil(wacc_info["tipo_empresa"], criterios)
+        ratios_info = calcular_ratios_lote(lote, perfil)
+        ratios = dict(ratios_info["ratios"])
+        baratas = {**ratios, "veredicto_preliminar": ratios_info["veredicto_preliminar"]}
+        if necesita_wacc:
+            baratas.update(tipo_empresa=wacc_info["tipo_empresa"], wacc=wacc_info["wacc"])
+            ratios["Deuda neta/EBITDA"] = wacc_info["deuda_neta_ebitda"]
+        else:
+            # Mismo cociente que ``calcular_wacc_lote`` sin normalizar el tipo de empresa.
+            ratios["Deuda neta/EBITDA"] = np.divide(
+                deuda_neta, lote["ebitda"], out=np.full(m, np.nan), where=lote["ebitda"] != 0
+            )
+        baratas["Deuda neta/EBITDA"] = ratios["Deuda neta/EBITDA"]
+        mascara = _cumplen(baratas, baratos, m)
+        estadisticas["tras_ratios"] += int(np.count_nonzero(mascara))
+
+        if podar and len(mejores) == k and k:
+            # Cota superior del score: bloques sin DCF + máximo del bloque DCF.
+            parcial = calcular_investment_score_lote(
+                ratios, ratios["Deuda neta/EBITDA"], lote["fcf"], lote["precio_accion"], np.full(m, np.nan), perfil
+            )["total"]
+            mascara &= parcial + MAX_PUNTOS_DCF > mejores[0][0]
+
+        indices = np.flatnonzero(mascara)
+        estadisticas["analizadas"] += len(indices)
+        if not len(indices):
+            continue
+        seleccion = {campo: valores[indices] for campo, valores in lote.items()}
+        planas = aplanar_resultado(ejecutar_analisis_lote(seleccion, **opciones))
+        valores_orden = np.asarray(planas[orden], dtype=np.float64)
+        validas = np.flatnonzero(_cumplen(planas, caros, len(indices)) & ~np.isnan(valores_orden))
+        estadisticas["candidatas"] += len(validas)
+        if not len(validas) or not k:
+            continue
+
+        # Sólo las k mejores del lote pueden entrar en el montículo.
+        claves = signo * valores_orden[validas]
+        if len(validas) > k:
+            validas = validas[np.argsort(-claves, kind="stable")[:k]]
+            claves = signo * valores_orden[validas]
+        filas = filas_planas({nombre: columna[validas] for nombre, columna in planas.items()})
+        for clave, posicion, fila in zip(claves.tolist(), validas.tolist(), filas):
+            indice = inicio + int(indices[posicion])
+            entrada = (clave, -indice, {"indice": indice, **fila})
+            if len(mejores) < k:
+                heapq.heappush(mejores, entrada)
+            elif entrada[:2] > mejores[0][:2]:
+                heapq.heapreplace(mejores, entrada)
+
+    ordenadas = sorted(mejores, key=lambda entrada: entrada[:2], reverse=True)
+    return {"filas": [fila for _, _, fila in ordenadas], "estadisticas": estadisticas}
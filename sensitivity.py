@@ -0,0 +1,126 @@
+"""Análisis de sensibilidad del precio teórico por acción.
+
+Evalúa el DCF perpetuo sobre una rejilla completa WACC × g en una sola pasada
+con broadcasting de NumPy, en lugar de llamar a ``calcular_dcf_perpetuo`` una
+vez por celda. El análisis tornado mueve cada entrada arriba y abajo y analiza
+todas las copias de la empresa en una sola llamada al motor vectorizado.
+"""
+
+import numpy as np
+
+from batch import ANIOS_PROYECCION, CAMPOS, calcular_wacc_lote, ejecutar_analisis_lote, filas_planas, preparar_columnas
+
+# Importes que se mueven en proporción y tasas que se mueven en puntos porcentuales.
+VARIABLES_RELATIVAS = ("fcf", "deuda", "caja", "numero_acciones")
+VARIABLES_PP = ("g_conservador_pct", "g_base_pct", "g_optimista_pct", "g_inicial_pct", "g_terminal_pct", "wacc")
+VARIABLES_TORNADO = VARIABLES_RELATIVAS + VARIABLES_PP
+METRICAS_TORNADO = ("precio_base", "precio_proyeccion", "score_total")
+
+
+def rango_centrado(centro, amplitud, pasos):
+    """Devuelve ``pasos`` valores equiespaciados en ``[centro - amplitud, centro + amplitud]``."""
+    return np.linspace(centro - amplitud, centro + amplitud, pasos)
+
+
+def calcular_rejilla_dcf_perpetuo(datos, waccs, gs_pct):
+    """Precio por acción del DCF perpetuo para cada combinación (WACC, g).
+
+    ``waccs`` va en tanto por uno y ``gs_pct`` en porcentaje, igual que en
+    ``datos``. Devuelve una matriz ``len(waccs) × len(gs_pct)`` con ``NaN`` en las
+    celdas inválidas (``g ≥ WACC``, ``WACC <= 0`` o Nº de acciones = 0), junto con
+    la máscara de celdas válidas.
+    """
+    waccs = np.asarray(waccs, dtype=np.float64)
+    gs_pct = np.asarray(gs_pct, dtype=np.float64)
+    w = waccs[:, np.newaxis]
+    g = gs_pct[np.newaxis, :] / 100
+    deuda_neta = datos["deuda"] - datos["caja"]
+    n_acc = datos["numero_acciones"]
+
+    valido = (g < w) & (w > 0) & (n_acc != 0)
+    valor_empresa = datos["fcf"] * (1 + g) / np.where(valido, w - g, 1.0)
+    precios = np.where(valido, (valor_empresa - deuda_neta) / (n_acc if n_acc != 0 else 1), np.nan)
+
+    return {
+        "waccs": waccs,
+        "gs_pct": gs_pct,
+        "precios": precios,
+        "valido": valido,
+    }
+
+
+def _mayor_cambio(base, *valores):
+    cambios = [abs(v - base) for v in valores if v is not None and base is not None]
+    return max(cambios) if cambios else None
+
+
+def calcular_tornado(
+    datos,
+    variacion_relativa=0.10,
+    variacion_pp=1.0,
+    orden="precio_base",
+    anios_proyeccion=ANIOS_PROYECCION,
+    perfil_crecimiento="lineal",
+    criterios="estandar",
+):
+    """Impacto en precio y score de mover cada entrada arriba y abajo.
+
+    Los importes de ``VARIABLES_RELATIVAS`` se mueven ``±variacion_relativa``
+    (0.10 = 10%) y los crecimientos y el WACC ``±variacion_pp`` puntos
+    porcentuales. ``datos`` se replica en una fila base más dos por variable y
+    todas se analizan en una sola llamada a ``ejecutar_analisis_lote`` (el WACC
+    automático se recalcula en cada copia, p. ej. al mover la deuda).
+
+    Devuelve ``base`` (``METRICAS_TORNADO`` sin mover nada) y ``filas``, una por
+    variable con sus valores y métricas baja/alta y el mayor cambio absoluto
+    (``impacto_<metrica>``), ordenadas de mayor a menor ``impacto_<orden>``.
+    """
+    if orden not in METRICAS_TORNADO:
+        raise ValueError(f"Métrica de orden desconocida: {orden}. Use {', '.join(METRICAS_TORNADO)}.")
+    n = 1 + 2 * len(VARIABLES_TORNADO)
+    c = preparar_columnas({campo: [datos[campo]] * n for campo in CAMPOS})
+    for i, variable in enumerate(VARIABLES_TORNADO):
+        bajo, alto = 1 + 2 * i, 2 + 2 * i
+        if variable in VARIABLES_RELATIVAS:
+            c[variable][bajo] *= 1 - variacion_relativa
+            c[variable][alto] *= 1 + variacion_relativa
+        elif variable != "wacc":
+            c[variable][bajo] -= variacion_pp
+            c[variable][alto] += variacion_pp
+
+    wacc = calcular_wacc_lote(c["tipo_empresa"], c["deuda"] - c["caja"], c["ebitda"])["wacc"]
+    i = VARIABLES_TORNADO.index("wacc")
+    wacc[1 + 2 * i] -= variacion_pp / 100
+    wacc[2 + 2 * i] += variacion_pp / 100
+
+    resultado = ejecutar_analisis_lote(c, anios_proyeccion, perfil_crecimiento, criterios, wacc=wacc)
+    metricas = list(
+        filas_planas(
+            {
+                "precio_base": resultado["dcf_perpetuo"]["precio_base"],
+                "precio_proyeccion": resultado["dcf_proyeccion"]["precio"],
+                "score_total": resultado["score"]["total"],
+            }
+        )
+    )
+    base = metricas[0]
+
+    filas = []
+    for i, variable in enumerate(VARIABLES_TORNADO):
+        bajo, alto = 1 + 2 * i, 2 + 2 * i
+        valores = wacc if variable == "wacc" else c[variable]
+        fila = {
+            "variable": variable,
+            "valor_base": float(valores[0]),
+            "valor_bajo": float(valores[bajo]),
+            "valor_alto": float(valores[alto]),
+        }
+        for metrica in METRICAS_TORNADO:
+            fila[f"{metrica}_bajo"] = metricas[bajo][metrica]
+            fila[f"{metrica}_alto"] = metricas[alto][metrica]
+            fila[f"impacto_{metrica}"] = _mayor_cambio(base[metrica], metricas[bajo][metrica], metricas[alto][metrica])
+        filas.append(fila)
+
+    # Las variables sin impacto calculable van al final.
+    filas.sort(key=lambda fila: (fila[f"impacto_{orden}"] is None, -(fila[f"impacto_{orden}"] or 0)))
+    return {"base": base, "filas": filas}
@@ -0,0 +1,397 @@
+"""Servicio HTTP asíncrono de valoración con micro-lotes.
+
+Expone el análisis por HTTP sin necesidad de Streamlit y sin dependencias
+fuera de la biblioteca estándar y NumPy. Las peticiones concurrentes se
+acumulan durante una ventana de pocos milisegundos y se analizan juntas con el
+motor vectorizado, en un hilo o en un pool de procesos. Si hay demasiadas
+empresas pendientes, el servicio responde 503 en lugar de encolar sin límite.
+
+Uso::
+
+    python service.py --puerto 8080 --procesos 4
+
+Endpoints:
+
+- ``POST /analizar``: un objeto ``datos`` -> una fila de resultado.
+- ``POST /analizar/lote``: lista de objetos ``datos`` -> lista de filas.
+- ``GET /salud``: estado y estadísticas del servicio.
+
+Las filas son las de ``batch.filas_resultado`` (las mismas que escribe
+``streaming.py``), precedidas de los campos extra de la entrada, como ``ticker``.
+Las respuestas son JSON estricto: un resultado no finito sale como ``null`` y
+una entrada con ``NaN``, ``Infinity`` o un número que desborda se rechaza con 400.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+
+from batch import (
+    CAMPOS,
+    CAMPOS_NUMERICOS,
+    aplanar_resultado,
+    columnas_desde_registros,
+    ejecutar_analisis_lote,
+    filas_planas,
+)
+
+VENTANA_SEGUNDOS = 0.002
+MAX_LOTE = 8_192
+MAX_PENDIENTES = 200_000
+MAX_CUERPO_BYTES = 4 * 2**20
+MAX_EMPRESAS_POR_PETICION = 10_000
+
+
+class ServicioSaturado(Exception):
+    """Se supera el máximo de empresas pendientes de analizar."""
+
+
+class ErrorHTTP(Exception):
+    """Error que se devuelve al cliente con un código de estado HTTP."""
+
+    def __init__(self, estado, mensaje, cerrar=False):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+        self.cerrar = cerrar
+
+
+def validar_registro(registro, posicion=1):
+    """Devuelve una copia normalizada de ``registro`` o lanza ``ValueError``."""
+    if not isinstance(registro, dict):
+        raise ValueError(f"Empresa {posicion}: se esperaba un objeto JSON.")
+    faltan = [campo for campo in CAMPOS if campo not in registro]
+    if faltan:
+        raise ValueError(f"Empresa {posicion}: faltan campos {', '.join(faltan)}.")
+    normalizado = dict(registro)
+    for campo in CAMPOS_NUMERICOS:
+        try:
+            normalizado[campo] = float(registro[campo])
+        except (TypeError, ValueError):
+            raise ValueError(f"Empresa {posicion}: el campo {campo} no es numérico.") from None
+        except OverflowError:
+            # Un entero JSON más allá del rango de los dobles (p. ej. 1 seguido de 400 ceros).
+            normalizado[campo] = math.inf
+        if not math.isfinite(normalizado[campo]):
+            raise ValueError(f"Empresa {posicion}: el campo {campo} no es un número finito.")
+    normalizado["tipo_empresa"] = str(registro["tipo_empresa"]).strip().lower()
+    return normalizado
+
+
+def analizar_columnas(columnas):
+    """Tarea del ejecutor: analiza un lote columnar y devuelve columnas planas.
+
+    Los valores no finitos pasan a ``NaN``, que ``filas_planas`` convierte en ``None``.
+    """
+    planas = aplanar_resultado(ejecutar_analisis_lote(columnas))
+    for nombre, columna in planas.items():
+        if columna.dtype.kind == "f":
+            planas[nombre] = np.where(np.isfinite(columna), columna, np.nan)
+    return planas
+
+
+def _rechazar_constante(nombre):
+    raise ValueError(f"Valor no válido en JSON: {nombre}.")
+
+
+class AgrupadorLotes:
+    """Agrupa peticiones concurrentes en lotes para el motor vectorizado.
+
+    Cada petición (una lista de registros ya validados) espera a que se cierre
+    su lote: cuando pasan ``ventana`` segundos desde que llega la primera o
+    cuando se acumulan ``max_lote`` empresas. Las peticiones no se parten entre
+    lotes. Como mucho ``lotes_en_vuelo`` lotes se analizan a la vez en
+    ``ejecutor`` (``None`` usa el pool de hilos del bucle de eventos).
+    """
+
+    def __init__(
+        self,
+        ventana=VENTANA_SEGUNDOS,
+        max_lote=MAX_LOTE,
+        max_pendientes=MAX_PENDIENTES,
+        ejecutor=None,
+        lotes_en_vuelo=2,
+    ):
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self.max_pendientes = max_pendientes
+        self.ejecutor = ejecutor
+        self.lotes_en_vuelo = lotes_en_vuelo
+        self.pendientes = 0
+        self.lotes = 0
+        self.empresas = 0
+        self.rechazadas = 0
+        self._cola = deque()
+        self._en_cola = 0
+        self._hay_trabajo = None
+        self._lote_lleno = None
+        self._tarea = None
+
+    def iniciar(self):
+        """Arranca el bucle de agrupación en el bucle de eventos actual."""
+        self._hay_trabajo = asyncio.Event()
+        self._lote_lleno = asyncio.Event()
+        self._tarea = asyncio.get_running_loop().create_task(self._agrupar())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    async def analizar(self, registros):
+        """Analiza ``registros`` dentro del próximo lote y devuelve sus filas."""
+        n = len(registros)
+        if self.pendientes + n > self.max_pendientes:
+            self.rechazadas += n
+            raise ServicioSaturado(f"Hay {self.pendientes} empresas pendientes; inténtelo más tarde.")
+        futuro = asyncio.get_running_loop().create_future()
+        self._cola.append((registros, futuro))
+        self._en_cola += n
+        self.pendientes += n
+        self._hay_trabajo.set()
+        if self._en_cola >= self.max_lote:
+            self._lote_lleno.set()
+        return await futuro
+
+    def estadisticas(self):
+        return {
+            "pendientes": self.pendientes,
+            "lotes": self.lotes,
+            "empresas": self.empresas,
+            "rechazadas": self.rechazadas,
+        }
+
+    async def _agrupar(self):
+        en_vuelo = asyncio.Semaphore(self.lotes_en_vuelo)
+        activas = set()
+        while True:
+            await self._hay_trabajo.wait()
+            if self._en_cola < self.max_lote:
+                try:
+                    await asyncio.wait_for(self._lote_lleno.wait(), self.ventana)
+                except asyncio.TimeoutError:
+                    pass
+            await en_vuelo.acquire()
+            peticiones = self._extraer_lote()
+            tarea = asyncio.get_running_loop().create_task(self._procesar(peticiones, en_vuelo))
+            activas.add(tarea)
+            tarea.add_done_callback(activas.discard)
+
+    def _extraer_lote(self):
+        peticiones = []
+        tamano = 0
+        while self._cola and (not peticiones or tamano + len(self._cola[0][0]) <= self.max_lote):
+            registros, futuro = self._cola.popleft()
+            peticiones.append((registros, futuro))
+            tamano += len(registros)
+        self._en_cola -= tamano
+        if self._en_cola < self.max_lote:
+            self._lote_lleno.clear()
+        if not self._cola:
+            self._hay_trabajo.clear()
+        return peticiones
+
+    async def _procesar(self, peticiones, en_vuelo):
+        registros = [registro for lote, _ in peticiones for registro in lote]
+        try:
+            columnas = columnas_desde_registros(registros)
+            planas = await asyncio.get_running_loop().run_in_executor(self.ejecutor, analizar_columnas, columnas)
+            filas = iter(filas_planas(planas))
+            for lote, futuro in peticiones:
+                resultado = []
+                for registro in lote:
+                    extra = {k: v for k, v in registro.items() if k not in CAMPOS}
+                    resultado.append({**extra, **next(filas)})
+                if not futuro.done():
+                    futuro.set_result(resultado)
+            self.lotes += 1
+            self.empresas += len(registros)
+        except Exception as error:  # noqa: BLE001 - se propaga a cada petición del lote.
+            for _, futuro in peticiones:
+                if not futuro.done():
+                    futuro.set_exception(error)
+        finally:
+            self.pendientes -= len(registros)
+            en_vuelo.release()
+
+
+class ServicioValoracion:
+    """Servidor HTTP/1.1 mínimo (con keep-alive) delante de un ``AgrupadorLotes``."""
+
+    def __init__(
+        self,
+        agrupador=None,
+        max_cuerpo_bytes=MAX_CUERPO_BYTES,
+        max_empresas_por_peticion=MAX_EMPRESAS_POR_PETICION,
+    ):
+        self.agrupador = agrupador or AgrupadorLotes()
+        self.max_cuerpo_bytes = max_cuerpo_bytes
+        self.max_empresas_por_peticion = max_empresas_por_peticion
+        self.peticiones = 0
+        self.servidor = None
+
+    async def iniciar(self, host="127.0.0.1", puerto=8080):
+        """Abre el socket y arranca el agrupador; devuelve el ``asyncio.Server``."""
+        self.agrupador.iniciar()
+        self.servidor = await asyncio.start_server(self.manejar_conexion, host, puerto)
+        return self.servidor
+
+    async def detener(self):
+        if self.servidor is not None:
+            self.servidor.close()
+            await self.servidor.wait_closed()
+        await self.agrupador.detener()
+
+    async def manejar_conexion(self, reader, writer):
+        try:
+            while True:
+                try:
+                    peticion = await self._leer_peticion(reader)
+                    if peticion is None:
+                        break
+                    metodo, ruta, cabeceras, cuerpo = peticion
+                    estado, respuesta, extra = await self.atender(metodo, ruta, cuerpo)
+                    cerrar = cabeceras.get("connection", "").lower() == "close"
+                except ErrorHTTP as error:
+                    estado, respuesta, extra, cerrar = error.estado, {"error": error.mensaje}, {}, error.cerrar
+                self._escribir_respuesta(writer, estado, respuesta, extra, cerrar)
+                await writer.drain()
+                if cerrar:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _leer_peticion(self, reader):
+        linea = await reader.readline()
+        if not linea:
+            return None
+        try:
+            metodo, ruta, _ = linea.decode("latin-1").split()
+        except ValueError:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Línea de petición inválida.", cerrar=True) from None
+        cabeceras = {}
+        while True:
+            linea = await reader.readline()
+            if linea in (b"\r\n", b"\n", b""):
+                break
+            nombre, _, valor = linea.decode("latin-1").partition(":")
+            cabeceras[nombre.strip().lower()] = valor.strip()
+        if "transfer-encoding" in cabeceras:
+            raise ErrorHTTP(HTTPStatus.NOT_IMPLEMENTED, "Transfer-Encoding no soportado.", cerrar=True)
+        try:
+            longitud = int(cabeceras.get("content-length") or 0)
+        except ValueError:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Content-Length inválido.", cerrar=True) from None
+        if longitud > self.max_cuerpo_bytes:
+            raise ErrorHTTP(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"El cuerpo supera el máximo de {self.max_cuerpo_bytes} bytes.",
+                cerrar=True,
+            )
+        cuerpo = await reader.readexactly(longitud) if longitud else b""
+        return metodo.upper(), ruta.split("?", 1)[0], cabeceras, cuerpo
+
+    async def atender(self, metodo, ruta, cuerpo):
+        """Resuelve una petición y devuelve ``(estado, objeto JSON, cabeceras extra)``."""
+        self.peticiones += 1
+        if ruta == "/salud":
+            if metodo != "GET":
+                raise ErrorHTTP(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET.")
+            return HTTPStatus.OK, {"estado": "ok", "peticiones": self.peticiones, **self.agrupador.estadisticas()}, {}
+        if ruta not in ("/analizar", "/analizar/lote"):
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {ruta}.")
+        if metodo != "POST":
+            raise ErrorHTTP(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST.")
+
+        try:
+            contenido = json.loads(cuerpo, parse_constant=_rechazar_constante)
+        except ValueError:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "El cuerpo no es JSON válido.") from None
+        individual = ruta == "/analizar"
+        if individual:
+            contenido = [contenido]
+        elif not isinstance(contenido, list):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Se esperaba una lista de empresas.")
+        if len(contenido) > self.max_empresas_por_peticion:
+            raise ErrorHTTP(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"Como mucho {self.max_empresas_por_peticion} empresas por petición.",
+            )
+        try:
+            registros = [validar_registro(r, i) for i, r in enumerate(contenido, start=1)]
+        except ValueError as error:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, str(error)) from None
+        if not registros:
+            return HTTPStatus.OK, [], {}
+
+        try:
+            filas = await self.agrupador.analizar(registros)
+        except ServicioSaturado as error:
+            raise ErrorHTTP(HTTPStatus.SERVICE_UNAVAILABLE, str(error)) from None
+        return HTTPStatus.OK, filas[0] if individual else filas, {}
+
+    @staticmethod
+    def _escribir_respuesta(writer, estado, respuesta, extra, cerrar):
+        cuerpo = json.dumps(respuesta, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        cabeceras = {
+            "Content-Type": "application/json; charset=utf-8",
+            "Content-Length": str(len(cuerpo)),
+            "Connection": "close" if cerrar else "keep-alive",
+            **extra,
+        }
+        if estado == HTTPStatus.SERVICE_UNAVAILABLE:
+            cabeceras["Retry-After"] = "1"
+        cabecera = f"HTTP/1.1 {estado.value} {estado.phrase}\r\n"
+        cabecera += "".join(f"{nombre}: {valor}\r\n" for nombre, valor in cabeceras.items())
+        writer.write(cabecera.encode("latin-1") + b"\r\n" + cuerpo)
+
+
+async def servir(host, puerto, agrupador):
+    servicio = ServicioValoracion(agrupador)
+    servidor = await servicio.iniciar(host, puerto)
+    print(f"Servicio de valoración en http://{host}:{puerto}")
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        await servicio.detener()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de valoración con micro-lotes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--ventana-ms", type=float, default=VENTANA_SEGUNDOS * 1e3)
+    parser.add_argument("--max-lote", type=int, default=MAX_LOTE)
+    parser.add_argument("--max-pendientes", type=int, default=MAX_PENDIENTES)
+    parser.add_argument("--procesos", type=int, default=0, help="Procesos para el motor (0 = un hilo).")
+    args = parser.parse_args(argv)
+
+    ejecutor = ProcessPoolExecutor(args.procesos) if args.procesos else None
+    agrupador = AgrupadorLotes(
+        args.ventana_ms / 1e3, args.max_lote, args.max_pendientes, ejecutor, lotes_en_vuelo=max(args.procesos, 1) + 1
+    )
+    try:
+        asyncio.run(servir(args.host, args.puerto, agrupador))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if ejecutor is not None:
+            ejecutor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""Almacén persistente de resultados en SQLite con recálculo incremental.
+
+Cada fila guarda el resultado plano del análisis (ratios, precios DCF, bloques
+del score y veredictos) de un ``ticker`` en una fecha de cierre, junto con la
+huella de sus datos de entrada (``cache.huella_analisis``). Al guardar una nueva
+fecha sólo se recalculan las empresas cuya huella cambió desde su último
+resultado; el resto se copia. Las consultas habituales (clasificación, score,
+tipo de empresa, cortes por ratio) se resuelven en SQL sin recalcular nada.
+
+Los precios guardados son los de ``analysis.ESCENARIOS_PERPETUO`` más
+``precio_esperado``. Un fichero creado antes de que existiera una columna la
+recibe al abrirse, vacía (``NULL``) en las filas ya guardadas; ``guardar(...,
+forzar=True)`` la rellena.
+"""
+
+import sqlite3
+
+from batch import CAMPOS, columnas_desde_registros, ejecutar_analisis_lote, filas_resultado
+from cache import huella_analisis
+from records import COLUMNAS_PRECIOS, COLUMNAS_RATIOS, COLUMNAS_SCORE
+from streaming import TAMANO_LOTE_POR_DEFECTO, agrupar_en_lotes
+
+COLUMNAS_TEXTO = (
+    "tipo_empresa",
+    "veredicto_preliminar",
+    "clasificacion_mercado_perpetuo",
+    "clasificacion_mercado_proyeccion",
+    "score_clasificacion",
+)
+COLUMNAS_RESULTADO = (
+    ("tipo_empresa", "wacc")
+    + tuple(COLUMNAS_RATIOS)
+    + COLUMNAS_PRECIOS
+    + ("veredicto_preliminar", "clasificacion_mercado_perpetuo", "clasificacion_mercado_proyeccion")
+    + COLUMNAS_SCORE
+    + ("score_clasificacion", "advertencias")
+)
+
+
+def _tipo_sql(columna):
+    if columna in COLUMNAS_TEXTO:
+        return "TEXT"
+    if columna in COLUMNAS_SCORE or columna == "advertencias":
+        return "INTEGER"
+    return "REAL"
+
+
+ESQUEMA = (
+    "CREATE TABLE IF NOT EXISTS resultados ("
+    "ticker TEXT NOT NULL, fecha TEXT NOT NULL, huella TEXT NOT NULL, "
+    + ", ".join(f"{columna} {_tipo_sql(columna)}" for columna in COLUMNAS_RESULTADO)
+    + ", PRIMARY KEY (ticker, fecha))",
+    "CREATE INDEX IF NOT EXISTS idx_resultados_score ON resultados (fecha, score_total)",
+    "CREATE INDEX IF NOT EXISTS idx_resultados_clasificacion ON resultados (fecha, score_clasificacion)",
+    "CREATE INDEX IF NOT EXISTS idx_resultados_tipo ON resultados (fecha, tipo_empresa)",
+)
+
+
+def _fecha_iso(fecha):
+    return fecha.isoformat() if hasattr(fecha, "isoformat") else str(fecha)
+
+
+def _valores_fila(fila):
+    """Valores de una fila de ``batch.filas_resultado`` en el orden de ``COLUMNAS_RESULTADO``."""
+    return tuple(fila[COLUMNAS_RATIOS.get(columna, columna)] for columna in COLUMNAS_RESULTADO)
+
+
+def _validar_columna(columna):
+    if columna not in COLUMNAS_RESULTADO:
+        raise ValueError(f"Columna desconocida: {columna}.")
+    return columna
+
+
+class AlmacenResultados:
+    """Resultados por ``(ticker, fecha)`` en un fichero SQLite (``":memory:"`` por defecto)."""
+
+    def __init__(self, ruta=":memory:"):
+        self.conexion = sqlite3.connect(ruta)
+        self.conexion.row_factory = sqlite3.Row
+        with self.conexion:
+            for sentencia in ESQUEMA:
+                self.conexion.execute(sentencia)
+            existentes = {fila[1] for fila in self.conexion.execute("PRAGMA table_info(resultados)")}
+            for columna in COLUMNAS_RESULTADO:
+                if columna not in existentes:
+                    self.conexion.execute(f"ALTER TABLE resultados ADD COLUMN {columna} {_tipo_sql(columna)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        self.conexion.close()
+
+    def _ultimos(self, fecha):
+        """Último resultado guardado hasta ``fecha`` de cada ticker: ``{ticker: (huella, valores)}``."""
+        cursor = self.conexion.execute(
+            f"SELECT r.ticker, r.huella, {', '.join(f'r.{c}' for c in COLUMNAS_RESULTADO)} FROM resultados r "
+            "JOIN (SELECT ticker, MAX(fecha) AS fecha FROM resultados WHERE fecha <= ? GROUP BY ticker) u "
+            "ON r.ticker = u.ticker AND r.fecha = u.fecha",
+            (fecha,),
+        )
+        return {fila[0]: (fila[1], tuple(fila)[2:]) for fila in cursor}
+
+    def guardar(self, fecha, registros, forzar=False, tamano_lote=TAMANO_LOTE_POR_DEFECTO):
+        """Guarda el análisis de ``registros`` (``datos`` con ``ticker``) en ``fecha``.
+
+        Sólo se recalculan las empresas sin resultado previo o cuya huella de
+        entrada cambió (todas si ``forzar``). Devuelve ``{"recalculadas": n,
+        "reutilizadas": m}``.
+        """
+        fecha = _fecha_iso(fecha)
+        previos = {} if forzar else self._ultimos(fecha)
+        filas = []
+        pendientes = []
+        for registro in registros:
+            if "ticker" not in registro:
+                raise ValueError("Cada registro necesita un campo 'ticker'.")
+            ticker = str(registro["ticker"])
+            huella = huella_analisis(registro)
+            previo = previos.get(ticker)
+            if previo is not None and previo[0] == huella:
+                filas.append((ticker, fecha, huella) + previo[1])
+            else:
+                pendientes.append((ticker, huella, {campo: registro[campo] for campo in CAMPOS}))
+
+        for lote in agrupar_en_lotes(pendientes, tamano_lote):
+            resultado = ejecutar_analisis_lote(columnas_desde_registros(datos for _, _, datos in lote))
+            for (ticker, huella, _), fila in zip(lote, filas_resultado(resultado)):
+                filas.append((ticker, fecha, huella) + _valores_fila(fila))
+
+        marcadores = ", ".join("?" * (3 + len(COLUMNAS_RESULTADO)))
+        with self.conexion:
+            self.conexion.executemany(
+                f"INSERT OR REPLACE INTO resultados (ticker, fecha, huella, {', '.join(COLUMNAS_RESULTADO)}) "
+                f"VALUES ({marcadores})",
+                filas,
+            )
+        return {"recalculadas": len(pendientes), "reutilizadas": len(filas) - len(pendientes)}
+
+    def fechas(self):
+        """Fechas guardadas, de la más antigua a la más reciente."""
+        return [fila[0] for fila in self.conexion.execute("SELECT DISTINCT fecha FROM resultados ORDER BY fecha")]
+
+    def ultima_fecha(self):
+        return self.conexion.execute("SELECT MAX(fecha) FROM resultados").fetchone()[0]
+
+    def consultar(
+        self,
+        fecha=None,
+        clasificacion=None,
+        tipo_empresa=None,
+        score_minimo=None,
+        maximos=None,
+        minimos=None,
+        orden="score_total",
+        descendente=True,
+        limite=None,
+    ):
+        """Filas de una fecha (la última por defecto) que cumplen los filtros.
+
+        ``maximos`` y ``minimos`` son cortes estrictos por columna, p. ej.
+        ``consultar(clasificacion="Compra", maximos={"ev_ebitda": 8})``. Las
+        filas con el ratio a ``NULL`` no pasan el corte.
+        """
+        fecha = self.ultima_fecha() if fecha is None else _fecha_iso(fecha)
+        condiciones = ["fecha = ?"]
+        parametros = [fecha]
+        if clasificacion is not None:
+            condiciones.append("score_clasificacion = ?")
+            parametros.append(clasificacion)
+        if tipo_empresa is not None:
+            condiciones.append("tipo_empresa = ?")
+            parametros.append(tipo_empresa)
+        if score_minimo is not None:
+            condiciones.append("score_total >= ?")
+            parametros.append(score_minimo)
+        for operador, cortes in (("<", maximos), (">", minimos)):
+            for columna, valor in (cortes or {}).items():
+                condiciones.append(f"{_validar_columna(columna)} {operador} ?")
+                parametros.append(valor)
+
+        sql = f"SELECT * FROM resultados WHERE {' AND '.join(condiciones)}"
+        sql += f" ORDER BY {_validar_columna(orden)} {'DESC' if descendente else 'ASC'}, ticker"
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(int(limite))
+        return [dict(fila) for fila in self.conexion.execute(sql, parametros)]
+
+    def historico(self, ticker):
+        """Resultados de un ticker en todas las fechas, en orden cronológico."""
+        cursor = self.conexion.execute("SELECT * FROM resultados WHERE ticker = ? ORDER BY fecha", (str(ticker),))
+        return [dict(fila) for fila in cursor]
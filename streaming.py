@@ -0,0 +1,152 @@
+"""Screener en streaming sobre ficheros de fundamentales (CSV o JSONL).
+
+Lee el fichero de forma perezosa, analiza las empresas por lotes con el motor
+vectorizado y escribe cada lote en cuanto se calcula, de modo que la memoria
+depende del tamaño de lote y no del tamaño del fichero.
+"""
+
+import csv
+import json
+import os
+from itertools import islice
+
+from batch import (
+    CAMPOS,
+    CAMPOS_NUMERICOS,
+    aplanar_resultado,
+    columnas_desde_registros,
+    ejecutar_analisis_lote,
+    filas_resultado,
+)
+
+TAMANO_LOTE_POR_DEFECTO = 10_000
+FORMATOS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+
+def detectar_formato(ruta):
+    """Deduce ``csv`` o ``jsonl`` a partir de la extensión del fichero."""
+    extension = os.path.splitext(str(ruta))[1].lower()
+    if extension not in FORMATOS:
+        raise ValueError(f"Formato no reconocido para '{ruta}': use .csv o .jsonl.")
+    return FORMATOS[extension]
+
+
+def _normalizar(registro, numero_linea):
+    """Convierte los campos numéricos a float; los errores indican la línea y el campo."""
+    faltan = [campo for campo in CAMPOS if campo not in registro]
+    if faltan:
+        raise ValueError(f"Línea {numero_linea}: faltan campos {', '.join(faltan)}.")
+    for campo in CAMPOS_NUMERICOS:
+        try:
+            registro[campo] = float(registro[campo])
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"Línea {numero_linea}: el campo {campo} no es numérico ({registro[campo]!r}).") from None
+    registro["tipo_empresa"] = str(registro["tipo_empresa"]).strip().lower()
+    return registro
+
+
+def leer_fundamentales(fichero, formato):
+    """Genera un diccionario ``datos`` por fila de un fichero abierto en modo texto.
+
+    Las columnas que no forman parte de ``datos`` (por ejemplo ``ticker``) se
+    conservan tal cual para acompañar al resultado.
+    """
+    if formato == "csv":
+        for numero_linea, fila in enumerate(csv.DictReader(fichero), start=2):
+            yield _normalizar(fila, numero_linea)
+    elif formato == "jsonl":
+        for numero_linea, linea in enumerate(fichero, start=1):
+            if linea.strip():
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError as error:
+                    raise ValueError(f"Línea {numero_linea}: JSON no válido ({error}).") from None
+                if not isinstance(registro, dict):
+                    raise ValueError(f"Línea {numero_linea}: se esperaba un objeto JSON.")
+                yield _normalizar(registro, numero_linea)
+    else:
+        raise ValueError(f"Formato no soportado: {formato}.")
+
+
+def agrupar_en_lotes(iterable, tamano_lote):
+    """Agrupa un iterable en listas de como mucho ``tamano_lote`` elementos."""
+    if tamano_lote < 1:
+        raise ValueError(f"El tamaño de lote debe ser mayor que 0 (recibido {tamano_lote}).")
+    iterador = iter(iterable)
+    while True:
+        lote = list(islice(iterador, tamano_lote))
+        if not lote:
+            return
+        yield lote
+
+
+def columnas_resultado(**opciones):
+    """Columnas planas que produce el análisis con ``opciones`` (las de ``ejecutar_analisis_lote``)."""
+    return list(aplanar_resultado(ejecutar_analisis_lote(columnas_desde_registros([]), **opciones)))
+
+
+def analizar_en_streaming(registros, tamano_lote=TAMANO_LOTE_POR_DEFECTO, **opciones):
+    """Analiza ``registros`` lote a lote y genera una fila de resultado por empresa.
+
+    Cada fila empieza por las columnas extra de la entrada seguidas de las
+    columnas planas de ``batch.filas_resultado``. ``opciones`` se pasan a
+    ``ejecutar_analisis_lote`` (p. ej. ``anios_proyeccion``).
+    """
+    for lote in agrupar_en_lotes(registros, tamano_lote):
+        resultado = ejecutar_analisis_lote(columnas_desde_registros(lote), **opciones)
+        for registro, fila in zip(lote, filas_resultado(resultado)):
+            extra = {k: v for k, v in registro.items() if k not in CAMPOS}
+            yield {**extra, **fila}
+
+
+class EscritorResultados:
+    """Escribe filas de resultado en CSV o JSONL a medida que llegan.
+
+    La cabecera CSV son las columnas extra de la entrada en la primera fila
+    (p. ej. ``ticker``) seguidas de ``columnas``, el esquema de salida del
+    análisis (``columnas_resultado()`` por defecto). Las columnas que le falten
+    a una fila quedan vacías; una fila con columnas fuera de la cabecera da
+    ``ValueError`` en lugar de perderlas.
+    """
+
+    def __init__(self, fichero, formato, columnas=None):
+        if formato not in ("csv", "jsonl"):
+            raise ValueError(f"Formato no soportado: {formato}.")
+        self.fichero = fichero
+        self.formato = formato
+        self.columnas = columnas_resultado() if columnas is None and formato == "csv" else columnas
+        self._csv = None
+
+    def escribir(self, filas):
+        """Escribe un iterable de filas y devuelve cuántas se escribieron."""
+        total = 0
+        for fila in filas:
+            if self.formato == "jsonl":
+                self.fichero.write(json.dumps(fila, ensure_ascii=False))
+                self.fichero.write("\n")
+            else:
+                if self._csv is None:
+                    esquema = set(self.columnas)
+                    cabecera = [columna for columna in fila if columna not in esquema] + list(self.columnas)
+                    self._csv = csv.DictWriter(self.fichero, fieldnames=cabecera)
+                    self._csv.writeheader()
+                sobran = fila.keys() - set(self._csv.fieldnames)
+                if sobran:
+                    raise ValueError(
+                        f"Fila {total + 1}: columnas {', '.join(sorted(sobran))} fuera de la cabecera CSV; use JSONL."
+                    )
+                self._csv.writerow(fila)
+            total += 1
+        return total
+
+
+def analizar_archivo(ruta_entrada, ruta_salida, tamano_lote=TAMANO_LOTE_POR_DEFECTO, **opciones):
+    """Analiza un fichero de fundamentales completo y devuelve el nº de empresas."""
+    formato_entrada = detectar_formato(ruta_entrada)
+    formato_salida = detectar_formato(ruta_salida)
+    with open(ruta_entrada, encoding="utf-8", newline="") as entrada, open(
+        ruta_salida, "w", encoding="utf-8", newline=""
+    ) as salida:
+        registros = leer_fundamentales(entrada, formato_entrada)
+        escritor = EscritorResultados(salida, formato_salida, columnas_resultado(**opciones))
+        return escritor.escribir(analizar_en_streaming(registros, tamano_lote, **opciones))
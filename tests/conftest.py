@@ -0,0 +1,59 @@
+"""Fixtures compartidas: universos sintéticos con semilla fija y sus registros escalares."""
+
+import numpy as np
+import pytest
+
+TIPOS = ("growth", "madura", "defensiva", "cíclica")
+
+
+def _universo(n, semilla=0):
+    """Universo columnar de ``n`` empresas con distribuciones plausibles y algún divisor nulo."""
+    rng = np.random.default_rng(semilla)
+    ingresos = rng.lognormal(7.0, 1.2, n)
+    ebitda = ingresos * rng.normal(0.20, 0.10, n)
+    activos = ingresos * rng.uniform(0.8, 3.0, n)
+    columnas = {
+        "tipo_empresa": np.array(TIPOS, dtype=object)[rng.integers(0, len(TIPOS), n)],
+        "ingresos": ingresos,
+        "ebitda": ebitda,
+        "fcf": ebitda * rng.normal(0.5, 0.3, n),
+        "deuda": np.abs(ebitda) * rng.uniform(0.0, 6.0, n),
+        "caja": ingresos * rng.uniform(0.0, 0.3, n),
+        "precio_accion": rng.lognormal(3.0, 0.8, n),
+        "numero_acciones": rng.lognormal(4.5, 1.0, n),
+        "patrimonio_neto": activos * rng.uniform(0.2, 0.7, n),
+        "activos_totales": activos,
+        "beneficio_neto": ebitda * rng.uniform(0.2, 0.7, n),
+        "g_conservador_pct": rng.uniform(0.0, 2.0, n),
+        "g_base_pct": rng.uniform(1.0, 3.0, n),
+        "g_optimista_pct": rng.uniform(2.0, 4.0, n),
+        "g_inicial_pct": rng.uniform(0.0, 25.0, n),
+        "g_terminal_pct": rng.uniform(0.5, 3.0, n),
+    }
+    for campo in ("beneficio_neto", "ebitda", "fcf"):
+        columnas[campo][rng.random(n) < 0.01] = 0.0
+    return columnas
+
+
+def _registros(columnas):
+    """Lista de diccionarios ``datos`` (floats de Python) a partir de columnas."""
+    listas = {campo: np.asarray(valores).tolist() for campo, valores in columnas.items()}
+    return [dict(zip(listas, fila)) for fila in zip(*listas.values())]
+
+
+@pytest.fixture(scope="session")
+def crear_universo():
+    """Fábrica ``crear_universo(n, semilla)`` de universos columnares sintéticos."""
+    return _universo
+
+
+@pytest.fixture(scope="session")
+def crear_registros():
+    """Fábrica ``crear_registros(n, semilla)`` de registros escalares, o ``crear_registros(columnas)``."""
+
+    def crear(columnas_o_n, semilla=0):
+        if isinstance(columnas_o_n, dict):
+            return _registros(columnas_o_n)
+        return _registros(_universo(columnas_o_n, semilla))
+
+    return crear
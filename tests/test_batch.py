@@ -0,0 +1,57 @@
+"""Paridad del motor vectorizado (``batch``) con el escalar (``analysis``)."""
+
+import numpy as np
+import pytest
+
+from analysis import Escenario, ejecutar_analisis, rejilla_escenarios
+from batch import CAMPOS, aplanar_resultado, ejecutar_analisis_lote
+from records import comprimir_resultado, resultados_compactos
+
+N = 400
+
+
+def con_casos_limite(u):
+    """Añade divisores nulos, ``g ≥ WACC``, FCF negativo, entradas ``NaN`` y tipos desconocidos."""
+    u["numero_acciones"][::41] = 0.0
+    u["ingresos"][::43] = 0.0
+    u["patrimonio_neto"][::47] = 0.0
+    u["g_base_pct"][::19] = 12.0
+    u["g_terminal_pct"][::23] = 15.0
+    u["fcf"][::29] *= -1
+    for campo in ("beneficio_neto", "g_base_pct", "g_inicial_pct", "g_terminal_pct", "fcf", "ebitda", "precio_accion"):
+        u[campo][5::37] = np.nan
+    u["deuda"][5::37] = np.nan
+    u["tipo_empresa"][::31] = "desconocido"
+    return u
+
+
+@pytest.mark.parametrize(
+    "opciones",
+    [
+        {},
+        {"anios_proyeccion": 12, "perfil_crecimiento": "exponencial"},
+        {"anios_proyeccion": 1},
+        {"criterios": "por_tipo"},
+        {"escenarios": rejilla_escenarios([-1, 0, 1], [-0.01, 0, 0.01])},
+        {
+            "escenarios": (
+                Escenario("Bajista", -1.0, desplazamiento_wacc=0.02, peso=0.2),
+                Escenario("Central", "g_base_pct"),
+            )
+        },
+    ],
+)
+def test_lote_coincide_bit_a_bit_con_escalar(crear_universo, crear_registros, opciones):
+    u = con_casos_limite(crear_universo(N, 11))
+    escenarios = opciones.get("escenarios")
+    planas = aplanar_resultado(ejecutar_analisis_lote(u, **opciones))
+    lote = resultados_compactos(planas, *([escenarios] if escenarios else []))
+    for i, datos in enumerate(crear_registros(u)):
+        esperado = comprimir_resultado(ejecutar_analisis(datos, **opciones))
+        for campo in lote.dtype.names:
+            assert np.array_equal(esperado[campo], lote[i][campo], equal_nan=True), (i, campo)
+
+
+def test_lote_vacio():
+    planas = aplanar_resultado(ejecutar_analisis_lote({campo: [] for campo in CAMPOS}))
+    assert all(len(columna) == 0 for columna in planas.values())
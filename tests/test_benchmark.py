@@ -0,0 +1,18 @@
+"""Medición y comparación con la línea base del script de benchmarks."""
+
+from benchmark import comparar, medir
+
+
+def test_medir_informa_minimo_y_mediana():
+    llamadas = []
+    r = medir(lambda: llamadas.append(1), n=10, repeticiones=5)
+    assert r["repeticiones"] == 5 and len(llamadas) == 7  # Calentamiento + 5 + medición de memoria.
+    assert 0 <= r["minimo_s"] <= r["mediana_s"]
+    assert "p95_s" not in r and "p99_s" not in r
+    assert r["latencia_por_empresa_us"] == r["mediana_s"] / 10 * 1e6
+
+
+def test_comparar_detecta_regresiones_de_la_mediana():
+    base = {"resultados": {"a": {"mediana_s": 1.0}, "b": {"mediana_s": 1.0}, "c": {"mediana_s": 0.0}}}
+    actual = {"resultados": {"a": {"mediana_s": 1.1}, "b": {"mediana_s": 1.5}, "d": {"mediana_s": 9.0}}}
+    assert comparar(actual, base, 0.2) == [{"caso": "b", "ratio": 1.5}]
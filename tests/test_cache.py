@@ -0,0 +1,65 @@
+"""Caché de ``ejecutar_analisis``: claves con opciones, resultados exactos, LRU y caducidad."""
+
+import pytest
+
+from analysis import ESCENARIOS_PERPETUO, ejecutar_analisis, rejilla_escenarios
+from cache import CacheAnalisis, clave_analisis, clave_opciones
+
+
+def test_fallo_analiza_los_datos_originales(crear_registros):
+    cache = CacheAnalisis()
+    for datos in crear_registros(20, 17):
+        datos = {**datos, "fcf": datos["fcf"] * (1 + 3e-15)}
+        assert cache.analizar(datos) == ejecutar_analisis(datos)
+    assert cache.estadisticas()["fallos"] == 20
+
+
+@pytest.mark.parametrize(
+    "opciones",
+    [
+        {"anios_proyeccion": 12, "perfil_crecimiento": "exponencial"},
+        {"criterios": "por_tipo"},
+        {"derivadas": True},
+        {"escenarios": rejilla_escenarios([-1, 0], [0, 0.01])},
+    ],
+)
+def test_las_opciones_forman_parte_de_la_clave(crear_registros, opciones):
+    datos = crear_registros(1, 18)[0]
+    cache = CacheAnalisis()
+    assert cache.analizar(datos) == ejecutar_analisis(datos)
+    assert cache.analizar(datos, **opciones) == ejecutar_analisis(datos, **opciones)
+    assert cache.analizar(datos, **opciones) is cache.analizar(datos, **opciones)
+    assert cache.estadisticas()["fallos"] == 2 and len(cache) == 2
+
+
+def test_claves_canonicas(crear_registros):
+    datos = crear_registros(1, 19)[0]
+    assert clave_analisis({**datos, "tipo_empresa": "otro", "caja": -0.0}) == clave_analisis(
+        {**datos, "tipo_empresa": "madura", "caja": 0.0}
+    )
+    assert clave_analisis({**datos, "fcf": datos["fcf"] * (1 + 1e-15)}) == clave_analisis(datos)
+    assert clave_analisis({**datos, "fcf": datos["fcf"] * (1 + 1e-15)}, 17) != clave_analisis(datos, 17)
+    assert clave_opciones() == clave_opciones(anios_proyeccion=5, escenarios=list(ESCENARIOS_PERPETUO))
+    with pytest.raises(TypeError):
+        clave_opciones(wacc=0.08)
+
+
+def test_expulsion_lru_y_caducidad(crear_registros):
+    instante = [0.0]
+    cache = CacheAnalisis(max_entradas=2, ttl_segundos=10, reloj=lambda: instante[0])
+    a, b, c = crear_registros(3, 20)
+    cache.analizar(a)
+    cache.analizar(b)
+    cache.analizar(a)
+    cache.analizar(c)  # Expulsa b, el menos usado.
+    assert cache.estadisticas()["expulsiones"] == 1
+    cache.analizar(a)
+    cache.analizar(b)
+    assert cache.estadisticas()["aciertos"] == 2 and cache.estadisticas()["fallos"] == 4
+    instante[0] = 11.0
+    cache.analizar(b)
+    assert cache.estadisticas()["fallos"] == 5
+    cache.limpiar()
+    assert len(cache) == 0 and cache.estadisticas()["tasa_aciertos"] == 0.0
+    with pytest.raises(ValueError):
+        CacheAnalisis(max_entradas=0)
@@ -0,0 +1,81 @@
+"""Ida y vuelta del formato columnar: universos, conversión desde CSV/JSONL y valoración."""
+
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from analysis import rejilla_escenarios
+from batch import CAMPOS, CAMPOS_NUMERICOS, aplanar_resultado, ejecutar_analisis_lote
+from columnar import ArchivoColumnar, convertir_archivo, escribir_universo, valorar_universo
+from records import columnas_precios, resultados_compactos
+
+N = 1_000
+
+
+@pytest.fixture
+def universo(crear_universo):
+    u = crear_universo(N, 9)
+    u["tipo_empresa"][::97] = "otro"
+    return u
+
+
+def tickers(n=N):
+    return [f"T{i}-ñ" for i in range(n)]
+
+
+def test_escribir_y_leer_universo(tmp_path, universo):
+    ruta = tmp_path / "u.col"
+    assert escribir_universo(ruta, universo, tickers()) == N
+    with ArchivoColumnar(ruta) as archivo:
+        assert len(archivo) == N
+        assert archivo.tickers() == tickers()
+        assert archivo.tickers(10, 13) == tickers()[10:13]
+        tramo = archivo.columnas_tramo()
+        for campo in CAMPOS_NUMERICOS:
+            assert np.array_equal(tramo[campo], universo[campo])
+        esperado = np.where(universo["tipo_empresa"] == "otro", "madura", universo["tipo_empresa"])
+        assert list(tramo["tipo_empresa"]) == list(esperado)
+
+
+@pytest.mark.parametrize("formato", ["csv", "jsonl"])
+def test_convertir_archivo_por_lotes(tmp_path, crear_registros, universo, formato):
+    entrada = tmp_path / f"u.{formato}"
+    registros = [{"ticker": t, **r} for t, r in zip(tickers(), crear_registros(universo))]
+    with open(entrada, "w", encoding="utf-8", newline="") as fichero:
+        if formato == "csv":
+            escritor = csv.DictWriter(fichero, fieldnames=["ticker", *CAMPOS])
+            escritor.writeheader()
+            escritor.writerows(registros)
+        else:
+            fichero.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in registros)
+
+    assert convertir_archivo(entrada, tmp_path / "lotes.col", tamano_lote=77) == N
+    escribir_universo(tmp_path / "directo.col", universo, tickers())
+    assert (tmp_path / "lotes.col").read_bytes() == (tmp_path / "directo.col").read_bytes()
+
+
+def test_convertir_archivo_vacio(tmp_path):
+    entrada = tmp_path / "vacio.csv"
+    entrada.write_text(",".join(CAMPOS) + "\n", encoding="utf-8")
+    assert convertir_archivo(entrada, tmp_path / "vacio.col") == 0
+    with ArchivoColumnar(tmp_path / "vacio.col") as archivo:
+        assert len(archivo) == 0 and archivo.tickers() is None
+
+
+@pytest.mark.parametrize("trabajadores", [1, 2])
+@pytest.mark.parametrize("escenarios", [None, rejilla_escenarios([-1, 0, 1], [0, 0.01])])
+def test_valorar_universo(tmp_path, universo, trabajadores, escenarios):
+    escribir_universo(tmp_path / "u.col", universo, tickers())
+    opciones = {} if escenarios is None else {"escenarios": escenarios}
+    n = valorar_universo(tmp_path / "u.col", tmp_path / "r.col", trabajadores, tamano_lote=300, **opciones)
+    assert n == N
+
+    planas = aplanar_resultado(ejecutar_analisis_lote(universo, **opciones))
+    esperados = resultados_compactos(planas, *([escenarios] if escenarios else []))
+    with ArchivoColumnar(tmp_path / "r.col") as resultados:
+        assert resultados.tickers() == tickers()
+        assert set(columnas_precios(*([escenarios] if escenarios else []))) <= set(resultados.columnas)
+        for campo in esperados.dtype.names:
+            assert np.array_equal(resultados.columnas[campo], esperados[campo], equal_nan=True), campo
@@ -0,0 +1,136 @@
+"""Derivadas analíticas de los precios DCF frente a diferencias finitas centradas."""
+
+import random
+
+import numpy as np
+import pytest
+
+from analysis import (
+    PERFILES_CRECIMIENTO,
+    calcular_dcf_perpetuo,
+    calcular_dcf_proyeccion,
+    derivadas_dcf_perpetuo,
+    derivadas_dcf_proyeccion,
+    ejecutar_analisis,
+)
+from batch import aplanar_resultado, ejecutar_analisis_lote
+
+H = 1e-6  # Paso de las tasas (en tanto por uno); los crecimientos en % se mueven 100·H.
+H2 = 1e-4  # Paso de las segundas derivadas.
+PASO_IMPORTE = 1e-3
+CAMPO_G = {"Conservador": "g_conservador_pct", "Base": "g_base_pct", "Optimista": "g_optimista_pct"}
+
+
+def empresas(n=60, semilla=1):
+    rng = random.Random(semilla)
+    for _ in range(n):
+        datos = {
+            "tipo_empresa": "madura",
+            "fcf": rng.uniform(-50, 200),
+            "deuda": rng.uniform(0, 500),
+            "caja": rng.uniform(0, 200),
+            "numero_acciones": rng.uniform(10, 100),
+            "precio_accion": 10.0,
+            "g_conservador_pct": rng.uniform(-2, 4),
+            "g_base_pct": rng.uniform(0, 5),
+            "g_optimista_pct": rng.uniform(0, 6),
+            "g_inicial_pct": rng.uniform(-5, 30),
+            "g_terminal_pct": rng.uniform(0, 4),
+        }
+        yield datos, rng.uniform(0.07, 0.13), rng.choice([1, 5, 10, 30]), rng.choice(PERFILES_CRECIMIENTO)
+
+
+def mover(datos, campo, delta):
+    return {**datos, campo: datos[campo] + delta}
+
+
+def cerca(numerica, analitica, tolerancia):
+    return numerica == pytest.approx(analitica, rel=tolerancia, abs=tolerancia)
+
+
+def test_derivadas_dcf_perpetuo():
+    for datos, wacc, _, _ in empresas():
+        for nombre, der in derivadas_dcf_perpetuo(datos, wacc).items():
+            if der is None:
+                continue
+            campo_g = CAMPO_G[nombre]
+
+            def precio(d=datos, w=wacc):
+                return calcular_dcf_perpetuo(d, w)["escenarios"][nombre]["precio"]
+
+            numericas = {
+                "wacc": (precio(w=wacc + H) - precio(w=wacc - H)) / (2 * H),
+                "g": (precio(mover(datos, campo_g, 100 * H)) - precio(mover(datos, campo_g, -100 * H))) / (2 * H),
+                "fcf": (precio(mover(datos, "fcf", PASO_IMPORTE)) - precio(mover(datos, "fcf", -PASO_IMPORTE)))
+                / (2 * PASO_IMPORTE),
+                "deuda_neta": (precio(mover(datos, "deuda", PASO_IMPORTE)) - precio(mover(datos, "deuda", -PASO_IMPORTE)))
+                / (2 * PASO_IMPORTE),
+            }
+            for variable, numerica in numericas.items():
+                assert cerca(numerica, der[variable], 1e-5), (nombre, variable)
+
+            arriba, abajo = mover(datos, campo_g, 100 * H2), mover(datos, campo_g, -100 * H2)
+            segundas = {
+                "wacc": (precio(w=wacc + H2) - 2 * precio() + precio(w=wacc - H2)) / H2**2,
+                "g": (precio(arriba) - 2 * precio() + precio(abajo)) / H2**2,
+                "wacc_g": (
+                    precio(arriba, wacc + H2)
+                    - precio(abajo, wacc + H2)
+                    - precio(arriba, wacc - H2)
+                    + precio(abajo, wacc - H2)
+                )
+                / (4 * H2**2),
+            }
+            for variable, numerica in segundas.items():
+                assert cerca(numerica, der["segundas"][variable], 1e-3), (nombre, variable)
+
+
+def test_derivadas_dcf_proyeccion():
+    for datos, wacc, anios, perfil in empresas():
+        der = derivadas_dcf_proyeccion(datos, wacc, anios, perfil)
+        if der is None:
+            continue
+
+        def precio(d=datos, w=wacc):
+            return calcular_dcf_proyeccion(d, w, anios, perfil)["precio"]
+
+        def central(campo, paso):
+            return (precio(mover(datos, campo, paso)) - precio(mover(datos, campo, -paso))) / (2 * paso)
+
+        numericas = {
+            "wacc": (precio(w=wacc + H) - precio(w=wacc - H)) / (2 * H),
+            "g_inicial": central("g_inicial_pct", 100 * H) * 100,
+            "g_terminal": central("g_terminal_pct", 100 * H) * 100,
+            "fcf": central("fcf", PASO_IMPORTE),
+            "deuda_neta": -central("caja", PASO_IMPORTE),
+        }
+        for variable, numerica in numericas.items():
+            assert cerca(numerica, der[variable], 1e-4), (anios, perfil, variable)
+        segunda = (precio(w=wacc + H2) - 2 * precio() + precio(w=wacc - H2)) / H2**2
+        assert cerca(segunda, der["segundas"]["wacc"], 1e-3), (anios, perfil)
+
+
+def test_sin_precio_no_hay_derivadas():
+    datos, wacc, anios, perfil = next(empresas())
+    assert derivadas_dcf_proyeccion({**datos, "g_terminal_pct": 50.0}, wacc, anios, perfil) is None
+    assert derivadas_dcf_perpetuo({**datos, "g_base_pct": float("nan")}, wacc)["Base"] is None
+
+
+def test_derivadas_en_lote_coinciden_con_escalares(crear_universo, crear_registros):
+    u = crear_universo(150, 11)
+    u["numero_acciones"][::41] = 0.0
+    u["g_base_pct"][::19] = 12.0
+    u["g_terminal_pct"][::23] = 15.0
+    for campo in ("g_base_pct", "g_inicial_pct", "g_terminal_pct", "fcf"):
+        u[campo][5::37] = np.nan
+    planas = aplanar_resultado(ejecutar_analisis_lote(u, derivadas=True, anios_proyeccion=8))
+    for i, datos in enumerate(crear_registros(u)):
+        derivadas = ejecutar_analisis(datos, derivadas=True, anios_proyeccion=8)["derivadas"]
+        for nombre, der in derivadas["perpetuo"].items():
+            for variable in ("wacc", "g", "fcf", "deuda_neta"):
+                valor = np.nan if der is None else der[variable]
+                assert np.array_equal(valor, planas[f"d_precio_{nombre.lower()}_d_{variable}"][i], equal_nan=True)
+        der = derivadas["proyeccion"]
+        for variable in ("wacc", "g_inicial", "g_terminal", "fcf", "deuda_neta"):
+            valor = np.nan if der is None else der[variable]
+            assert np.array_equal(valor, planas[f"d_precio_proyeccion_d_{variable}"][i], equal_nan=True)
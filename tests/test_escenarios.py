@@ -0,0 +1,116 @@
+"""Escenarios del DCF perpetuo: compatibilidad con los tres precios de siempre y validación."""
+
+import numpy as np
+import pytest
+
+from analysis import (
+    ESCENARIOS_PERPETUO,
+    Escenario,
+    calcular_dcf_perpetuo,
+    calcular_wacc_automatico,
+    leer_escenarios,
+    pesos_escenarios,
+    precio_esperado,
+    rejilla_escenarios,
+)
+from batch import aplanar_resultado, ejecutar_analisis_lote
+
+
+def tres_precios(datos, wacc):
+    """Precios conservador/base/optimista tal como los calculaba el DCF perpetuo de tres escenarios."""
+    deuda_neta = datos["deuda"] - datos["caja"]
+    supuestos = {
+        "Conservador": (datos["g_conservador_pct"] / 100, wacc + 0.01),
+        "Base": (datos["g_base_pct"] / 100, wacc),
+        "Optimista": (datos["g_optimista_pct"] / 100, max(wacc - 0.01, 0.0001)),
+    }
+    precios = {}
+    for nombre, (g, wacc_esc) in supuestos.items():
+        if g >= wacc_esc or wacc_esc <= 0 or datos["numero_acciones"] == 0:
+            precios[nombre] = None
+        else:
+            precios[nombre] = (datos["fcf"] * (1 + g) / (wacc_esc - g) - deuda_neta) / datos["numero_acciones"]
+    return precios
+
+
+@pytest.fixture
+def universo(crear_universo):
+    u = crear_universo(500, 7)
+    u["g_base_pct"][::17] = 12.0
+    u["g_optimista_pct"][::13] = 9.5
+    u["numero_acciones"][::29] = 0.0
+    return u
+
+
+def test_escenarios_por_defecto_reproducen_los_tres_precios(crear_registros, universo):
+    for datos in crear_registros(universo):
+        wacc = calcular_wacc_automatico(datos["tipo_empresa"], datos["deuda"] - datos["caja"], datos["ebitda"])["wacc"]
+        dcf = calcular_dcf_perpetuo(datos, wacc)
+        esperados = tres_precios(datos, wacc)
+        assert {nombre: esc.get("precio") for nombre, esc in dcf["escenarios"].items()} == esperados
+        assert dcf["precio_base"] == esperados["Base"]
+
+
+def test_escenarios_por_defecto_en_lote(crear_registros, universo):
+    planas = aplanar_resultado(ejecutar_analisis_lote(universo))
+    for i, datos in enumerate(crear_registros(universo)):
+        esperados = tres_precios(datos, planas["wacc"][i])
+        for nombre, precio in esperados.items():
+            esperado = np.nan if precio is None else precio
+            assert np.array_equal(planas[f"precio_{nombre.lower()}"][i], esperado, equal_nan=True)
+
+
+def test_precio_esperado_pondera_los_escenarios():
+    resultados = {"A": {"precio": 10.0}, "B": {"precio": 20.0}, "C": {"error": "Error crítico: g ≥ WACC."}}
+    assert precio_esperado(resultados, (0.25, 0.75, 0.0)) == pytest.approx(17.5)
+    assert precio_esperado(resultados, (0.25, 0.5, 0.25)) is None
+
+
+def test_rejilla_escenarios():
+    rejilla = rejilla_escenarios([-1, 0, 1], [-0.01, 0.01])
+    assert len(rejilla) == 6
+    assert len({esc.nombre for esc in rejilla}) == 6
+    assert all(esc.g == "g_base_pct" for esc in rejilla)
+
+
+@pytest.mark.parametrize(
+    "escenarios",
+    [
+        (),
+        (Escenario("A", "g_base_pct"), Escenario("A", "g_optimista_pct")),
+        (Escenario("A", "g_base_pct", peso=-1),),
+        (Escenario("A", "g_base_pct", peso=0),),
+        (Escenario("A", "g_bse_pct"),),
+        (Escenario("A", float("nan")),),
+        (Escenario("A", True),),
+        (Escenario("Base", "g_base_pct"), Escenario("base", "g_optimista_pct")),
+        (Escenario("Esperado", "g_base_pct"),),
+        (Escenario("PROYECCION", "g_base_pct"),),
+        (Escenario("", "g_base_pct"),),
+        (Escenario(3, "g_base_pct"),),
+    ],
+)
+def test_pesos_escenarios_rechaza_conjuntos_no_validos(escenarios):
+    with pytest.raises(ValueError):
+        pesos_escenarios(escenarios)
+
+
+def test_leer_escenarios_en_linea_y_desde_fichero(tmp_path):
+    texto = '[{"nombre": "Base", "g": "g_base_pct", "desplazamiento_wacc": 0, "peso": 2}, {"nombre": "Fijo", "g": 2.5}]'
+    en_linea = leer_escenarios(texto)
+    ruta = tmp_path / "escenarios.json"
+    ruta.write_text(texto, encoding="utf-8")
+    assert leer_escenarios(str(ruta)) == en_linea
+    assert en_linea == (Escenario("Base", "g_base_pct", 0.0, 0, 2), Escenario("Fijo", 2.5))
+    assert leer_escenarios(None) == ESCENARIOS_PERPETUO
+
+
+@pytest.mark.parametrize("texto", ['[{"nombre": "Base", "g": "g_bse_pct"}]', '[{"nombre": "Base"}]', "[{"])
+def test_leer_escenarios_no_validos(texto):
+    with pytest.raises(ValueError):
+        leer_escenarios(texto)
+
+
+def test_leer_escenarios_fichero_inexistente(tmp_path):
+    with pytest.raises(OSError):
+        leer_escenarios(str(tmp_path / "no_existe.json"))
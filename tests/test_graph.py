@@ -0,0 +1,62 @@
+"""El grafo incremental da el mismo resultado que ``ejecutar_analisis`` tras cada cambio."""
+
+import random
+
+import pytest
+
+from analysis import Escenario, ejecutar_analisis, rejilla_escenarios
+from graph import GrafoAnalisis
+
+CAMBIOS = {
+    "precio_accion": lambda v, rng: v * rng.uniform(0.5, 1.5),
+    "fcf": lambda v, rng: v * rng.uniform(-1, 2),
+    "deuda": lambda v, rng: v * rng.uniform(0, 3),
+    "ebitda": lambda v, rng: 0.0 if rng.random() < 0.2 else v * rng.uniform(0.5, 1.5),
+    "g_base_pct": lambda v, rng: rng.uniform(-1, 12),
+    "g_optimista_pct": lambda v, rng: rng.uniform(0, 6),
+    "g_inicial_pct": lambda v, rng: rng.uniform(-5, 30),
+    "tipo_empresa": lambda v, rng: rng.choice(["growth", "madura", "defensiva", "cíclica"]),
+}
+
+
+@pytest.mark.parametrize(
+    "opciones",
+    [
+        {},
+        {"anios_proyeccion": 12, "perfil_crecimiento": "exponencial"},
+        {"criterios": "por_tipo"},
+        {"derivadas": True},
+        {"escenarios": rejilla_escenarios([-1, 0], [0, 0.01])},
+        {
+            "escenarios": (
+                Escenario("Bajista", -1.0, desplazamiento_wacc=0.02, peso=0.2),
+                Escenario("Central", "g_base_pct"),
+            )
+        },
+    ],
+)
+def test_actualizaciones_iguales_a_analisis_completo(crear_registros, opciones):
+    rng = random.Random(3)
+    for datos in crear_registros(20, 12):
+        grafo = GrafoAnalisis(datos, **opciones)
+        assert grafo.resultado() == ejecutar_analisis(datos, **opciones)
+        for _ in range(10):
+            campos = rng.sample(sorted(CAMBIOS), rng.randint(1, 3))
+            cambios = {campo: CAMBIOS[campo](grafo.datos[campo], rng) for campo in campos}
+            grafo.actualizar(cambios)
+            assert grafo.resultado() == ejecutar_analisis(grafo.datos, **opciones)
+
+
+def test_opciones_no_validas():
+    datos = {"tipo_empresa": "madura"}
+    with pytest.raises(ValueError):
+        GrafoAnalisis(datos, criterios="otro")
+    with pytest.raises(ValueError):
+        GrafoAnalisis(datos, escenarios=())
+
+
+def test_sin_cambios_no_recalcula_nada(crear_registros):
+    datos = crear_registros(1, 12)[0]
+    grafo = GrafoAnalisis(datos)
+    assert grafo.actualizar(precio_accion=datos["precio_accion"]) == []
+    assert "wacc_info" not in grafo.actualizar(g_optimista_pct=datos["g_optimista_pct"] + 1)
@@ -0,0 +1,77 @@
+"""Instrumentación: etapas, contadores iguales en escalar y en lote, y exportadores."""
+
+import logging
+
+import numpy as np
+
+import instrumentation
+from analysis import ejecutar_analisis
+from batch import ejecutar_analisis_lote
+from instrumentation import (
+    ExportadorLogging,
+    ExportadorMemoria,
+    ExportadorPrometheus,
+    Instrumentacion,
+    etiqueta_advertencia,
+    instrumentado,
+)
+
+
+def universo_con_errores(crear_universo):
+    u = crear_universo(300, 21)
+    u["ebitda"][::17] = 0.0
+    u["numero_acciones"][::23] = 0.0
+    u["g_base_pct"][::13] = 12.0
+    u["g_terminal_pct"][::19] = 15.0
+    return u
+
+
+def test_contadores_escalares_y_en_lote_coinciden(crear_universo, crear_registros):
+    u = universo_con_errores(crear_universo)
+    with instrumentado() as escalar:
+        for datos in crear_registros(u):
+            ejecutar_analisis(datos)
+    with instrumentado() as lote:
+        ejecutar_analisis_lote(u)
+    assert instrumentation.ACTIVA is None
+    assert escalar.contadores == lote.contadores
+    assert escalar.contadores[("analisis", "")] == 300
+    assert escalar.contadores[("errores", "ebitda_cero")] == int(np.count_nonzero(u["ebitda"] == 0))
+    assert {"wacc", "ratios", "dcf_perpetuo", "dcf_proyeccion", "score"} <= set(escalar.tiempos)
+    assert escalar.tiempos["wacc"][0] == 300
+
+
+def test_etapas_con_reloj_inyectado():
+    instantes = iter([0.0, 1.0, 1.5, 4.0, 4.5])
+    instr = Instrumentacion(reloj=lambda: next(instantes))
+    inicio = instr.reloj()
+    instr.etapa("a", instr.etapa("a", inicio))
+    with instr.cronometro("b"):
+        pass
+    tiempos = instr.instantanea()["tiempos"]
+    assert tiempos["a"] == {"llamadas": 2, "total_s": 1.5, "max_s": 1.0}
+    assert tiempos["b"] == {"llamadas": 1, "total_s": 0.5, "max_s": 0.5}
+    instr.reiniciar()
+    assert instr.instantanea() == {"tiempos": {}, "contadores": {}}
+
+
+def test_exportadores(tmp_path, caplog):
+    ruta = tmp_path / "metricas.prom"
+    memoria = ExportadorMemoria()
+    instr = Instrumentacion([memoria, ExportadorPrometheus(str(ruta)), ExportadorLogging()])
+    instr.etapa("wacc", instr.reloj())
+    instr.contar("errores", "g_wacc", 3)
+    instr.contar("errores", "vacio", 0)
+    with caplog.at_level(logging.INFO, logger="analisis.metricas"):
+        instr.exportar()
+    assert memoria.instantaneas[0]["contadores"] == {("errores", "g_wacc"): 3}
+    texto = ruta.read_text(encoding="utf-8")
+    assert 'analisis_etapa_llamadas_total{etapa="wacc"} 1' in texto
+    assert 'analisis_errores_total{tipo="g_wacc"} 3' in texto
+    assert list(tmp_path.iterdir()) == [ruta]
+    assert "contador=errores etiqueta=g_wacc valor=3" in caplog.text
+
+
+def test_etiqueta_advertencia():
+    texto = "FCF ≤ 0: el DCF perpetuo puede no ser fiable."
+    assert etiqueta_advertencia(texto) == "fcf_le_0_el_dcf_perpetuo_puede_no_ser_fiable"
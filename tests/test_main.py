@@ -0,0 +1,112 @@
+"""CLI: tuberías JSONL/CSV/tabla y errores de entrada con código 2 en lugar de una traza."""
+
+import csv
+import io
+import json
+
+import pytest
+
+import main
+from analysis import leer_escenarios
+from streaming import analizar_en_streaming, columnas_resultado
+
+
+@pytest.fixture
+def entrada(tmp_path, crear_registros):
+    """Fichero JSONL con 40 empresas y su lista de registros."""
+    registros = [{"ticker": f"T{i}", **r} for i, r in enumerate(crear_registros(40, 24))]
+    ruta = tmp_path / "f.jsonl"
+    ruta.write_text("".join(json.dumps(r) + "\n" for r in registros), encoding="utf-8")
+    return ruta, registros
+
+
+def test_jsonl_a_jsonl_igual_que_el_streaming(tmp_path, entrada):
+    ruta, registros = entrada
+    salida = tmp_path / "r.jsonl"
+    argumentos = [str(ruta), "-o", str(salida), "--tamano-lote", "7", "--anios-proyeccion", "9", "--criterios", "por_tipo"]
+    assert main.main(argumentos) == 0
+    filas = [json.loads(linea) for linea in salida.read_text(encoding="utf-8").splitlines()]
+    assert filas == list(analizar_en_streaming(registros, anios_proyeccion=9, criterios="por_tipo"))
+
+
+def test_csv_con_escenarios_en_linea(tmp_path, entrada):
+    ruta, _ = entrada
+    salida = tmp_path / "r.csv"
+    escenarios = '[{"nombre": "Bajista", "g": 1.0, "desplazamiento_wacc": 0.01}, {"nombre": "Base", "g": "g_base_pct"}]'
+    assert main.main([str(ruta), "-o", str(salida), "--escenarios", escenarios]) == 0
+    with open(salida, encoding="utf-8", newline="") as fichero:
+        lector = csv.DictReader(fichero)
+        assert lector.fieldnames == ["ticker", *columnas_resultado(escenarios=leer_escenarios(escenarios))]
+        assert len(list(lector)) == 40
+
+
+def test_tabla(tmp_path, entrada):
+    ruta, _ = entrada
+    salida = tmp_path / "r.txt"
+    assert main.main([str(ruta), "-o", str(salida), "--formato-salida", "tabla"]) == 0
+    lineas = salida.read_text(encoding="utf-8").splitlines()
+    assert len(lineas) == 41
+    assert lineas[0].split()[:3] == ["ticker", "tipo_empre", "PER"] and lineas[1].split()[0] == "T0"
+
+
+def test_tabla_sin_escenario_base_muestra_el_precio_esperado(tmp_path, entrada):
+    ruta, _ = entrada
+    salida = tmp_path / "r.txt"
+    escenarios = '[{"nombre": "Bajista", "g": 1.0}, {"nombre": "Alcista", "g": "g_optimista_pct"}]'
+    assert main.main([str(ruta), "-o", str(salida), "--formato-salida", "tabla", "--escenarios", escenarios]) == 0
+    cabecera, primera = salida.read_text(encoding="utf-8").splitlines()[:2]
+    assert "precio_esperado" in cabecera.split() and "precio_base" not in cabecera
+    assert primera.split()[cabecera.split().index("precio_esperado")] != "N/A"
+
+
+@pytest.mark.parametrize(
+    "argumentos",
+    [["--tamano-lote", "0"], ["--tamano-lote", "-5"], ["--anios-proyeccion", "0"], ["--anios-proyeccion", "x"]],
+)
+def test_enteros_no_positivos_se_rechazan(entrada, capsys, argumentos):
+    with pytest.raises(SystemExit) as salida:
+        main.main([str(entrada[0]), *argumentos])
+    assert salida.value.code == 2
+    assert argumentos[0] in capsys.readouterr().err
+
+
+def test_errores_de_entrada_dan_codigo_2(tmp_path, capsys, monkeypatch):
+    assert main.main([str(tmp_path / "no_existe.jsonl")]) == 2
+    assert "no_existe.jsonl" in capsys.readouterr().err
+    assert main.main(["--escenarios", '[{"nombre": "Base", "g": "g_bse_pct"}]']) == 2
+    assert "g_bse_pct" in capsys.readouterr().err
+
+    respuestas = iter(["madura", "12,5"])
+    monkeypatch.setattr("builtins.input", lambda texto="": next(respuestas))
+    assert main.main(["--interactivo", "-o", str(tmp_path / "r.txt")]) == 2
+    assert "Ingresos: '12,5' no es un número." in capsys.readouterr().err
+
+
+def test_interactivo_igual_que_desde_fichero(tmp_path, crear_registros, monkeypatch):
+    datos = crear_registros(1, 25)[0]
+    orden = [
+        "tipo_empresa",
+        "ingresos",
+        "ebitda",
+        "fcf",
+        "deuda",
+        "caja",
+        "precio_accion",
+        "patrimonio_neto",
+        "activos_totales",
+        "beneficio_neto",
+        "numero_acciones",
+        "g_conservador_pct",
+        "g_base_pct",
+        "g_optimista_pct",
+        "g_inicial_pct",
+        "g_terminal_pct",
+    ]
+    respuestas = iter(repr(datos[campo]) if campo != "tipo_empresa" else datos[campo] for campo in orden)
+    monkeypatch.setattr("builtins.input", lambda texto="": next(respuestas))
+    monkeypatch.setattr("sys.stdout", io.StringIO())
+    assert main.main(["--interactivo", "-o", str(tmp_path / "i.txt")]) == 0
+    fichero = tmp_path / "f.jsonl"
+    fichero.write_text(json.dumps(datos) + "\n", encoding="utf-8")
+    assert main.main([str(fichero), "-o", str(tmp_path / "f.txt"), "--formato-salida", "tabla"]) == 0
+    assert (tmp_path / "i.txt").read_text(encoding="utf-8") == (tmp_path / "f.txt").read_text(encoding="utf-8")
@@ -0,0 +1,32 @@
+"""Monte Carlo del DCF por proyección: sin dispersión reproduce el precio del motor escalar."""
+
+import pytest
+
+from analysis import PERFILES_CRECIMIENTO, calcular_dcf_proyeccion
+from montecarlo import distribucion_normal, simular_dcf_proyeccion
+
+
+@pytest.mark.parametrize("anios", [1, 5, 20])
+@pytest.mark.parametrize("perfil", PERFILES_CRECIMIENTO)
+def test_sin_dispersion_coincide_con_el_dcf(crear_registros, anios, perfil):
+    datos = crear_registros(1, 10)[0]
+    wacc = 0.09
+    precio = calcular_dcf_proyeccion(datos, wacc, anios, perfil)["precio"]
+    simulacion = simular_dcf_proyeccion(
+        datos,
+        distribucion_normal(datos["g_inicial_pct"], 0.0),
+        distribucion_normal(datos["g_terminal_pct"], 0.0),
+        distribucion_normal(wacc, 0.0),
+        n_simulaciones=50,
+        semilla=1,
+        anios=anios,
+        perfil=perfil,
+    )
+    assert set(simulacion["percentiles"].values()) == {precio}
+    assert simulacion["proporcion_valida"] == 1.0
+
+
+def test_horizonte_no_valido(crear_registros):
+    datos = crear_registros(1, 10)[0]
+    with pytest.raises(ValueError):
+        simular_dcf_proyeccion(datos, 10.0, 2.0, 0.09, n_simulaciones=10, anios=0)
@@ -0,0 +1,79 @@
+"""Panel empresa × trimestre: TTM, medianas móviles y análisis celda a celda."""
+
+import numpy as np
+
+from analysis import ejecutar_analisis
+from batch import CAMPOS_NUMERICOS
+from panel import CAMPOS_FLUJO, analizar_panel, mediana_movil, panel_desde_filas, suma_movil
+
+EMPRESAS, TRIMESTRES = 6, 10
+
+
+def crear_panel(crear_universo):
+    """Panel con un trimestre de cada empresa por columna y algún hueco."""
+    u = crear_universo(EMPRESAS * TRIMESTRES, 22)
+    panel = {campo: u[campo].reshape(EMPRESAS, TRIMESTRES) for campo in CAMPOS_NUMERICOS}
+    for campo in CAMPOS_FLUJO:
+        panel[campo] = panel[campo] / 4
+    panel["fcf"][2, 5] = np.nan
+    panel["tipo_empresa"] = u["tipo_empresa"][:EMPRESAS]
+    return panel
+
+
+def test_suma_y_mediana_movil_frente_a_ventanas_directas():
+    rng = np.random.default_rng(7)
+    valores = rng.normal(size=(3, 12))
+    valores[1, 4] = np.nan
+    suma = suma_movil(valores, 4)
+    mediana = mediana_movil(valores, 5, min_observaciones=3)
+    for i in range(3):
+        for t in range(12):
+            ventana = valores[i, max(t - 3, 0) : t + 1]
+            esperado = ventana.sum() if t >= 3 else np.nan
+            assert np.array_equal(suma[i, t], esperado, equal_nan=True)
+            ventana = valores[i, max(t - 4, 0) : t + 1]
+            ventana = ventana[~np.isnan(ventana)]
+            esperado = np.median(ventana) if len(ventana) >= 3 else np.nan
+            assert np.array_equal(mediana[i, t], esperado, equal_nan=True)
+
+
+def test_cada_celda_igual_que_el_analisis_escalar_ttm(crear_universo):
+    panel = crear_panel(crear_universo)
+    resultado = analizar_panel(panel, ventana_mediana=4)
+    valido = resultado["valido"]
+    assert not valido[:, :3].any() and not valido[2, 5:9].any() and valido[0, 3:].all()
+    for i in range(EMPRESAS):
+        for t in range(TRIMESTRES):
+            if not valido[i, t]:
+                assert np.isnan(resultado["series"]["score_total"][i, t])
+                continue
+            datos = {"tipo_empresa": panel["tipo_empresa"][i]}
+            for campo in CAMPOS_NUMERICOS:
+                # TTM: suma de los cuatro últimos trimestres, en el mismo orden que ``suma_movil``.
+                flujo = campo in CAMPOS_FLUJO
+                datos[campo] = sum(panel[campo][i, t - 3 : t + 1].tolist()) if flujo else float(panel[campo][i, t])
+            esperado = ejecutar_analisis(datos)
+            assert resultado["series"]["score_total"][i, t] == esperado["score"]["total"]
+            precio = esperado["dcf_perpetuo"]["precio_base"]
+            assert np.array_equal(resultado["series"]["precio_base"][i, t], np.nan if precio is None else precio, True)
+    assert np.array_equal(
+        resultado["medianas"]["score_total"], mediana_movil(resultado["series"]["score_total"], 4), equal_nan=True
+    )
+
+
+def test_panel_desde_filas_con_huecos():
+    filas = {
+        "ticker": ["B", "A", "A", "B"],
+        "trimestre": ["2024Q2", "2024Q1", "2024Q2", "2024Q1"],
+        "tipo_empresa": ["growth", "madura", "defensiva", "cíclica"],
+        **{campo: [1.0, 2.0, 3.0, 4.0] for campo in CAMPOS_NUMERICOS},
+    }
+    tickers, trimestres, panel = panel_desde_filas(filas)
+    assert tickers.tolist() == ["A", "B"] and trimestres.tolist() == ["2024Q1", "2024Q2"]
+    assert panel["fcf"].tolist() == [[2.0, 3.0], [4.0, 1.0]]
+    assert panel["tipo_empresa"].tolist() == ["defensiva", "growth"]
+    del filas["ticker"][3], filas["trimestre"][3], filas["tipo_empresa"][3]
+    for campo in CAMPOS_NUMERICOS:
+        del filas[campo][3]
+    _, _, panel = panel_desde_filas(filas)
+    assert np.isnan(panel["fcf"][1, 0])
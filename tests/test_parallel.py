@@ -0,0 +1,34 @@
+"""El pool de procesos da las mismas filas, en el mismo orden, que el análisis secuencial."""
+
+import json
+
+import numpy as np
+
+from batch import aplanar_resultado, ejecutar_analisis_lote
+from parallel import analizar_archivo_en_paralelo, analizar_columnas_en_paralelo, analizar_en_paralelo
+from streaming import analizar_archivo, analizar_en_streaming
+
+
+def test_columnas_en_paralelo_igual_que_un_lote(crear_universo):
+    u = crear_universo(1_000, 13)
+    esperado = aplanar_resultado(ejecutar_analisis_lote(u))
+    planas = analizar_columnas_en_paralelo(u, trabajadores=2, tamano_lote=150)
+    assert list(planas) == list(esperado)
+    for nombre, columna in esperado.items():
+        assert np.array_equal(planas[nombre], columna, equal_nan=columna.dtype.kind == "f"), nombre
+
+
+def test_registros_en_paralelo_conservan_orden_y_extras(crear_registros):
+    registros = [{"ticker": f"T{i}", **r} for i, r in enumerate(crear_registros(300, 14))]
+    assert list(analizar_en_paralelo(registros, trabajadores=3, tamano_lote=40)) == list(
+        analizar_en_streaming(registros)
+    )
+
+
+def test_archivo_en_paralelo_igual_que_secuencial(tmp_path, crear_registros):
+    entrada = tmp_path / "f.jsonl"
+    registros = [{"ticker": f"T{i}", **r} for i, r in enumerate(crear_registros(120, 15))]
+    entrada.write_text("".join(json.dumps(r) + "\n" for r in registros), encoding="utf-8")
+    assert analizar_archivo_en_paralelo(entrada, tmp_path / "p.csv", trabajadores=2, tamano_lote=25) == 120
+    assert analizar_archivo(entrada, tmp_path / "s.csv") == 120
+    assert (tmp_path / "p.csv").read_text(encoding="utf-8") == (tmp_path / "s.csv").read_text(encoding="utf-8")
@@ -0,0 +1,45 @@
+"""Percentiles del universo y por tipo frente a un cálculo directo por comparación."""
+
+import numpy as np
+
+from batch import aplanar_resultado, ejecutar_analisis_lote
+from ranking import percentiles, percentiles_resultado
+
+
+def percentil_directo(valores, i, mascara):
+    """``100 * (debajo + iguales / 2) / n`` sobre los valores no ``NaN`` de ``mascara``."""
+    grupo = valores[mascara & ~np.isnan(valores)]
+    return 100.0 * ((grupo < valores[i]).sum() + 0.5 * (grupo == valores[i]).sum()) / len(grupo)
+
+
+def test_percentiles_con_empates_nan_y_grupos():
+    rng = np.random.default_rng(2)
+    valores = rng.integers(0, 15, 300).astype(np.float64)
+    valores[rng.random(300) < 0.1] = np.nan
+    grupos = rng.integers(0, 4, 300)
+    universo, por_grupo = percentiles(valores, grupos)
+    todos = np.ones(300, dtype=bool)
+    for i in range(300):
+        if np.isnan(valores[i]):
+            assert np.isnan(universo[i]) and np.isnan(por_grupo[i])
+        else:
+            assert universo[i] == percentil_directo(valores, i, todos)
+            assert por_grupo[i] == percentil_directo(valores, i, grupos == grupos[i])
+
+
+def test_percentiles_sin_grupos_ni_datos():
+    universo, por_grupo = percentiles([np.nan, np.nan])
+    assert por_grupo is None and np.isnan(universo).all()
+    assert percentiles([3.0])[0].tolist() == [50.0]
+
+
+def test_percentiles_resultado(crear_universo):
+    planas = aplanar_resultado(ejecutar_analisis_lote(crear_universo(500, 8)))
+    columnas = percentiles_resultado(planas)
+    assert {"percentil_score_total", "percentil_tipo_score_total", "percentil_per", "percentil_tipo_ev_ebitda"} <= set(
+        columnas
+    )
+    por_tipo = columnas["percentil_tipo_score_total"]
+    mascara = planas["tipo_empresa"] == planas["tipo_empresa"][0]
+    esperado = percentil_directo(planas["score_total"].astype(np.float64), 0, mascara)
+    assert por_tipo[0] == esperado
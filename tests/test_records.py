@@ -0,0 +1,35 @@
+"""Resultados compactos: ida y vuelta y columnas de precios según el conjunto de escenarios."""
+
+import numpy as np
+import pytest
+
+from analysis import rejilla_escenarios
+from batch import aplanar_resultado, ejecutar_analisis_lote
+from records import columnas_precios, expandir_resultado, resultados_compactos
+
+N = 200
+
+
+@pytest.fixture
+def universo(crear_universo):
+    u = crear_universo(N, 9)
+    u["tipo_empresa"][::97] = "otro"
+    return u
+
+
+def test_resultados_compactos_ida_y_vuelta(universo):
+    planas = aplanar_resultado(ejecutar_analisis_lote(universo))
+    compactos = resultados_compactos(planas)
+    for i in (0, 1, 96, 97, 194, N - 1):
+        fila = expandir_resultado(compactos[i])
+        for columna in columnas_precios():
+            valor = np.nan if fila[columna] is None else fila[columna]
+            assert np.array_equal(valor, planas[columna][i], equal_nan=True), columna
+        assert fila["score_clasificacion"] == planas["score_clasificacion"][i]
+        assert fila["clasificacion_mercado_proyeccion"] == planas["clasificacion_mercado_proyeccion"][i]
+
+
+def test_resultados_compactos_rechaza_otros_escenarios(universo):
+    planas = aplanar_resultado(ejecutar_analisis_lote(universo, escenarios=rejilla_escenarios([0, 1], [0])))
+    with pytest.raises(ValueError):
+        resultados_compactos(planas)
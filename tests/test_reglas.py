@@ -0,0 +1,51 @@
+"""Reglas compiladas: mismos tramos que los cortes de ``REGLAS`` en escalar y en lote."""
+
+import math
+
+import numpy as np
+
+from rules import PERFILES, REGLAS, REGLAS_COMPILADAS, SIN_DATO
+
+
+def tramo_literal(cortes, valor):
+    """Tramo según la lectura directa de los cortes: el primero que se cumple."""
+    for i, (corte, operador) in enumerate(cortes):
+        if (valor < corte) if operador == "<" else (valor <= corte):
+            return i
+    return len(cortes)
+
+
+def valores_de_prueba(cortes, rng):
+    valores = [-1e12, 1e12, 0.0, -0.0]
+    for corte, _ in cortes:
+        valores += [corte, math.nextafter(corte, -math.inf), math.nextafter(corte, math.inf)]
+    return valores + rng.normal(0, 50, 200).tolist() + rng.normal(0, 0.3, 200).tolist()
+
+
+def test_tramos_escalares_siguen_los_cortes():
+    rng = np.random.default_rng(5)
+    for nombre, regla in REGLAS.items():
+        compilada = REGLAS_COMPILADAS[nombre]
+        for valor in valores_de_prueba(regla["cortes"], rng):
+            assert compilada.tramo(valor) == tramo_literal(regla["cortes"], valor), (nombre, valor)
+        assert compilada.tramo(None) == SIN_DATO
+        assert compilada.tramo(float("nan")) == SIN_DATO
+
+
+def test_tramos_en_lote_coinciden_con_escalares():
+    rng = np.random.default_rng(6)
+    for nombre, regla in REGLAS.items():
+        compilada = REGLAS_COMPILADAS[nombre]
+        valores = np.array(valores_de_prueba(regla["cortes"], rng) + [np.nan])
+        for perfil in range(len(PERFILES)):
+            esperados = [compilada.tramo(v, perfil) for v in valores.tolist()]
+            assert compilada.tramos(valores, perfil).tolist() == esperados, (nombre, perfil)
+        perfiles = rng.integers(0, len(PERFILES), len(valores))
+        esperados = [compilada.tramo(v, p) for v, p in zip(valores.tolist(), perfiles.tolist())]
+        assert compilada.tramos(valores, perfiles).tolist() == esperados, nombre
+
+
+def test_sin_dato_indexa_la_ultima_columna():
+    for compilada in REGLAS_COMPILADAS.values():
+        assert compilada.tabla_etiquetas[0, SIN_DATO] is None
+        assert compilada.advertencias[SIN_DATO] is None
@@ -0,0 +1,74 @@
+"""La revalorización por ticks coincide bit a bit con un análisis completo con los nuevos precios."""
+
+import numpy as np
+import pytest
+
+from analysis import rejilla_escenarios
+from batch import aplanar_resultado, ejecutar_analisis_lote
+from repricing import CLASIFICACIONES, RevalorizadorPrecios
+
+N = 3_000
+
+
+@pytest.fixture
+def universo(crear_universo):
+    u = crear_universo(N, 3)
+    u["beneficio_neto"][:50] = 0.0
+    u["numero_acciones"][50:60] = 0.0
+    u["g_terminal_pct"][60:80] = 20.0
+    u["fcf"][80:90] = 0.0
+    return u
+
+
+def comprobar(motor, completo):
+    assert np.array_equal(motor.score_total, completo["score_total"])
+    for nombre, (regla, atributo) in CLASIFICACIONES.items():
+        assert list(regla.tabla_etiquetas[0, getattr(motor, atributo)]) == list(completo[nombre]), nombre
+
+
+@pytest.mark.parametrize(
+    "opciones",
+    [{}, {"criterios": "por_tipo"}, {"escenarios": rejilla_escenarios([-1, 0, 1], [0, 0.01]), "anios_proyeccion": 8}],
+)
+def test_ticks_iguales_a_reanalisis_completo(universo, opciones):
+    rng = np.random.default_rng(0)
+    u = universo
+    tickers = np.array([f"T{i}" for i in range(N)], dtype=object)
+    motor = RevalorizadorPrecios(u, tickers, **opciones)
+    precios = u["precio_accion"].copy()
+    anterior = aplanar_resultado(ejecutar_analisis_lote(u, **opciones))
+    comprobar(motor, anterior)
+
+    for paso in range(4):
+        if paso % 2 == 0:
+            precios = precios * np.exp(rng.normal(0, 0.05, N))
+            cambios = motor.actualizar(precios)
+        else:
+            indices = rng.choice(N, 500, replace=False)
+            nuevos = precios[indices] * np.exp(rng.normal(0, 0.2, 500))
+            cambios = motor.actualizar(nuevos, motor.posiciones(tickers[indices].tolist()))
+            precios = precios.copy()
+            precios[indices] = nuevos
+        completo = aplanar_resultado(ejecutar_analisis_lote({**u, "precio_accion": precios}, **opciones))
+        comprobar(motor, completo)
+
+        cambiadas = np.zeros(N, dtype=bool)
+        for nombre in CLASIFICACIONES:
+            cambiadas |= anterior[nombre] != completo[nombre]
+        # Con ``indices`` los cambios salen en el orden de los índices dados.
+        assert sorted(cambios["indice"]) == list(np.flatnonzero(cambiadas))
+        assert list(cambios["ticker"]) == list(tickers[cambios["indice"]])
+        for nombre in CLASIFICACIONES:
+            assert list(cambios[nombre]) == list(completo[nombre][cambios["indice"]])
+            assert list(cambios[f"{nombre}_anterior"]) == list(anterior[nombre][cambios["indice"]])
+        anterior = completo
+
+
+def test_actualizar_valida_la_forma(crear_universo):
+    motor = RevalorizadorPrecios(crear_universo(10, 1))
+    with pytest.raises(ValueError):
+        motor.actualizar(np.ones(9))
+    with pytest.raises(ValueError):
+        motor.actualizar([1.0, 2.0], [0])
+    with pytest.raises(ValueError):
+        motor.posiciones(["T0"])
@@ -0,0 +1,73 @@
+"""DCF inverso: los crecimientos y WACC implícitos reproducen el precio de mercado."""
+
+import numpy as np
+import pytest
+
+from batch import aplanar_resultado, ejecutar_analisis_lote, factores_capitalizacion, preparar_columnas
+from reverse_dcf import (
+    ev_dcf_proyeccion,
+    g_implicito_perpetuo,
+    g_implicito_proyeccion,
+    wacc_implicito_perpetuo,
+    wacc_implicito_proyeccion,
+)
+
+HORIZONTES = [(5, "lineal"), (20, "exponencial"), (3, "exponencial")]
+
+
+@pytest.fixture(scope="module")
+def universo(crear_universo):
+    return crear_universo(1_000, 5)
+
+
+def ev_objetivo(c):
+    return c["precio_accion"] * c["numero_acciones"] + c["deuda"] - c["caja"]
+
+
+@pytest.mark.parametrize("anios, perfil", HORIZONTES)
+def test_ev_igual_al_del_motor(universo, anios, perfil):
+    resultado = ejecutar_analisis_lote(universo, anios_proyeccion=anios, perfil_crecimiento=perfil)
+    c = preparar_columnas(universo)
+    wacc = resultado["wacc_info"]["wacc"]
+    ev = ev_dcf_proyeccion(
+        c["fcf"], c["g_inicial_pct"], c["g_terminal_pct"], wacc, anios, perfil, factores_capitalizacion(wacc, anios)
+    )
+    motor = resultado["dcf_proyeccion"]["ev"]
+    validos = ~np.isnan(motor)
+    assert validos.sum() > 900
+    assert np.array_equal(ev[validos], motor[validos])
+
+
+@pytest.mark.parametrize("anios, perfil", HORIZONTES)
+def test_g_implicito_proyeccion_reproduce_el_precio(universo, anios, perfil):
+    implicito = g_implicito_proyeccion(universo, anios=anios, perfil_crecimiento=perfil)
+    convergido = implicito["convergido"]
+    assert convergido.sum() > 100
+    ajustado = {**universo, "g_inicial_pct": np.where(convergido, implicito["raiz"], universo["g_inicial_pct"])}
+    precio = aplanar_resultado(ejecutar_analisis_lote(ajustado, anios_proyeccion=anios, perfil_crecimiento=perfil))
+    np.testing.assert_allclose(precio["precio_proyeccion"][convergido], universo["precio_accion"][convergido], rtol=1e-7)
+
+
+@pytest.mark.parametrize("anios, perfil", HORIZONTES)
+def test_wacc_implicito_proyeccion_reproduce_el_ev(universo, anios, perfil):
+    implicito = wacc_implicito_proyeccion(universo, anios=anios, perfil_crecimiento=perfil)
+    convergido = implicito["convergido"]
+    assert convergido.sum() > 100
+    c = {campo: valores[convergido] for campo, valores in preparar_columnas(universo).items()}
+    ev = ev_dcf_proyeccion(c["fcf"], c["g_inicial_pct"], c["g_terminal_pct"], implicito["raiz"][convergido], anios, perfil)
+    np.testing.assert_allclose(ev, ev_objetivo(c), rtol=1e-4)
+
+
+def test_g_y_wacc_implicitos_perpetuos(universo):
+    g = g_implicito_perpetuo(universo)
+    validos = ~np.isnan(g)
+    ajustado = {**universo, "g_base_pct": np.where(validos, g, universo["g_base_pct"])}
+    precio = aplanar_resultado(ejecutar_analisis_lote(ajustado))["precio_base"]
+    np.testing.assert_allclose(precio[validos], universo["precio_accion"][validos], rtol=1e-9)
+
+    wacc = wacc_implicito_perpetuo(universo)
+    validos = ~np.isnan(wacc)
+    assert validos.any()
+    g_base = universo["g_base_pct"][validos] / 100
+    c = {campo: valores[validos] for campo, valores in preparar_columnas(universo).items()}
+    np.testing.assert_allclose(c["fcf"] * (1 + g_base) / (wacc[validos] - g_base), ev_objetivo(c), rtol=1e-9)
@@ -0,0 +1,76 @@
+"""Screener top-k: mismo resultado que filtrar y ordenar el análisis completo."""
+
+import numpy as np
+import pytest
+
+from analysis import Escenario
+from batch import aplanar_resultado, ejecutar_analisis_lote
+from screener import OPERADORES, seleccionar_mejores, tipos_columnas
+
+N = 2_000
+ESCENARIOS = (Escenario("Bajista", "g_conservador_pct", desplazamiento_wacc=0.02), Escenario("Alcista", 3.0, peso=2))
+
+
+def top_directo(planas, predicados, k, orden, descendente):
+    """Índices del top-k filtrando y ordenando las columnas completas fila a fila."""
+    candidatas = []
+    for i in range(len(planas["score_total"])):
+        cumple = True
+        for columna, simbolo, valor in predicados:
+            v = planas[columna][i]
+            cumple &= v == v and v is not None and bool(OPERADORES[simbolo](v, valor))
+        clave = float(planas[orden][i])
+        if cumple and clave == clave:
+            candidatas.append(((clave if descendente else -clave), -i))
+    return [-i for _, i in sorted(candidatas, reverse=True)[:k]]
+
+
+@pytest.mark.parametrize(
+    "predicados, orden, descendente, opciones",
+    [
+        ([("PER", "<", 20), ("Deuda neta/EBITDA", "<=", 3)], "score_total", True, {}),
+        ([("veredicto_preliminar", "!=", "cautela"), ("ROE", ">", 0.05)], "score_total", True, {"criterios": "por_tipo"}),
+        (
+            [("tipo_empresa", "==", "growth"), ("precio_esperado", ">", 0)],
+            "precio_proyeccion",
+            False,
+            {"anios_proyeccion": 10},
+        ),
+        (
+            [("precio_bajista", ">", 0), ("clasificacion_mercado_perpetuo", "==", "Infravalorada")],
+            "precio_alcista",
+            True,
+            {"escenarios": ESCENARIOS, "perfil_crecimiento": "exponencial"},
+        ),
+    ],
+)
+def test_igual_que_filtrar_el_analisis_completo(crear_universo, predicados, orden, descendente, opciones):
+    u = crear_universo(N, 23)
+    planas = aplanar_resultado(ejecutar_analisis_lote(u, **opciones))
+    esperados = top_directo(planas, predicados, 25, orden, descendente)
+    mejores = seleccionar_mejores(u, predicados, 25, orden, descendente, tamano_lote=300, **opciones)
+    assert [fila["indice"] for fila in mejores["filas"]] == esperados
+    assert len(esperados) == 25
+    for fila in mejores["filas"]:
+        assert fila[orden] == planas[orden][fila["indice"]]
+
+
+def test_columnas_segun_las_opciones():
+    assert {"precio_base", "precio_esperado"} <= set(tipos_columnas())
+    tipos = tipos_columnas(escenarios=ESCENARIOS)
+    assert {"precio_bajista", "precio_alcista", "precio_esperado"} <= set(tipos) and "precio_base" not in tipos
+    assert tipos["clasificacion_mercado_perpetuo"] == "O" and tipos["precio_bajista"] == "f"
+
+
+@pytest.mark.parametrize(
+    "predicados, orden, mensaje",
+    [
+        ([("clasificacion_mercado_perpetuo", "<", "x")], "score_total", "es de texto"),
+        ([("precio_conservador", ">", 0)], "score_total", "Columna desconocida"),
+        ([("PER", "~", 1)], "score_total", "Operador no soportado"),
+        ([], "score_clasificacion", "columna de texto"),
+    ],
+)
+def test_filtros_no_validos(crear_universo, predicados, orden, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        seleccionar_mejores(crear_universo(10, 1), predicados, orden=orden, escenarios=ESCENARIOS)
@@ -0,0 +1,75 @@
+"""Rejilla WACC × g y tornado frente al análisis escalar."""
+
+import numpy as np
+import pytest
+
+from analysis import calcular_escenario_perpetuo, ejecutar_analisis
+from sensitivity import (
+    VARIABLES_RELATIVAS,
+    calcular_rejilla_dcf_perpetuo,
+    calcular_tornado,
+    rango_centrado,
+)
+
+
+def metricas(resultado):
+    """Métricas del tornado a partir de un resultado de ``ejecutar_analisis``."""
+    return {
+        "precio_base": resultado["dcf_perpetuo"]["precio_base"],
+        "precio_proyeccion": resultado["dcf_proyeccion"]["precio"],
+        "score_total": resultado["score"]["total"],
+    }
+
+
+def test_rango_centrado():
+    assert rango_centrado(0.08, 0.02, 5).tolist() == np.linspace(0.06, 0.10, 5).tolist()
+
+
+def test_rejilla_igual_que_cada_escenario(crear_registros):
+    waccs = rango_centrado(0.08, 0.03, 7)
+    gs_pct = rango_centrado(4.0, 4.0, 9)
+    for datos in crear_registros(30, 16) + [{**crear_registros(1, 16)[0], "numero_acciones": 0.0}]:
+        rejilla = calcular_rejilla_dcf_perpetuo(datos, waccs, gs_pct)
+        assert rejilla["precios"].shape == (7, 9)
+        for i, wacc in enumerate(waccs):
+            for j, g_pct in enumerate(gs_pct):
+                escenario = calcular_escenario_perpetuo(
+                    datos["fcf"], datos["deuda"] - datos["caja"], datos["numero_acciones"], g_pct / 100, wacc
+                )
+                assert rejilla["valido"][i, j] == ("precio" in escenario)
+                if "precio" in escenario:
+                    assert rejilla["precios"][i, j] == escenario["precio"]
+                else:
+                    assert np.isnan(rejilla["precios"][i, j])
+
+
+def test_tornado_igual_que_el_analisis_escalar(crear_registros):
+    for datos in crear_registros(10, 22):
+        tornado = calcular_tornado(datos, criterios="por_tipo")
+        assert tornado["base"] == metricas(ejecutar_analisis(datos, criterios="por_tipo"))
+        for fila in tornado["filas"]:
+            variable = fila["variable"]
+            if variable == "wacc":
+                continue
+            if variable in VARIABLES_RELATIVAS:
+                bajo, alto = datos[variable] * (1 - 0.10), datos[variable] * (1 + 0.10)
+            else:
+                bajo, alto = datos[variable] - 1.0, datos[variable] + 1.0
+            assert (fila["valor_bajo"], fila["valor_alto"]) == (bajo, alto)
+            for sufijo, valor in (("bajo", bajo), ("alto", alto)):
+                esperado = metricas(ejecutar_analisis({**datos, variable: valor}, criterios="por_tipo"))
+                assert {m: fila[f"{m}_{sufijo}"] for m in esperado} == esperado, (variable, sufijo)
+
+
+def test_tornado_ordena_por_impacto(crear_registros):
+    tornado = calcular_tornado(crear_registros(1, 5)[0], orden="precio_proyeccion")
+    impactos = [fila["impacto_precio_proyeccion"] for fila in tornado["filas"]]
+    conocidos = [impacto for impacto in impactos if impacto is not None]
+    assert conocidos == sorted(conocidos, reverse=True) and impactos[: len(conocidos)] == conocidos
+    fila_wacc = next(fila for fila in tornado["filas"] if fila["variable"] == "wacc")
+    assert fila_wacc["valor_alto"] - fila_wacc["valor_base"] == pytest.approx(0.01)
+
+
+def test_tornado_orden_desconocido(crear_registros):
+    with pytest.raises(ValueError):
+        calcular_tornado(crear_registros(1, 5)[0], orden="precio")
@@ -0,0 +1,92 @@
+"""Servicio HTTP: validación de entradas y respuestas en JSON estricto."""
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from batch import CAMPOS, aplanar_resultado, columnas_desde_registros, ejecutar_analisis_lote
+from service import AgrupadorLotes, ErrorHTTP, ServicioValoracion, analizar_columnas, validar_registro
+
+
+@pytest.fixture
+def empresa(crear_registros):
+    return {"ticker": "AAA", **crear_registros(1, 2)[0]}
+
+
+def atender(ruta, cuerpo):
+    async def peticion():
+        agrupador = AgrupadorLotes(ventana=0.0)
+        agrupador.iniciar()
+        try:
+            return await ServicioValoracion(agrupador).atender("POST", ruta, cuerpo.encode("utf-8"))
+        finally:
+            await agrupador.detener()
+
+    return asyncio.run(peticion())
+
+
+@pytest.mark.parametrize("valor", ["nan", "inf", "-Infinity", 1e308 * 10, "1e400", 10**400, -(10**400)])
+def test_validar_registro_rechaza_no_finitos(empresa, valor):
+    with pytest.raises(ValueError, match="el campo fcf no es un número finito"):
+        validar_registro({**empresa, "fcf": valor})
+
+
+def test_validar_registro_normaliza(empresa):
+    registro = validar_registro({**empresa, "tipo_empresa": " Madura ", "fcf": "12.5"})
+    assert registro["tipo_empresa"] == "madura" and registro["fcf"] == 12.5 and registro["ticker"] == "AAA"
+    with pytest.raises(ValueError, match="faltan campos"):
+        validar_registro({campo: 1 for campo in CAMPOS[1:]})
+
+
+def test_peticion_con_infinity_o_desbordamiento_da_400(empresa):
+    for cuerpo in (json.dumps(empresa).replace('"AAA"', "Infinity"), json.dumps({**empresa, "fcf": "x"})):
+        with pytest.raises(ErrorHTTP) as error:
+            atender("/analizar", cuerpo)
+        assert error.value.estado == 400
+    cuerpo = json.dumps(empresa).replace(f'"fcf": {empresa["fcf"]}', '"fcf": 1e400')
+    with pytest.raises(ErrorHTTP, match="fcf"):
+        atender("/analizar/lote", f"[{cuerpo}]")
+
+
+def test_entero_desbordado_da_400_por_la_conexion(empresa):
+    """Un entero JSON enorme se responde con 400 y la conexión no se cierra sin respuesta."""
+    cuerpo = json.dumps({**empresa, "fcf": 1}).replace('"fcf": 1', '"fcf": 1' + "0" * 400).encode("utf-8")
+
+    async def peticion():
+        agrupador = AgrupadorLotes(ventana=0.0)
+        agrupador.iniciar()
+        servidor = await asyncio.start_server(ServicioValoracion(agrupador).manejar_conexion, "127.0.0.1", 0)
+        try:
+            reader, writer = await asyncio.open_connection(*servidor.sockets[0].getsockname()[:2])
+            writer.write(b"POST /analizar HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(cuerpo) + cuerpo)
+            await writer.drain()
+            cabeceras = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            longitud = int(cabeceras.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            respuesta = cabeceras + await reader.readexactly(longitud)
+            writer.close()
+            return respuesta
+        finally:
+            servidor.close()
+            await agrupador.detener()
+
+    estado, _, resto = asyncio.run(peticion()).partition(b"\r\n\r\n")
+    assert estado.startswith(b"HTTP/1.1 400")
+    assert "el campo fcf no es un número finito" in json.loads(resto)["error"]
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_resultados_no_finitos_salen_como_null(empresa):
+    # Con un número de acciones subnormal, el precio y la capitalización desbordan a ``inf``.
+    registro = {**empresa, "ingresos": 0.0, "ebitda": 0.0, "fcf": 1e-320, "beneficio_neto": 1e-320}
+    registro["numero_acciones"] = 1e-320
+    columnas = columnas_desde_registros([registro])
+    crudas = aplanar_resultado(ejecutar_analisis_lote(columnas))
+    assert any(np.isinf(c).any() for c in crudas.values() if c.dtype.kind == "f")
+    planas = analizar_columnas(columnas)
+    assert not any(np.isinf(c).any() for c in planas.values() if c.dtype.kind == "f")
+
+    estado, fila, _ = atender("/analizar", json.dumps(registro))
+    assert estado == 200 and fila["ticker"] == "AAA"
+    json.dumps(fila, allow_nan=False)
@@ -0,0 +1,67 @@
+"""Almacén SQLite de resultados: ida y vuelta, recálculo incremental y migración del esquema."""
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+from batch import aplanar_resultado, ejecutar_analisis_lote
+from store import COLUMNAS_RESULTADO, AlmacenResultados
+
+N = 200
+
+
+@pytest.fixture
+def registros(crear_registros):
+    return [{"ticker": f"T{i}", **r} for i, r in enumerate(crear_registros(N, 4))]
+
+
+def test_guardar_y_consultar(crear_universo, registros):
+    planas = aplanar_resultado(ejecutar_analisis_lote(crear_universo(N, 4)))
+    with AlmacenResultados() as almacen:
+        assert almacen.guardar("2024-03-29", registros) == {"recalculadas": N, "reutilizadas": 0}
+        filas = {fila["ticker"]: fila for fila in almacen.consultar(limite=None)}
+        assert len(filas) == N
+        for i in range(N):
+            fila = filas[f"T{i}"]
+            for columna in ("precio_base", "precio_esperado", "precio_proyeccion", "wacc"):
+                valor = np.nan if fila[columna] is None else fila[columna]
+                assert np.array_equal(valor, planas[columna][i], equal_nan=True), columna
+            assert fila["score_total"] == planas["score_total"][i]
+            assert fila["score_clasificacion"] == planas["score_clasificacion"][i]
+
+        compras = almacen.consultar(clasificacion="Compra", maximos={"ev_ebitda": 8})
+        assert all(f["score_clasificacion"] == "Compra" and f["ev_ebitda"] < 8 for f in compras)
+        with pytest.raises(ValueError):
+            almacen.consultar(orden="precio_base; DROP TABLE resultados")
+
+
+def test_recalculo_incremental(registros):
+    with AlmacenResultados() as almacen:
+        almacen.guardar("2024-03-29", registros)
+        cambiados = [dict(r) for r in registros]
+        cambiados[3]["precio_accion"] *= 2
+        cambiados[7]["fcf"] += 1
+        assert almacen.guardar("2024-06-28", cambiados) == {"recalculadas": 2, "reutilizadas": N - 2}
+        assert almacen.fechas() == ["2024-03-29", "2024-06-28"]
+
+        con_todo = AlmacenResultados()
+        con_todo.guardar("2024-06-28", cambiados)
+        assert almacen.consultar() == con_todo.consultar()
+        con_todo.cerrar()
+        assert [f["fecha"] for f in almacen.historico("T3")] == ["2024-03-29", "2024-06-28"]
+
+
+def test_fichero_anterior_recibe_las_columnas_nuevas(tmp_path, registros):
+    ruta = tmp_path / "antiguo.db"
+    antiguas = [c for c in COLUMNAS_RESULTADO if c != "precio_esperado"]
+    with sqlite3.connect(ruta) as conexion:
+        conexion.execute(
+            "CREATE TABLE resultados (ticker TEXT NOT NULL, fecha TEXT NOT NULL, huella TEXT NOT NULL, "
+            + ", ".join(antiguas)
+            + ", PRIMARY KEY (ticker, fecha))"
+        )
+    conexion.close()
+    with AlmacenResultados(ruta) as almacen:
+        almacen.guardar("2024-03-29", registros[:5])
+        assert all(fila["precio_esperado"] is not None for fila in almacen.consultar())
@@ -0,0 +1,94 @@
+"""Lectura por lotes, errores con línea y campo, y cabecera CSV fija del esquema de salida."""
+
+import csv
+import io
+import json
+
+import pytest
+
+from analysis import rejilla_escenarios
+from batch import CAMPOS, ejecutar_analisis_lote, filas_resultado
+from streaming import (
+    EscritorResultados,
+    analizar_archivo,
+    analizar_en_streaming,
+    columnas_resultado,
+    leer_fundamentales,
+)
+
+
+@pytest.fixture
+def registros(crear_registros):
+    def crear(n=30):
+        return [{"ticker": f"T{i}", **r} for i, r in enumerate(crear_registros(n, 6))]
+
+    return crear
+
+
+def test_streaming_por_lotes_igual_que_un_lote(crear_universo, registros):
+    filas = list(analizar_en_streaming(registros(), tamano_lote=7))
+    esperadas = list(filas_resultado(ejecutar_analisis_lote(crear_universo(30, 6))))
+    assert [{k: v for k, v in f.items() if k != "ticker"} for f in filas] == esperadas
+    assert [f["ticker"] for f in filas] == [f"T{i}" for i in range(30)]
+
+
+def test_error_numerico_indica_linea_y_campo(registros):
+    texto = "\n".join(json.dumps(r) for r in registros(3)) + "\n"
+    texto = texto.replace(f'"fcf": {registros(3)[1]["fcf"]}', '"fcf": "n/a"')
+    with pytest.raises(ValueError, match=r"Línea 2: el campo fcf no es numérico \('n/a'\)"):
+        list(leer_fundamentales(io.StringIO(texto), "jsonl"))
+
+    salida = io.StringIO()
+    escritor = csv.DictWriter(salida, fieldnames=["ticker", *CAMPOS])
+    escritor.writeheader()
+    escritor.writerows(registros(3))
+    texto_csv = salida.getvalue().splitlines()
+    campos = texto_csv[3].split(",")
+    campos[CAMPOS.index("deuda") + 1] = "x"
+    texto_csv[3] = ",".join(campos)
+    with pytest.raises(ValueError, match="Línea 4: el campo deuda no es numérico"):
+        list(leer_fundamentales(io.StringIO("\n".join(texto_csv)), "csv"))
+
+
+def test_entero_desbordado_indica_linea_y_campo(registros):
+    texto = json.dumps({**registros(1)[0], "fcf": 10**400})
+    with pytest.raises(ValueError, match="Línea 1: el campo fcf no es numérico"):
+        list(leer_fundamentales(io.StringIO(texto), "jsonl"))
+
+
+def test_tamano_de_lote_no_positivo(registros):
+    for tamano in (0, -3):
+        with pytest.raises(ValueError, match="mayor que 0"):
+            list(analizar_en_streaming(registros(2), tamano_lote=tamano))
+
+
+def test_jsonl_no_valido_indica_linea(registros):
+    with pytest.raises(ValueError, match="Línea 2: JSON no válido"):
+        list(leer_fundamentales(io.StringIO(json.dumps(registros(1)[0]) + "\n{\n"), "jsonl"))
+
+
+def test_cabecera_csv_del_esquema_de_salida(registros):
+    opciones = {"derivadas": True, "escenarios": rejilla_escenarios([0, 1], [0])}
+    salida = io.StringIO()
+    columnas = columnas_resultado(**opciones)
+    EscritorResultados(salida, "csv", columnas).escribir(analizar_en_streaming(registros(5), **opciones))
+    cabecera = salida.getvalue().splitlines()[0].split(",")
+    assert cabecera == ["ticker", *columnas]
+    assert "precio_esperado" in cabecera and "d_precio_proyeccion_d_wacc" in cabecera
+
+
+def test_columnas_fuera_de_la_cabecera_dan_error(registros):
+    filas = list(analizar_en_streaming([{k: v for k, v in r.items() if k != "ticker"} for r in registros(2)]))
+    filas[1]["ticker"] = "TARDE"
+    with pytest.raises(ValueError, match="Fila 2: columnas ticker"):
+        EscritorResultados(io.StringIO(), "csv").escribir(filas)
+
+
+def test_analizar_archivo(tmp_path, registros):
+    entrada = tmp_path / "f.jsonl"
+    entrada.write_text("".join(json.dumps(r) + "\n" for r in registros()), encoding="utf-8")
+    assert analizar_archivo(entrada, tmp_path / "r.csv", tamano_lote=8, anios_proyeccion=10) == 30
+    with open(tmp_path / "r.csv", encoding="utf-8", newline="") as fichero:
+        filas = list(csv.DictReader(fichero))
+    esperadas = list(analizar_en_streaming(registros(), anios_proyeccion=10))
+    assert [f["precio_proyeccion"] for f in filas] == [str(f["precio_proyeccion"]) for f in esperadas]